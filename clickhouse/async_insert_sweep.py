@@ -0,0 +1,344 @@
+import argparse
+import csv
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import clickhouse_connect
+
+from clickhouse_insert_benchmark import async_insert_settings, insert_data_and_benchmark
+from insert_transports import COMPRESSIONS, PASSTHROUGH_FORMATS, TRANSPORTS
+
+DEFAULT_BATCH_SIZES = "100,1000,10000,100000"
+# client batching, server batching acknowledged after the flush, and
+# server batching acknowledged once the rows are buffered
+MODES = ["sync", "async_wait", "async_nowait"]
+CHART_WIDTH = 50
+
+
+def mode_settings(mode: str, busy_timeout_ms: int, max_data_size: int) -> dict:
+    if mode == "sync":
+        return None
+    return async_insert_settings(
+        1 if mode == "async_wait" else 0, busy_timeout_ms, max_data_size
+    )
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def flush_async_queue(client):
+    try:
+        client.command("SYSTEM FLUSH ASYNC INSERT QUEUE")
+    except Exception as e:
+        print(f"Warning: could not flush the async insert queue: {e}", file=sys.stderr)
+
+
+def count_parts(client, db_name: str, table_name: str, since: float) -> dict:
+    """
+    Active and total parts of the table in system.parts, and the parts
+    created since the run started according to system.part_log, which is
+    None when part_log is not enabled on the server.
+    """
+    result = client.query(
+        "SELECT countIf(active), count() FROM system.parts "
+        "WHERE database = {db:String} AND table = {table:String}",
+        parameters={"db": db_name, "table": table_name},
+    )
+    active_parts, total_parts = result.result_rows[0]
+    try:
+        client.command("SYSTEM FLUSH LOGS")
+        new_parts = client.command(
+            "SELECT count() FROM system.part_log WHERE event_type = 'NewPart' "
+            "AND database = {db:String} AND table = {table:String} "
+            "AND event_time >= toDateTime({since:UInt32})",
+            parameters={"db": db_name, "table": table_name, "since": int(since)},
+        )
+    except Exception:
+        new_parts = None
+    return {
+        "active_parts": active_parts,
+        "total_parts": total_parts,
+        "new_parts": new_parts,
+    }
+
+
+def run_sweep(args) -> list:
+    client = clickhouse_connect.get_client(
+        host=args.host,
+        port=args.port,
+        user=args.user,
+        password=args.password,
+        database=args.db,
+    )
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size]
+    if args.details_dir:
+        args.details_dir.mkdir(parents=True, exist_ok=True)
+    runs = [
+        (transport, mode, batch_size)
+        for transport in args.transports
+        for mode in args.modes
+        for batch_size in batch_sizes
+    ]
+    results = []
+    try:
+        for transport, mode, batch_size in runs:
+            print(f"\n=== {transport}, {mode}, batch size {batch_size} ===")
+            settings = mode_settings(
+                mode, args.async_insert_busy_timeout_ms, args.async_insert_max_data_size
+            )
+            client.command(f"TRUNCATE TABLE {args.db}.{args.table}")
+            details = (
+                args.details_dir / f"{transport}_{mode}_{batch_size}.csv"
+                if args.details_dir
+                else Path("/dev/null")
+            )
+            started = time.time()
+            summary = insert_data_and_benchmark(
+                host=args.host,
+                port=args.port,
+                user=args.user,
+                password=args.password,
+                db_name=args.db,
+                table_name=args.table,
+                tsv_file=args.tsv_file,
+                batch_size=batch_size,
+                offset=args.offset,
+                limit=args.rows,
+                output_file=str(details),
+                insert_settings=settings,
+                pause=False,
+                transport=transport,
+                compression=args.compression,
+                native_port=args.native_port,
+                passthrough_format=args.passthrough_format,
+            )
+            flush_start = time.monotonic()
+            if settings:
+                flush_async_queue(client)
+            # reading and parsing the file included, unlike insert_seconds
+            wall_seconds = summary["wall_seconds"] + time.monotonic() - flush_start
+            parts = count_parts(client, args.db, args.table, started)
+            durations_ms = [d * 1000 for d in summary["batch_durations"]]
+            insert_seconds = summary["insert_seconds"]
+            results.append(
+                {
+                    "transport": transport,
+                    "compression": args.compression,
+                    "mode": mode,
+                    "batch_size": batch_size,
+                    "rows": summary["rows_inserted"],
+                    "inserts": summary["batches"],
+                    "failed_inserts": summary["failed_batches"],
+                    "insert_seconds": round(insert_seconds, 3),
+                    "wall_seconds": round(wall_seconds, 3),
+                    "rows_per_sec": round(
+                        (
+                            summary["rows_inserted"] / insert_seconds
+                            if insert_seconds > 0
+                            else 0.0
+                        ),
+                        1,
+                    ),
+                    "wall_rows_per_sec": round(
+                        (
+                            summary["rows_inserted"] / wall_seconds
+                            if wall_seconds > 0
+                            else 0.0
+                        ),
+                        1,
+                    ),
+                    "latency_p50_ms": round(
+                        statistics.median(durations_ms) if durations_ms else 0.0, 2
+                    ),
+                    "latency_p95_ms": round(percentile(durations_ms, 95), 2),
+                    "latency_p99_ms": round(percentile(durations_ms, 99), 2),
+                    "latency_max_ms": round(max(durations_ms, default=0.0), 2),
+                    **parts,
+                }
+            )
+    finally:
+        client.close()
+    return results
+
+
+def run_label(result: dict) -> str:
+    return f"{result['transport']:>11} {result['mode']:>12} {result['batch_size']:>8}"
+
+
+def print_chart(results: list, metric: str, unit: str):
+    peak = max((result[metric] for result in results), default=0) or 1
+    print(f"\n{metric} ({unit})")
+    for result in results:
+        bar = "#" * max(1, round(result[metric] / peak * CHART_WIDTH))
+        print(f"{run_label(result)} | {bar} {result[metric]}")
+
+
+def print_results(results: list):
+    print(f"\n--- Insert Sweep (compression: {results[0]['compression']}) ---")
+    print(
+        f"{'transport':>11} {'mode':>12} {'batch':>8} {'rows':>10} {'rows/s':>12} "
+        f"{'wall rows/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+        f"{'parts':>7} {'new parts':>10}"
+    )
+    for result in results:
+        new_parts = "n/a" if result["new_parts"] is None else result["new_parts"]
+        print(
+            f"{run_label(result)} {result['rows']:>10} "
+            f"{result['rows_per_sec']:>12} {result['wall_rows_per_sec']:>12} "
+            f"{result['latency_p50_ms']:>10} "
+            f"{result['latency_p95_ms']:>10} {result['latency_p99_ms']:>10} "
+            f"{result['active_parts']:>7} {new_parts:>10}"
+        )
+    print_chart(results, "rows_per_sec", "rows/s, higher is better")
+    print_chart(results, "wall_rows_per_sec", "rows/s incl. reading and parsing")
+    print_chart(results, "latency_p95_ms", "ms per insert, lower is better")
+    print_chart(results, "active_parts", "active parts after the run")
+    print_parse_gap(results)
+
+
+def print_parse_gap(results: list):
+    """Wall clock throughput of server side parsing against every client side parsing run."""
+    passthrough = {
+        (result["mode"], result["batch_size"]): result
+        for result in results
+        if result["transport"] == "passthrough"
+    }
+    gaps = [
+        (result, passthrough[(result["mode"], result["batch_size"])])
+        for result in results
+        if result["transport"] != "passthrough"
+        and (result["mode"], result["batch_size"]) in passthrough
+    ]
+    if not gaps:
+        return
+    print(
+        "\nServer side parsing (passthrough) vs client side parsing, wall clock rows/s"
+    )
+    for client_parsed, server_parsed in gaps:
+        ratio = (
+            server_parsed["wall_rows_per_sec"] / client_parsed["wall_rows_per_sec"]
+            if client_parsed["wall_rows_per_sec"]
+            else 0.0
+        )
+        print(
+            f"{run_label(client_parsed)} | {client_parsed['wall_rows_per_sec']:>12} "
+            f"vs {server_parsed['wall_rows_per_sec']:>12}  x{ratio:.2f}"
+        )
+
+
+def write_results(results: list, output_file: Path):
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSweep results written to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep insert batch sizes with client side batching and with "
+        "ClickHouse async inserts, optionally over several transports, reporting "
+        "throughput, insert latency and the number of parts each combination "
+        "leaves in system.parts side by side. The table is truncated before "
+        "every run."
+    )
+    parser.add_argument("--host", default="localhost", help="ClickHouse host")
+    parser.add_argument("--port", type=int, default=8123, help="ClickHouse HTTP port")
+    parser.add_argument("--user", default="default", help="ClickHouse user")
+    parser.add_argument("--password", default="", help="ClickHouse password")
+    parser.add_argument("--db", required=True, help="Database name")
+    parser.add_argument("--table", required=True, help="Table name")
+    parser.add_argument(
+        "--tsv_file",
+        required=True,
+        type=Path,
+        help="Input TSV file (.gz/.zst compressed or Parquet exports work too).",
+    )
+    parser.add_argument(
+        "--batch_sizes",
+        default=DEFAULT_BATCH_SIZES,
+        help=f"Comma separated rows per insert to try (default: {DEFAULT_BATCH_SIZES})",
+    )
+    parser.add_argument(
+        "--transports",
+        nargs="+",
+        choices=TRANSPORTS,
+        default=["connect"],
+        help="Insert paths to compare (see insert_transports.py); every "
+        "transport runs every mode and batch size",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="lz4",
+        help="Compression of the insert data for every transport",
+    )
+    parser.add_argument(
+        "--passthrough_format",
+        choices=PASSTHROUGH_FORMATS,
+        default="TSVWithNames",
+        help="Input format of the passthrough transport",
+    )
+    parser.add_argument(
+        "--native_port",
+        type=int,
+        default=9000,
+        help="ClickHouse native TCP port, used by the native transport",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=MODES,
+        default=MODES,
+        help="sync: client side batches; async_wait/async_nowait: async_insert=1 "
+        "with wait_for_async_insert=1/0",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=1000000,
+        help="Rows inserted per run; keep it a multiple of the largest batch size",
+    )
+    parser.add_argument(
+        "--offset",
+        type=int,
+        default=0,
+        help="Number of data rows to skip from the beginning",
+    )
+    parser.add_argument(
+        "--async_insert_busy_timeout_ms",
+        type=int,
+        default=None,
+        help="Async modes: maximum time the server buffers rows before flushing",
+    )
+    parser.add_argument(
+        "--async_insert_max_data_size",
+        type=int,
+        default=None,
+        help="Async modes: buffered bytes that trigger a flush",
+    )
+    parser.add_argument(
+        "--details_dir",
+        type=Path,
+        default=None,
+        help="Optional: directory for the per-batch CSV of every run",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("async_insert_sweep.csv"),
+        help="CSV file for the sweep summary",
+    )
+
+    args = parser.parse_args()
+
+    results = run_sweep(args)
+    if results:
+        print_results(results)
+        write_results(results, args.output)
@@ -1,4 +1,5 @@
 import argparse
+import bisect
 import csv
 import datetime
 import os
@@ -9,12 +10,85 @@ from pathlib import Path
 
 import clickhouse_connect
 
+from insert_transports import (
+    COMPRESSIONS,
+    PASSTHROUGH_FORMATS,
+    TRANSPORTS,
+    TSVPassthroughInserter,
+    make_inserter,
+)
+
 # --- Configuration ---
 TSV_TIMESTAMP_COL = "@timestamp"
 TSV_NODE_COL = "meta.device"
 TSV_INTF_COL = "meta.name"
 REQUIRED_TSV_COLS = [TSV_TIMESTAMP_COL, TSV_NODE_COL, TSV_INTF_COL]
 FIXED_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"  # Using fixed format
+PASSTHROUGH_READ_BYTES = 4 * 1024 * 1024
+# per-batch fields taken from clickhouse/monitor/monitor.py --server-metrics samples
+SERVER_SAMPLE_FIELDS = [
+    "max_partition_parts",
+    "merges_running",
+    "delayed_inserts_per_sec",
+    "rejected_inserts_per_sec",
+    "merged_rows_per_sec",
+    "disk_write_bytes_per_sec",
+]
+
+
+def load_partition_plan(plan_path: Path):
+    """Loads a plan written by scripts/python/utils/series_catalog.py."""
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from series_catalog import load_plan
+
+    return load_plan(plan_path)
+
+
+def open_tsv_file(tsv_file: Path, mode: str = "r"):
+    """
+    Opens a fetcher export as TSV text, or its bytes with mode "rb": plain,
+    .gz/.zst compressed or Parquet (see scripts/python/utils/stardust_io.py).
+    """
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from stardust_io import open_input
+
+    return open_input(tsv_file, mode, newline="")
+
+
+def rate_limiter(rows_per_sec: float, arrivals: str = None, latency_output=None):
+    """
+    A scripts/python/utils/pacing.py limiter spacing the batches to
+    rows_per_sec, closed loop or on an open-loop schedule of arrivals
+    ("constant" or "poisson"), or None to insert as fast as possible.
+    Batch latencies go to latency_output as they complete.
+    """
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from pacing import make_rate_limiter
+
+    return make_rate_limiter(rows_per_sec, arrivals, latency_output)
+
+
+def async_insert_settings(
+    wait_for_async_insert: int = 1,
+    busy_timeout_ms: int = None,
+    max_data_size: int = None,
+) -> dict:
+    """Insert settings that hand batching over to the server's async insert buffer."""
+    settings = {
+        "async_insert": 1,
+        "wait_for_async_insert": wait_for_async_insert,
+    }
+    if busy_timeout_ms is not None:
+        settings["async_insert_busy_timeout_ms"] = busy_timeout_ms
+    if max_data_size is not None:
+        settings["async_insert_max_data_size"] = max_data_size
+    return settings
 
 
 # --- Helper Functions (parse_timestamp, get_clickhouse_schema, create_tsv_to_ch_mapping) ---
@@ -37,14 +111,36 @@ def parse_timestamp(ts_string):
         return None
 
 
+def parse_integer(raw_value):
+    """
+    Parses a value of an integer column, also written as a float ("5.0",
+    "1e3"). A fractional value raises ValueError rather than being truncated:
+    profiled schemas pick integer types from a sample of the rows.
+    """
+    try:
+        return int(raw_value)
+    except ValueError:
+        value = float(raw_value)
+        if not value.is_integer():
+            raise ValueError(f"non-integral value {raw_value!r} in an integer column")
+        return int(value)
+
+
 def get_clickhouse_schema(client, db_name, table_name):
     """Gets column names and types from a ClickHouse table."""
     try:
         fq_table_name = f"`{db_name}`.`{table_name}`"
         query = f"DESCRIBE TABLE {fq_table_name}"
         result = client.query(query)
+        # profiled schemas (generate_schema_from_tsv.py --profile_rows) use
+        # integer types and DEFAULT 0 instead of Nullable for some values.*
         schema = {
-            row[0]: {"type": row[1], "nullable": "Nullable" in row[1]}
+            row[0]: {
+                "type": row[1],
+                "nullable": "Nullable" in row[1],
+                "integer": "Int" in row[1],
+                "default": len(row) > 2 and row[2] == "DEFAULT",
+            }
             for row in result.result_rows
         }
         print(f"Fetched schema for {fq_table_name}. Columns: {list(schema.keys())}")
@@ -93,6 +189,378 @@ def create_tsv_to_ch_mapping(tsv_headers, ch_schema):
     return mapping
 
 
+def write_benchmark_results(output_file: str, benchmark_results: list):
+    """Writes the per-batch results of a segment as CSV."""
+    output_file_path = Path(output_file)
+    print(
+        f"\nWriting detailed benchmark results for this segment to: {output_file_path}"
+    )
+    with open(output_file_path, "w", newline="", encoding="utf-8") as outfile:
+        if benchmark_results:
+            fieldnames = [
+                "file",
+                "batch_number",
+                "rows_attempted_batch",
+                "rows_parsed_batch",
+                "rows_inserted_batch",
+                "time_seconds",
+                "error",
+                "started_at",
+            ]
+            # batches before the first monitor sample are not annotated
+            if any(
+                field in result
+                for result in benchmark_results
+                for field in SERVER_SAMPLE_FIELDS
+            ):
+                fieldnames += SERVER_SAMPLE_FIELDS
+            writer = csv.DictWriter(
+                outfile, fieldnames=fieldnames, extrasaction="ignore"
+            )
+            writer.writeheader()
+            writer.writerows(benchmark_results)
+        else:
+            outfile.write("No benchmark data recorded.\n")
+            print(f"Benchmark output file created, but no data was recorded.")
+
+
+def attach_server_samples(
+    client, monitor_db: str, monitor_table: str, benchmark_results: list
+):
+    """
+    Annotates every batch with the monitor.py --server-metrics samples around
+    its start: the part and merge backlog of the last sample before it, and
+    the insert delay, merge and disk write rates of the sample interval it
+    falls in. Batches outside the sampled time range are left as they are.
+    """
+    started = [
+        int(result["started_at"].timestamp() * 1000)
+        for result in benchmark_results
+        if result.get("started_at")
+    ]
+    if not started:
+        return
+    try:
+        samples = client.query(
+            f"SELECT toUnixTimestamp64Milli(sample_time), max_partition_parts, merges_running, "
+            f"delayed_inserts, rejected_inserts, merged_rows, disk_write_bytes "
+            f"FROM `{monitor_db}`.`{monitor_table}` "
+            f"WHERE sample_time BETWEEN fromUnixTimestamp64Milli({{start:Int64}}) - INTERVAL 5 MINUTE "
+            f"AND fromUnixTimestamp64Milli({{end:Int64}}) + INTERVAL 5 MINUTE "
+            f"ORDER BY sample_time",
+            parameters={"start": min(started), "end": max(started)},
+        ).result_rows
+    except Exception as e:
+        print(f"Error reading monitor samples: {e}", file=sys.stderr)
+        return
+    print(f"Read {len(samples)} monitor samples from {monitor_db}.{monitor_table}.")
+    if len(samples) < 2:
+        return
+    sample_times = [sample[0] for sample in samples]
+    for result in benchmark_results:
+        if not result.get("started_at"):
+            continue
+        batch_ms = int(result["started_at"].timestamp() * 1000)
+        i = bisect.bisect_right(sample_times, batch_ms)
+        if i == 0 or i == len(samples):
+            continue  # not between two samples
+        before, after = samples[i - 1], samples[i]
+        seconds = (after[0] - before[0]) / 1000
+
+        def rate(column):
+            # counters restart with the server; skip intervals spanning a restart
+            delta = after[column] - before[column]
+            return round(delta / seconds, 3) if delta >= 0 and seconds > 0 else None
+
+        result["max_partition_parts"] = before[1]
+        result["merges_running"] = before[2]
+        result["delayed_inserts_per_sec"] = rate(3)
+        result["rejected_inserts_per_sec"] = rate(4)
+        result["merged_rows_per_sec"] = rate(5)
+        result["disk_write_bytes_per_sec"] = rate(6)
+
+
+def print_backlog_attribution(benchmark_results: list):
+    """Batch insert rates grouped by quartiles of the merge backlog they met."""
+    annotated = [
+        result
+        for result in benchmark_results
+        if result.get("max_partition_parts") is not None
+        and result["rows_inserted_batch"]
+        and result["time_seconds"] > 0
+    ]
+    if not annotated:
+        print("\nNo monitor samples cover the insert batches.")
+        return
+    print(
+        f"\nInsert rate by merge backlog ({len(annotated)} batches with monitor samples):"
+    )
+    for field in ("max_partition_parts", "merges_running"):
+        values = sorted(result[field] for result in annotated)
+        edges = sorted(set(values[len(values) * q // 4] for q in range(1, 4)))
+        buckets = {}
+        for result in annotated:
+            buckets.setdefault(bisect.bisect_right(edges, result[field]), []).append(
+                result
+            )
+        for _, bucket in sorted(buckets.items()):
+            rates = [r["rows_inserted_batch"] / r["time_seconds"] for r in bucket]
+            delayed = [
+                r["delayed_inserts_per_sec"]
+                for r in bucket
+                if r["delayed_inserts_per_sec"] is not None
+            ]
+            low = min(r[field] for r in bucket)
+            high = max(r[field] for r in bucket)
+            print(
+                f"  {field} {low}-{high}: {len(bucket)} batches, median {statistics.median(rates):.2f} rows/second, "
+                f"delayed inserts {statistics.mean(delayed) if delayed else 0:.3f}/second"
+            )
+
+
+def print_wall_clock_rate(rows_inserted: int, wall_seconds: float):
+    # unlike the insertion rate this includes reading and parsing the file
+    print(f"Wall clock time (read, parse and insert): {wall_seconds:.4f} seconds")
+    if wall_seconds > 0 and rows_inserted > 0:
+        print(
+            f"Wall clock rate for segment: {rows_inserted / wall_seconds:.2f} rows/second"
+        )
+
+
+def iter_line_chunks(stream, lines_per_chunk: int, limit: int):
+    """
+    Yields (bytes, line count) chunks of a binary stream, each the byte range
+    of the next lines_per_chunk lines, cut on newline boundaries, until
+    limit lines (-1 for no limit) have been yielded.
+    """
+    pending = []
+    pending_lines = 0
+    remaining = limit
+    while remaining != 0:
+        block = stream.read(PASSTHROUGH_READ_BYTES)
+        if not block:
+            break
+        position = 0
+        while remaining != 0:
+            wanted = lines_per_chunk - pending_lines
+            if remaining > 0:
+                wanted = min(wanted, remaining - pending_lines)
+            if block.count(b"\n", position) < wanted:
+                pending.append(block[position:])
+                pending_lines += block.count(b"\n", position)
+                break
+            end = position
+            for _ in range(wanted):
+                end = block.index(b"\n", end) + 1
+            pending.append(block[position:end])
+            yield b"".join(pending), pending_lines + wanted
+            if remaining > 0:
+                remaining -= pending_lines + wanted
+            pending = []
+            pending_lines = 0
+            position = end
+    tail = b"".join(pending)
+    if remaining != 0 and tail.strip():
+        if not tail.endswith(b"\n"):
+            tail += b"\n"
+            pending_lines += 1
+        yield tail, pending_lines
+
+
+def passthrough_insert_and_benchmark(
+    host,
+    port,
+    user,
+    password,
+    db_name,
+    table_name,
+    tsv_file: Path,
+    batch_size: int,
+    offset: int,
+    limit: int,
+    output_file: str,
+    insert_settings: dict = None,
+    pause: bool = True,
+    compression: str = "lz4",
+    passthrough_format: str = "TSVWithNames",
+    monitor_db: str = None,
+    monitor_table: str = "server_metrics",
+    rows_per_sec: float = None,
+    arrivals: str = None,
+    latency_output: str = None,
+):
+    """
+    Inserts a segment of a TSV file without parsing it: the byte range of
+    every batch_size lines is streamed behind the header line as the body of
+    an INSERT ... FORMAT TSVWithNames (or CustomSeparatedWithNames) and
+    parsed by the server. Returns the same summary as
+    insert_data_and_benchmark().
+    """
+    print(f"Starting passthrough insertion process for ClickHouse...")
+    print(f"Processing file: {tsv_file}")
+    print(f"Row Offset: {offset}, Row Limit: {'No limit' if limit < 0 else limit}")
+    print(f"Batch size: {batch_size}")
+    print(f"Transport: passthrough ({passthrough_format}), compression: {compression}")
+    if rows_per_sec:
+        print(f"Pacing: {rows_per_sec} rows/s, {arrivals or 'closed loop'}")
+
+    if not tsv_file.is_file():
+        print(f"Error: Input TSV file not found", file=sys.stderr)
+        sys.exit(1)
+
+    benchmark_results = []
+    total_rows_inserted_segment = 0
+    total_insertion_time_segment = 0.0
+    all_batch_durations = []
+    total_batches_processed = 0
+    file_read_error = False
+    wall_seconds = 0.0
+    inserter = None
+    limiter = rate_limiter(rows_per_sec, arrivals, latency_output)
+
+    try:
+        with open_tsv_file(tsv_file, "rb") as tsvfile:
+            header_line = tsvfile.readline()
+            header = header_line.rstrip(b"\r\n").decode("utf-8").split("\t")
+            missing_req = [c for c in REQUIRED_TSV_COLS if c not in header]
+            if missing_req:
+                print(
+                    f"  ERROR: Missing required TSV headers: {missing_req}. Exiting.",
+                    file=sys.stderr,
+                )
+                file_read_error = True
+            else:
+                print(f"Skipping {offset} rows...")
+                rows_skipped_count = 0
+                while rows_skipped_count < offset and tsvfile.readline():
+                    rows_skipped_count += 1
+                print(f"Finished skipping {rows_skipped_count} rows.")
+                if rows_skipped_count < offset:
+                    print(
+                        f"Warning: Offset ({offset}) exceeded total rows in file after header.",
+                        file=sys.stderr,
+                    )
+                    file_read_error = True
+
+            if pause and not file_read_error:
+                input(
+                    f"Offset {offset} reached for {tsv_file.name}. Press Enter to start processing (limit: {'None' if limit < 0 else limit})..."
+                )
+                print("Starting processing and benchmarking...")
+
+            if not file_read_error:
+                inserter = TSVPassthroughInserter(
+                    host,
+                    port,
+                    user,
+                    password,
+                    db_name,
+                    table_name,
+                    header_line,
+                    passthrough_format,
+                    compression,
+                    insert_settings,
+                )
+                processing_start = time.monotonic()
+                for chunk, chunk_lines in iter_line_chunks(tsvfile, batch_size, limit):
+                    total_batches_processed += 1
+                    scheduled = limiter.wait(chunk_lines) if limiter else None
+                    print(
+                        f"  Inserting batch {total_batches_processed} ({chunk_lines} lines, {len(chunk)} bytes)..."
+                    )
+                    started_at = datetime.datetime.now(datetime.timezone.utc)
+                    start_time = time.monotonic()
+                    rows_inserted_batch = 0
+                    error_msg = ""
+                    try:
+                        inserter.insert_chunk(chunk)
+                        duration = time.monotonic() - start_time
+                        rows_inserted_batch = chunk_lines
+                        all_batch_durations.append(duration)
+                        total_rows_inserted_segment += rows_inserted_batch
+                        total_insertion_time_segment += duration
+                        print(
+                            f"    Batch {total_batches_processed} OK ({rows_inserted_batch} rows) in {duration:.4f}s"
+                        )
+                    except Exception as e:
+                        duration = time.monotonic() - start_time
+                        error_msg = f"Batch {total_batches_processed} FAIL: {e}"
+                        print(f"  ERROR: {error_msg}", file=sys.stderr)
+                    if limiter:
+                        limiter.record(scheduled, chunk_lines, ok=not error_msg)
+                    benchmark_results.append(
+                        {
+                            "file": tsv_file.name,
+                            "batch_number": total_batches_processed,
+                            "started_at": started_at,
+                            "rows_attempted_batch": chunk_lines,
+                            "rows_parsed_batch": rows_inserted_batch,
+                            "rows_inserted_batch": rows_inserted_batch,
+                            "time_seconds": duration,
+                            "error": error_msg,
+                        }
+                    )
+                wall_seconds = time.monotonic() - processing_start
+    except Exception as e:
+        print(f"An unexpected error during file processing: {e}", file=sys.stderr)
+        file_read_error = True
+    finally:
+        if inserter:
+            inserter.close()
+
+    print("\n--- ClickHouse Passthrough Insertion Summary ---")
+    print(f"Processed file: {tsv_file.name}")
+    if file_read_error:
+        print("Processing stopped due to critical file read or header errors.")
+    print(f"Specified Offset: {offset}, Limit: {'No limit' if limit < 0 else limit}")
+    print(
+        f"Total rows inserted successfully across all batches: {total_rows_inserted_segment}"
+    )
+    print(f"Total batches processed for segment: {total_batches_processed}")
+    print(
+        f"Total insertion time (sum of successful batch inserts): {total_insertion_time_segment:.4f} seconds"
+    )
+    if total_insertion_time_segment > 0 and total_rows_inserted_segment > 0:
+        avg_rows_per_sec = total_rows_inserted_segment / total_insertion_time_segment
+        print(f"Average insertion rate for segment: {avg_rows_per_sec:.2f} rows/second")
+    else:
+        print("Average insertion rate: N/A")
+    print_wall_clock_rate(total_rows_inserted_segment, wall_seconds)
+    if limiter:
+        print(f"Paced batches: {limiter.report()}")
+    if all_batch_durations:
+        print(
+            f"  Median batch insert time: {statistics.median(all_batch_durations):.6f} seconds"
+        )
+        print(f"  Max batch insert time: {max(all_batch_durations):.6f} seconds")
+
+    if monitor_db:
+        try:
+            client = clickhouse_connect.get_client(
+                host=host, port=port, user=user, password=password
+            )
+            attach_server_samples(client, monitor_db, monitor_table, benchmark_results)
+            client.close()
+        except Exception as e:
+            print(f"Error connecting to ClickHouse: {e}", file=sys.stderr)
+        print_backlog_attribution(benchmark_results)
+
+    try:
+        write_benchmark_results(output_file, benchmark_results)
+    except IOError as e:
+        print(f"\nError writing benchmark results: {e}", file=sys.stderr)
+    print("Benchmarking complete for this segment.")
+    return {
+        "rows_inserted": total_rows_inserted_segment,
+        "insert_seconds": total_insertion_time_segment,
+        "batches": total_batches_processed,
+        "failed_batches": sum(1 for result in benchmark_results if result["error"]),
+        "batch_durations": all_batch_durations,
+        "wall_seconds": wall_seconds,
+        "file_read_error": file_read_error,
+    }
+
+
 # --- Main Function ---
 def insert_data_and_benchmark(
     host,
@@ -106,15 +574,78 @@ def insert_data_and_benchmark(
     offset: int,
     limit: int,
     output_file: str,
+    partition_plan: Path = None,
+    worker_num: int = 0,
+    insert_settings: dict = None,
+    pause: bool = True,
+    transport: str = "connect",
+    compression: str = "lz4",
+    native_port: int = 9000,
+    passthrough_format: str = "TSVWithNames",
+    monitor_db: str = None,
+    monitor_table: str = "server_metrics",
+    rows_per_sec: float = None,
+    arrivals: str = None,
+    latency_output: str = None,
 ):
     """
     Reads a segment of a large TSV file (using offset/limit), inserts data
     into ClickHouse table in batches, and benchmarks the process.
+    insert_settings are sent with every insert (e.g. async_insert). transport
+    picks the insert path (see insert_transports.py). With monitor_db, batches
+    are joined with the monitor.py server samples in that database.
+    rows_per_sec paces the batches (None: as fast as possible), on an
+    open-loop schedule with arrivals, and latency_output gets their latency
+    from the scheduled send time. Returns a summary of the segment.
     """
+    if transport == "passthrough":
+        if partition_plan:
+            print(
+                "Error: --partition_plan needs parsed rows; it cannot be used with the passthrough transport.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        return passthrough_insert_and_benchmark(
+            host,
+            port,
+            user,
+            password,
+            db_name,
+            table_name,
+            tsv_file,
+            batch_size,
+            offset,
+            limit,
+            output_file,
+            insert_settings=insert_settings,
+            pause=pause,
+            compression=compression,
+            passthrough_format=passthrough_format,
+            monitor_db=monitor_db,
+            monitor_table=monitor_table,
+            rows_per_sec=rows_per_sec,
+            arrivals=arrivals,
+            latency_output=latency_output,
+        )
     print(f"Starting data insertion process for ClickHouse...")
     print(f"Processing file: {tsv_file}")
     print(f"Row Offset: {offset}, Row Limit: {'No limit' if limit < 0 else limit}")
     print(f"Batch size: {batch_size}")
+    print(f"Transport: {transport}, compression: {compression}")
+    if rows_per_sec:
+        print(f"Pacing: {rows_per_sec} rows/s, {arrivals or 'closed loop'}")
+    plan = None
+    if partition_plan:
+        plan = load_partition_plan(partition_plan)
+        if not 0 <= worker_num < plan.num_workers:
+            print(
+                f"Error: --worker_num {worker_num} out of range for a {plan.num_workers} worker plan.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        print(
+            f"Partition plan: {partition_plan} ({plan.strategy}), inserting series of worker {worker_num + 1}/{plan.num_workers}"
+        )
     print(f"Connecting to ClickHouse: {host}:{port}")
     print("!!! IMPORTANT: Ensure --output file is unique if running in parallel !!!")
 
@@ -124,7 +655,12 @@ def insert_data_and_benchmark(
 
     try:
         client = clickhouse_connect.get_client(
-            host=host, port=port, user=user, password=password, database=db_name
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=db_name,
+            compress=False if compression == "none" else compression,
         )
         client.ping()
         print(f"Connected to DB '{db_name}', targeting Table '{table_name}'.")
@@ -140,6 +676,25 @@ def insert_data_and_benchmark(
             client.close()
         sys.exit(1)
     target_columns_ordered = list(table_schema.keys())
+    try:
+        inserter = make_inserter(
+            transport,
+            client,
+            host,
+            port,
+            native_port,
+            user,
+            password,
+            db_name,
+            table_name,
+            table_schema,
+            compression,
+            insert_settings,
+        )
+    except Exception as e:
+        print(f"Error setting up the {transport} transport: {e}", file=sys.stderr)
+        client.close()
+        sys.exit(1)
 
     # --- Benchmarking Setup ---
     benchmark_results = []
@@ -150,11 +705,13 @@ def insert_data_and_benchmark(
     all_batch_durations = []
     total_batches_processed = 0
     file_read_error = False
+    processing_start = None
+    limiter = rate_limiter(rows_per_sec, arrivals, latency_output)
 
     # --- Process the Single File ---
     try:
         print(f"Opening file: {tsv_file.name}")
-        with open(tsv_file, "r", newline="", encoding="utf-8") as tsvfile:
+        with open_tsv_file(tsv_file) as tsvfile:
             # Use standard csv.reader, will use DictReader logic later
             reader = csv.reader(tsvfile, delimiter="\t")
             tsv_header = []
@@ -186,6 +743,8 @@ def insert_data_and_benchmark(
                     )
                     file_read_error = True
                 else:
+                    node_col_idx = tsv_header.index(TSV_NODE_COL)
+                    intf_col_idx = tsv_header.index(TSV_INTF_COL)
                     tsv_ch_map = create_tsv_to_ch_mapping(tsv_header, table_schema)
                     if tsv_ch_map is None:
                         print(f"  ERROR creating mapping. Exiting.", file=sys.stderr)
@@ -210,7 +769,7 @@ def insert_data_and_benchmark(
                 print(f"Finished skipping {rows_skipped_count} rows.")
 
             if (
-                not file_read_error
+                pause and not file_read_error
             ):  # Only pause if offset skipping didn't hit end of file
                 input(
                     f"Offset {offset} reached for {tsv_file.name}. Press Enter to start processing (limit: {'None' if limit < 0 else limit})..."
@@ -219,6 +778,7 @@ def insert_data_and_benchmark(
 
             # --- Process Data Rows within Limit ---
             if not file_read_error:
+                processing_start = time.monotonic()
                 batch_data = []
                 rows_attempted_in_current_batch = 0
                 rows_parsed_in_current_batch = 0
@@ -230,6 +790,13 @@ def insert_data_and_benchmark(
                         break  # Stop reading the file
 
                     line_number = i + 2 + offset  # Actual line number in file
+                    if (
+                        plan is not None
+                        and len(row) == len(tsv_header)
+                        and plan.worker_for(row[node_col_idx], row[intf_col_idx])
+                        != worker_num
+                    ):
+                        continue  # Series belongs to another worker
                     total_rows_attempted_segment += 1
                     rows_attempted_in_current_batch += 1
 
@@ -263,6 +830,8 @@ def insert_data_and_benchmark(
                             else:
                                 if "String" in col_schema["type"]:
                                     parsed_value = ""
+                                elif col_schema["default"]:
+                                    parsed_value = 0 if col_schema["integer"] else 0.0
                                 else:
                                     parse_errors.append(
                                         f"Empty non-null col '{ch_col_name}'"
@@ -277,7 +846,10 @@ def insert_data_and_benchmark(
                                 elif tsv_col_name in REQUIRED_TSV_COLS:
                                     parsed_value = str(raw_value)
                                 elif tsv_col_name.startswith("values."):
-                                    parsed_value = float(raw_value)
+                                    if col_schema["integer"]:
+                                        parsed_value = parse_integer(raw_value)
+                                    else:
+                                        parsed_value = float(raw_value)
                                 else:
                                     parsed_value = str(raw_value)
                             except (ValueError, TypeError) as e:
@@ -310,16 +882,13 @@ def insert_data_and_benchmark(
                         print(
                             f"  Inserting batch {total_batches_processed} ({len(batch_data)} rows)..."
                         )
+                        scheduled = limiter.wait(len(batch_data)) if limiter else None
+                        started_at = datetime.datetime.now(datetime.timezone.utc)
                         start_time = time.monotonic()
                         rows_inserted_batch = 0
                         error_msg = ""
                         try:
-                            client.insert(
-                                table=table_name,
-                                data=batch_data,
-                                column_names=target_columns_ordered,
-                                database=db_name,
-                            )
+                            inserter.insert(batch_data)
                             duration = time.monotonic() - start_time
                             rows_inserted_batch = len(batch_data)
                             all_batch_durations.append(duration)
@@ -332,10 +901,13 @@ def insert_data_and_benchmark(
                             duration = time.monotonic() - start_time
                             error_msg = f"Batch {total_batches_processed} FAIL: {e}"
                             print(f"  ERROR: {error_msg}", file=sys.stderr)
+                        if limiter:
+                            limiter.record(scheduled, len(batch_data), ok=not error_msg)
                         benchmark_results.append(
                             {
                                 "file": tsv_file.name,
                                 "batch_number": total_batches_processed,
+                                "started_at": started_at,
                                 "rows_attempted_batch": rows_attempted_in_current_batch,
                                 "rows_parsed_batch": rows_parsed_in_current_batch,
                                 "rows_inserted_batch": rows_inserted_batch,
@@ -355,16 +927,13 @@ def insert_data_and_benchmark(
                     print(
                         f"  Inserting final batch {total_batches_processed} ({len(batch_data)} rows)..."
                     )
+                    scheduled = limiter.wait(len(batch_data)) if limiter else None
+                    started_at = datetime.datetime.now(datetime.timezone.utc)
                     start_time = time.monotonic()
                     rows_inserted_batch = 0
                     error_msg = ""
                     try:
-                        client.insert(
-                            table=table_name,
-                            data=batch_data,
-                            column_names=target_columns_ordered,
-                            database=db_name,
-                        )
+                        inserter.insert(batch_data)
                         duration = time.monotonic() - start_time
                         rows_inserted_batch = len(batch_data)
                         all_batch_durations.append(duration)
@@ -377,10 +946,13 @@ def insert_data_and_benchmark(
                         duration = time.monotonic() - start_time
                         error_msg = f"Final Batch {total_batches_processed} FAIL: {e}"
                         print(f"  ERROR: {error_msg}", file=sys.stderr)
+                    if limiter:
+                        limiter.record(scheduled, len(batch_data), ok=not error_msg)
                     benchmark_results.append(
                         {
                             "file": tsv_file.name,
                             "batch_number": total_batches_processed,
+                            "started_at": started_at,
                             "rows_attempted_batch": rows_attempted_in_current_batch,
                             "rows_parsed_batch": rows_parsed_in_current_batch,
                             "rows_inserted_batch": rows_inserted_batch,
@@ -399,6 +971,8 @@ def insert_data_and_benchmark(
         print(f"An unexpected error during file processing: {e}", file=sys.stderr)
         file_read_error = True
 
+    wall_seconds = time.monotonic() - processing_start if processing_start else 0.0
+
     # --- Final Summary & Output ---
     print("\n--- ClickHouse Insertion Summary ---")
     print(f"Processed file: {tsv_file.name}")
@@ -420,6 +994,9 @@ def insert_data_and_benchmark(
         print(f"Average insertion rate for segment: {avg_rows_per_sec:.2f} rows/second")
     else:
         print("Average insertion rate: N/A")
+    print_wall_clock_rate(total_rows_inserted_segment, wall_seconds)
+    if limiter:
+        print(f"Paced batches: {limiter.report()}")
 
     if all_batch_durations:
         print("\nBatch Performance Statistics (inserts in segment):")
@@ -446,32 +1023,14 @@ def insert_data_and_benchmark(
             "\nNo successful batch performance statistics available for this segment."
         )
 
+    if monitor_db:
+        attach_server_samples(client, monitor_db, monitor_table, benchmark_results)
+        print_backlog_attribution(benchmark_results)
+
     # --- Write Benchmark Results to CSV ---
     # (CSV Writing logic remains the same, writes results for this segment)
     try:
-        output_file_path = Path(output_file)
-        print(
-            f"\nWriting detailed benchmark results for this segment to: {output_file_path}"
-        )
-        with open(output_file_path, "w", newline="", encoding="utf-8") as outfile:
-            if benchmark_results:
-                fieldnames = [
-                    "file",
-                    "batch_number",
-                    "rows_attempted_batch",
-                    "rows_parsed_batch",
-                    "rows_inserted_batch",
-                    "time_seconds",
-                    "error",
-                ]
-                writer = csv.DictWriter(
-                    outfile, fieldnames=fieldnames, extrasaction="ignore"
-                )
-                writer.writeheader()
-                writer.writerows(benchmark_results)
-            else:
-                outfile.write("No benchmark data recorded.\n")
-                print(f"Benchmark output file created, but no data was recorded.")
+        write_benchmark_results(output_file, benchmark_results)
     except IOError as e:
         print(f"\nError writing benchmark results: {e}", file=sys.stderr)
     except Exception as e:
@@ -484,11 +1043,21 @@ def insert_data_and_benchmark(
     finally:
         if "client" in locals() and client:
             try:
+                inserter.close()
                 client.close()
                 print("ClickHouse connection closed.")
             except Exception as e:
                 print(f"Error during ClickHouse connection close: {e}", file=sys.stderr)
     print("Benchmarking complete for this segment.")
+    return {
+        "rows_inserted": total_rows_inserted_segment,
+        "insert_seconds": total_insertion_time_segment,
+        "batches": total_batches_processed,
+        "failed_batches": sum(1 for result in benchmark_results if result["error"]),
+        "batch_durations": all_batch_durations,
+        "wall_seconds": wall_seconds,
+        "file_read_error": file_read_error,
+    }
 
 
 if __name__ == "__main__":
@@ -505,7 +1074,7 @@ if __name__ == "__main__":
         "--tsv_file",
         required=True,
         type=Path,
-        help="Path to the single large input TSV file.",
+        help="Path to the single large input TSV file (.gz/.zst compressed or Parquet exports work too).",
     )
     parser.add_argument(
         "--batch_size",
@@ -526,7 +1095,104 @@ if __name__ == "__main__":
         default=-1,
         help="Maximum number of data rows to process after offset (-1 for no limit)",
     )
+    parser.add_argument(
+        "--partition_plan",
+        type=Path,
+        default=None,
+        help="Optional: series_catalog.py plan; only rows of this worker's series are inserted",
+    )
+    parser.add_argument(
+        "--worker_num",
+        type=int,
+        default=0,
+        help="Worker number (0-indexed) within the --partition_plan",
+    )
     # ts_format removed
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default="connect",
+        help="connect: clickhouse_connect inserts; rowbinary: INSERT ... FORMAT RowBinary "
+        "streamed over HTTP; native: native TCP protocol via clickhouse-driver; "
+        "passthrough: raw file lines streamed for the server to parse",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="lz4",
+        help="Compression of the insert data (the native protocol supports lz4 and zstd)",
+    )
+    parser.add_argument(
+        "--passthrough_format",
+        choices=PASSTHROUGH_FORMATS,
+        default="TSVWithNames",
+        help="Input format of --transport passthrough. CustomSeparatedWithNames reads the "
+        "csv quoting the fetcher writes for fields containing tabs or quotes",
+    )
+    parser.add_argument(
+        "--native_port",
+        type=int,
+        default=9000,
+        help="ClickHouse native TCP port, used by --transport native",
+    )
+    parser.add_argument(
+        "--async_insert",
+        action="store_true",
+        help="Insert with async_insert=1, letting the server buffer and batch rows",
+    )
+    parser.add_argument(
+        "--wait_for_async_insert",
+        type=int,
+        choices=[0, 1],
+        default=1,
+        help="With --async_insert: 1 acknowledges inserts once flushed to a part, 0 once buffered",
+    )
+    parser.add_argument(
+        "--async_insert_busy_timeout_ms",
+        type=int,
+        default=None,
+        help="With --async_insert: maximum time the server buffers rows before flushing (server default if unset)",
+    )
+    parser.add_argument(
+        "--async_insert_max_data_size",
+        type=int,
+        default=None,
+        help="With --async_insert: buffered bytes that trigger a flush (server default if unset)",
+    )
+    parser.add_argument(
+        "--monitor_db",
+        default=None,
+        help="Optional: database of clickhouse/monitor/monitor.py --server-metrics samples to join with the insert batches",
+    )
+    parser.add_argument(
+        "--monitor_table",
+        default="server_metrics",
+        help="Table of the monitor.py server samples",
+    )
+    parser.add_argument(
+        "--rows_per_sec",
+        type=float,
+        default=None,
+        help="Optional: pace the batches to this many rows per second (default: as fast as possible)",
+    )
+    parser.add_argument(
+        "--arrivals",
+        choices=["constant", "poisson"],
+        default=None,
+        help="With --rows_per_sec: send batches on a fixed open-loop schedule with constant "
+        "or Poisson gaps instead of after the previous batch",
+    )
+    parser.add_argument(
+        "--latency_output",
+        default=None,
+        help="With --rows_per_sec: CSV of every batch's latency from its scheduled send time "
+        "(see scripts/python/utils/pacing.py report)",
+    )
+    parser.add_argument(
+        "--no_pause",
+        action="store_true",
+        help="Start inserting right after the offset is reached instead of waiting for Enter",
+    )
     parser.add_argument(
         "--output",
         required=True,  # Make output required for parallel runs
@@ -555,4 +1221,25 @@ if __name__ == "__main__":
         limit=args.limit,  # Pass limit
         # ts_format removed
         output_file=args.output,
+        partition_plan=args.partition_plan,
+        worker_num=args.worker_num,
+        insert_settings=(
+            async_insert_settings(
+                args.wait_for_async_insert,
+                args.async_insert_busy_timeout_ms,
+                args.async_insert_max_data_size,
+            )
+            if args.async_insert
+            else None
+        ),
+        pause=not args.no_pause,
+        transport=args.transport,
+        compression=args.compression,
+        native_port=args.native_port,
+        passthrough_format=args.passthrough_format,
+        monitor_db=args.monitor_db,
+        monitor_table=args.monitor_table,
+        rows_per_sec=args.rows_per_sec,
+        arrivals=args.arrivals,
+        latency_output=args.latency_output,
     )
@@ -1,8 +1,406 @@
 import argparse
 import csv
+import datetime
+import random
+import struct
 import sys
+import zlib
 from pathlib import Path
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_LOW_CARDINALITY_MAX = 10000
+COUNTER_MIN_MONOTONIC = 0.95
+NUMERIC_NULL_POLICIES = ["auto", "default", "nullable"]
+TIMESTAMP_CODEC = "CODEC(DoubleDelta, ZSTD(1))"
+STRING_CODEC = "CODEC(ZSTD(3))"
+# plain TSVs are sampled in this many evenly spaced runs of consecutive rows
+PROFILE_BLOCKS = 100
+
+
+def add_utils_path():
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+
+
+def open_tsv_file(tsv_file: Path):
+    """
+    Opens a fetcher export as TSV text: plain, .gz/.zst compressed or Parquet
+    (see scripts/python/utils/stardust_io.py).
+    """
+    add_utils_path()
+    from stardust_io import open_input
+
+    return open_input(tsv_file, newline="")
+
+
+def is_plain_tsv(tsv_file: Path) -> bool:
+    add_utils_path()
+    from stardust_io import compression_of, is_parquet
+
+    return not is_parquet(tsv_file) and compression_of(tsv_file) is None
+
+
+def sample_blocks(tsv_file: Path, header: list, profile_rows: int) -> list:
+    """
+    Up to profile_rows rows of a plain TSV, in PROFILE_BLOCKS runs of
+    consecutive rows starting at evenly spaced byte offsets, so that a
+    time-sorted export is sampled over its whole time range.
+    """
+    size = tsv_file.stat().st_size
+    blocks = min(PROFILE_BLOCKS, profile_rows)
+    rows_per_block = -(-profile_rows // blocks)
+    lines = []
+    with open(tsv_file, "rb") as f:
+        data_start = len(f.readline())
+        offsets = [
+            data_start + (size - data_start) * block // blocks
+            for block in range(blocks + 1)
+        ]
+        for start, end in zip(offsets, offsets[1:]):
+            if start > data_start:
+                # from the byte before start, so a line beginning at start is kept
+                f.seek(start - 1)
+                f.readline()
+            else:
+                f.seek(start)
+            block_lines = 0
+            while block_lines < rows_per_block and f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line.decode("utf-8"))
+                block_lines += 1
+    reader = csv.reader(lines, delimiter="\t")
+    return [row for row in reader if len(row) == len(header)][:profile_rows]
+
+
+def sample_reservoir(tsvfile, header: list, profile_rows: int) -> list:
+    """A uniform sample of profile_rows rows of the rest of tsvfile, read entirely."""
+    sampler = random.Random(0)
+    rows = []
+    seen = 0
+    for row in csv.reader(tsvfile, delimiter="\t"):
+        if len(row) != len(header):
+            continue
+        seen += 1
+        if len(rows) < profile_rows:
+            rows.append(row)
+        else:
+            slot = sampler.randrange(seen)
+            if slot < profile_rows:
+                rows[slot] = row
+    return rows
+
+
+def float32_lossless(value: float) -> bool:
+    return struct.unpack("<f", struct.pack("<f", value))[0] == value
+
+
+class ColumnProfile:
+    """Statistics of one column over the sampled rows."""
+
+    def __init__(self, name: str, low_cardinality_max: int):
+        self.name = name
+        self.low_cardinality_max = low_cardinality_max
+        self.values = []
+        self.nulls = 0
+        self.distinct = set()
+        self.numeric = True
+        self.integral = True
+        self.float32 = True
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, raw: str):
+        self.values.append(raw)
+        if raw == "":
+            self.nulls += 1
+            return
+        if len(self.distinct) <= self.low_cardinality_max:
+            self.distinct.add(raw)
+        if not self.numeric:
+            return
+        try:
+            value = float(raw)
+        except ValueError:
+            self.numeric = False
+            return
+        if self.integral and not value.is_integer():
+            self.integral = False
+        if self.float32:
+            try:
+                self.float32 = float32_lossless(value)
+            except OverflowError:
+                self.float32 = False
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @property
+    def present(self) -> int:
+        return len(self.values) - self.nulls
+
+    def monotonic_fraction(self, series_keys: list) -> float:
+        """Share of consecutive samples of a series (rows in series order) that do not decrease."""
+        steps = 0
+        increasing = 0
+        previous_key = None
+        previous = None
+        for key, raw in zip(series_keys, self.values):
+            if raw == "":
+                continue
+            value = float(raw)
+            if key == previous_key and previous is not None:
+                steps += 1
+                if value >= previous:
+                    increasing += 1
+            previous_key = key
+            previous = value
+        return increasing / steps if steps else 0.0
+
+
+def choose_column(
+    profile: ColumnProfile,
+    timestamp_col: str,
+    required_string_cols_set: set,
+    numeric_nulls: str,
+    series_keys: list,
+) -> dict:
+    """
+    Picks type, default and codec of a column from its profile. Returns a spec
+    with the SQL definition parts and the physical encoding used to estimate
+    its compressed size.
+    """
+    name = profile.name
+    if name == timestamp_col:
+        return {
+            "type": "DateTime64(3, 'UTC')",
+            "default": "",
+            "codec": TIMESTAMP_CODEC,
+            "encoding": "timestamp",
+            "transform": "double_delta",
+        }
+    if name.startswith("values.") and profile.numeric:
+        nullable = numeric_nulls == "nullable" or (
+            numeric_nulls == "auto" and 0 < profile.nulls < len(profile.values)
+        )
+        if (
+            profile.present
+            and profile.integral
+            and profile.minimum >= 0
+            and profile.maximum < 2**64
+        ):
+            col_type, encoding = "UInt64", "uint64"
+        elif (
+            profile.present
+            and profile.integral
+            and -(2**63) <= profile.minimum
+            and profile.maximum < 2**63
+        ):
+            col_type, encoding = "Int64", "int64"
+        elif profile.present and profile.float32:
+            col_type, encoding = "Float32", "float32"
+        else:
+            col_type, encoding = "Float64", "float64"
+        # Delta on floats needs allow_suspicious_codecs, so only integer
+        # counters get it
+        counter = (
+            profile.present
+            and not encoding.startswith("float")
+            and profile.monotonic_fraction(series_keys) >= COUNTER_MIN_MONOTONIC
+        )
+        if counter:
+            codec, transform = "CODEC(Delta, ZSTD(1))", "delta"
+        elif encoding.startswith("float"):
+            codec, transform = "CODEC(Gorilla, ZSTD(1))", "xor"
+        else:
+            codec, transform = "CODEC(T64, ZSTD(1))", None
+        if nullable:
+            return {
+                "type": f"Nullable({col_type})",
+                "default": "",
+                "codec": codec,
+                "encoding": encoding,
+                "transform": transform,
+                "nullable": True,
+            }
+        return {
+            "type": col_type,
+            "default": "DEFAULT 0",
+            "codec": codec,
+            "encoding": encoding,
+            "transform": transform,
+        }
+    # TSV cannot tell NULL from an empty string, so strings default to ''
+    default = "" if name in required_string_cols_set else "DEFAULT ''"
+    if len(profile.distinct) <= profile.low_cardinality_max:
+        return {
+            "type": "LowCardinality(String)",
+            "default": default,
+            "codec": "",
+            "encoding": "low_cardinality",
+        }
+    return {
+        "type": "String",
+        "default": default,
+        "codec": STRING_CODEC,
+        "encoding": "string",
+    }
+
+
+def header_only_spec(
+    name: str, timestamp_col: str, required_string_cols_set: set
+) -> dict:
+    """The spec the header-only mode gives a column, the baseline of the estimate."""
+    if name == timestamp_col:
+        return {"encoding": "timestamp"}
+    if name in required_string_cols_set:
+        return {"encoding": "string"}
+    if name.startswith("values."):
+        return {"encoding": "float64", "nullable": True}
+    return {"encoding": "string", "nullable": True}
+
+
+PACK_FORMATS = {
+    "uint64": "Q",
+    "int64": "q",
+    "float32": "f",
+    "float64": "d",
+    "timestamp": "q",
+}
+
+
+def encode_column(values: list, spec: dict) -> bytes:
+    """
+    Approximates the bytes ClickHouse stores for a column before general
+    purpose compression: fixed width numbers after the Delta, DoubleDelta or
+    Gorilla-like (xor with the previous value) transform, strings with length
+    prefixes or as a dictionary plus indexes, and a byte per row of null map
+    for Nullable columns.
+    """
+    encoding = spec["encoding"]
+    null_map = (
+        bytes(1 if raw == "" else 0 for raw in values) if spec.get("nullable") else b""
+    )
+    if encoding in ("string", "low_cardinality"):
+        if encoding == "low_cardinality":
+            dictionary = {}
+            indexes = [dictionary.setdefault(raw, len(dictionary)) for raw in values]
+            width = (
+                "B"
+                if len(dictionary) <= 256
+                else "H" if len(dictionary) <= 65536 else "I"
+            )
+            body = "\n".join(dictionary).encode("utf-8") + struct.pack(
+                f"<{len(indexes)}{width}", *indexes
+            )
+        else:
+            body = b"".join(
+                len(raw.encode("utf-8")).to_bytes(4, "little") + raw.encode("utf-8")
+                for raw in values
+            )
+        return null_map + body
+    if encoding == "timestamp":
+        numbers = []
+        for raw in values:
+            try:
+                dt = datetime.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+                numbers.append(int(dt.timestamp() * 1000))
+            except ValueError:
+                numbers.append(0)
+    elif encoding in ("uint64", "int64"):
+        numbers = [int(float(raw)) if raw else 0 for raw in values]
+    else:
+        numbers = [float(raw) if raw else 0.0 for raw in values]
+    fmt = PACK_FORMATS[encoding]
+    transform = spec.get("transform")
+    if transform == "xor":
+        # xor the bit patterns of consecutive values, as Gorilla does
+        bits_fmt = "I" if fmt == "f" else "Q"
+        bits = struct.unpack(
+            f"<{len(numbers)}{bits_fmt}", struct.pack(f"<{len(numbers)}{fmt}", *numbers)
+        )
+        numbers = [bits[0]] + [a ^ b for a, b in zip(bits[1:], bits)] if bits else []
+        fmt = bits_fmt
+    elif transform in ("delta", "double_delta"):
+        passes = 2 if transform == "double_delta" else 1
+        for _ in range(passes):
+            numbers = numbers[:1] + [b - a for a, b in zip(numbers, numbers[1:])]
+        numbers = [n % 2**64 for n in numbers]
+        fmt = "Q"
+    return null_map + struct.pack(f"<{len(numbers)}{fmt}", *numbers)
+
+
+def compressed_size(data: bytes) -> int:
+    if zstandard is not None:
+        return len(zstandard.ZstdCompressor(level=1).compress(data))
+    return len(zlib.compress(data, 1))
+
+
+def profile_tsv(
+    rows: list,
+    header: list,
+    low_cardinality_max: int,
+    orderby_cols: list,
+):
+    """
+    Reads sampled data rows into column profiles. The sampled values are
+    reordered by the ORDER BY columns, the order ClickHouse stores them in,
+    and the series keys (the ORDER BY columns but the last) of that order are
+    returned with the profiles.
+    """
+    order_idxs = [header.index(col) for col in orderby_cols]
+    rows.sort(key=lambda row: [row[idx] for idx in order_idxs])
+    profiles = [ColumnProfile(name, low_cardinality_max) for name in header]
+    for row in rows:
+        for profile, raw in zip(profiles, row):
+            profile.add(raw)
+    series_keys = [tuple(row[idx] for idx in order_idxs[:-1]) for row in rows]
+    return profiles, series_keys
+
+
+def print_estimate(profiles: list, specs: list, baseline_specs: list):
+    """Prints sampled bytes per row and compression ratios of both schemas."""
+    rows = len(profiles[0].values) if profiles else 0
+    if not rows:
+        print("No data rows sampled, skipping the compression estimate.")
+        return
+    compressor = "zstd(1)" if zstandard is not None else "zlib(1)"
+    totals = {"baseline_raw": 0, "baseline": 0, "raw": 0, "compressed": 0}
+    per_column = []
+    for profile, spec, baseline_spec in zip(profiles, specs, baseline_specs):
+        baseline_raw = encode_column(profile.values, baseline_spec)
+        raw = encode_column(profile.values, spec)
+        sizes = (
+            len(baseline_raw),
+            compressed_size(baseline_raw),
+            len(raw),
+            compressed_size(raw),
+        )
+        for key, size in zip(totals, sizes):
+            totals[key] += size
+        per_column.append((sizes[1] - sizes[3], profile.name, sizes))
+    print(f"\n--- Estimated storage over {rows} sampled rows ({compressor}) ---")
+    print(f"{'schema':<14} {'raw B/row':>10} {'compressed B/row':>17} {'ratio':>7}")
+    for label, raw_key, compressed_key in [
+        ("header-only", "baseline_raw", "baseline"),
+        ("profiled", "raw", "compressed"),
+    ]:
+        print(
+            f"{label:<14} {totals[raw_key] / rows:>10.1f} {totals[compressed_key] / rows:>17.1f} "
+            f"{totals[raw_key] / max(totals[compressed_key], 1):>7.1f}"
+        )
+    print(
+        f"Expected compressed size vs. header-only schema: {totals['compressed'] / max(totals['baseline'], 1):.1%}"
+    )
+    print("Largest savings:")
+    for saving, name, sizes in sorted(per_column, reverse=True)[:10]:
+        print(f"  {name:<50} {sizes[1] / rows:>8.2f} -> {sizes[3] / rows:>8.2f} B/row")
+
 
 def generate_schema(
     tsv_file: Path,
@@ -12,9 +410,13 @@ def generate_schema(
     timestamp_col: str = "@timestamp",
     orderby_cols: str = "meta.device,meta.name,@timestamp",
     required_string_cols: str = "meta.device,meta.name",
+    profile_rows: int = 0,
+    low_cardinality_max: int = DEFAULT_LOW_CARDINALITY_MAX,
+    numeric_nulls: str = "auto",
 ):
     """
-    Reads the header of a TSV file and generates a ClickHouse CREATE TABLE SQL schema.
+    Reads the header of a TSV file, and with profile_rows a sample of its rows,
+    and generates a ClickHouse CREATE TABLE SQL schema.
 
     Args:
         tsv_file: Path to the input TSV file.
@@ -24,11 +426,17 @@ def generate_schema(
         timestamp_col: Name of the timestamp column in the TSV header.
         orderby_cols: Comma-separated string of columns for ORDER BY clause.
         required_string_cols: Comma-separated string of columns for non-nullable String.
+        profile_rows: Data rows to sample, across the whole file, for choosing
+            types and codecs. 0 only reads the header.
+        low_cardinality_max: Most distinct sampled values of a LowCardinality column.
+        numeric_nulls: For values.* columns: "default" stores empty cells as 0,
+            "nullable" keeps Nullable types, "auto" uses Nullable only for
+            columns that are sometimes empty in the sample.
     """
     print(f"Reading header from TSV file: {tsv_file}")
 
     try:
-        with open(tsv_file, "r", newline="", encoding="utf-8") as tsvfile:
+        with open_tsv_file(tsv_file) as tsvfile:
             reader = csv.reader(tsvfile, delimiter="\t")
             try:
                 header = [h.strip() for h in next(reader)]
@@ -41,6 +449,26 @@ def generate_schema(
             except Exception as e:
                 print(f"Error reading header from '{tsv_file}': {e}", file=sys.stderr)
                 sys.exit(1)
+            if header and profile_rows > 0:
+                orderby_list = [c.strip() for c in orderby_cols.split(",") if c.strip()]
+                missing = [c for c in orderby_list if c not in header]
+                if missing:
+                    print(
+                        f"Error: ORDER BY columns not found in TSV header: {missing}",
+                        file=sys.stderr,
+                    )
+                    sys.exit(1)
+                if is_plain_tsv(tsv_file):
+                    print(f"Profiling up to {profile_rows} rows across the file...")
+                    rows = sample_blocks(tsv_file, header, profile_rows)
+                else:
+                    print(
+                        f"Profiling a sample of {profile_rows} rows (reads the whole file)..."
+                    )
+                    rows = sample_reservoir(tsvfile, header, profile_rows)
+                profiles, series_keys = profile_tsv(
+                    rows, header, low_cardinality_max, orderby_list
+                )
 
         if not header:
             print(
@@ -56,7 +484,8 @@ def generate_schema(
         processed_cols = set()
 
         # Helper sets for quick lookup
-        orderby_cols_set = set(c.strip() for c in orderby_cols.split(",") if c.strip())
+        # a list, not a set: the ORDER BY column order matters
+        orderby_cols_set = [c.strip() for c in orderby_cols.split(",") if c.strip()]
         required_string_cols_set = set(
             c.strip() for c in required_string_cols.split(",") if c.strip()
         )
@@ -79,7 +508,10 @@ def generate_schema(
             )
             sys.exit(1)
 
-        for col_name in header:
+        specs = []
+        baseline_specs = []
+        profiled = []
+        for col_idx, col_name in enumerate(header):
             if not col_name:
                 print(
                     "Warning: Found empty column name in header, skipping.",
@@ -88,6 +520,32 @@ def generate_schema(
                 continue
 
             quoted_col_name = f"`{col_name}`"
+            if profile_rows > 0:
+                spec = choose_column(
+                    profiles[col_idx],
+                    timestamp_col,
+                    required_string_cols_set,
+                    numeric_nulls,
+                    series_keys,
+                )
+                specs.append(spec)
+                baseline_specs.append(
+                    header_only_spec(col_name, timestamp_col, required_string_cols_set)
+                )
+                profiled.append(profiles[col_idx])
+                definition = " ".join(
+                    part
+                    for part in [
+                        quoted_col_name,
+                        spec["type"],
+                        spec["default"],
+                        spec["codec"],
+                    ]
+                    if part
+                )
+                column_definitions.append(f"    {definition}")
+                continue
+
             col_type = "Nullable(String)"
 
             if col_name == timestamp_col:
@@ -150,6 +608,16 @@ ORDER BY {orderby_clause_str};
         print("\n--- Generated ClickHouse Schema ---")
         print(create_table_sql)
         print("-----------------------------------")
+        if profile_rows > 0:
+            type_counts = {}
+            for spec in specs:
+                type_counts[spec["type"]] = type_counts.get(spec["type"], 0) + 1
+            print("Column types chosen:")
+            for col_type, count in sorted(
+                type_counts.items(), key=lambda item: -item[1]
+            ):
+                print(f"  {count:>5} {col_type}")
+            print_estimate(profiled, specs, baseline_specs)
 
         try:
             with open(output_sql_file, "w", encoding="utf-8") as f_out:
@@ -178,14 +646,15 @@ ORDER BY {orderby_clause_str};
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Generate a ClickHouse CREATE TABLE schema from a TSV header.",
+        description="Generate a ClickHouse CREATE TABLE schema from a TSV header, or from a profile of sampled rows with --profile_rows.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument(
         "--tsv_file",
         required=True,
         type=Path,
-        help="Path to the input TSV file (only header is read).",
+        help="Path to the input TSV file, also .gz/.zst or Parquet exports. Only the "
+        "header is read unless --profile_rows is set.",
     )
     parser.add_argument(
         "--db_name", required=True, help="Name of the ClickHouse database."
@@ -215,6 +684,34 @@ if __name__ == "__main__":
         help="Comma-separated list of column names to define as non-nullable String.",
     )
 
+    parser.add_argument(
+        "--profile_rows",
+        type=int,
+        default=0,
+        help="Sample this many data rows and choose types, defaults and codecs from "
+        "the data, printing the expected compression. Plain TSVs are sampled in runs "
+        "of rows spread over the whole file, compressed and Parquet exports with a "
+        "reservoir sample that reads all of it. Rows outside the sample are not "
+        "checked: the inserter skips rows with fractional values in an integer column, "
+        "and a Float32 column rounds values it cannot hold. The sampled values are held in memory. 0 reads only the header and types every values.* column "
+        "Nullable(Float64), everything else Nullable(String).",
+    )
+    parser.add_argument(
+        "--low_cardinality_max",
+        type=int,
+        default=DEFAULT_LOW_CARDINALITY_MAX,
+        help="With --profile_rows: string columns with at most this many distinct "
+        "sampled values become LowCardinality(String).",
+    )
+    parser.add_argument(
+        "--numeric_nulls",
+        choices=NUMERIC_NULL_POLICIES,
+        default="auto",
+        help="With --profile_rows: empty values.* cells are stored as DEFAULT 0 "
+        "('default'), as NULL ('nullable'), or as NULL only in columns that are "
+        "sometimes empty in the sample ('auto').",
+    )
+
     args = parser.parse_args()
 
     # Call the function using attribute access on args object
@@ -226,4 +723,7 @@ if __name__ == "__main__":
         timestamp_col=args.timestamp_col,
         orderby_cols=args.orderby_cols,
         required_string_cols=args.required_string_cols,
+        profile_rows=args.profile_rows,
+        low_cardinality_max=args.low_cardinality_max,
+        numeric_nulls=args.numeric_nulls,
     )
@@ -0,0 +1,430 @@
+"""
+Insert paths for clickhouse_insert_benchmark.py. Each inserter takes the
+benchmark's batches, lists of values in table column order, and inserts them
+into one table:
+
+  connect    clickhouse_connect client inserts over HTTP
+  rowbinary  INSERT ... FORMAT RowBinary over HTTP, the body encoded here
+             and streamed chunked, compressed per --compression
+  native     the native TCP protocol through clickhouse-driver, which sends
+             Native format blocks, compressed per --compression
+
+The passthrough transport skips the benchmark's parsing altogether: the
+export's lines are sent as they are and parsed by the server (see
+TSVPassthroughInserter and passthrough_insert_and_benchmark()).
+"""
+
+import datetime
+import struct
+import sys
+import zlib
+
+import urllib3
+
+TRANSPORTS = ["connect", "rowbinary", "native", "passthrough"]
+COMPRESSIONS = ["none", "lz4", "zstd", "gzip"]
+STREAM_CHUNK_BYTES = 1024 * 1024
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+PASSTHROUGH_FORMATS = ["TSVWithNames", "CustomSeparatedWithNames"]
+PASSTHROUGH_SETTINGS = {
+    "input_format_with_names_use_header": 1,
+    "input_format_skip_unknown_fields": 1,
+    "input_format_tsv_empty_as_default": 1,
+    "input_format_csv_empty_as_default": 1,
+    "input_format_null_as_default": 1,
+    "date_time_input_format": "best_effort",
+}
+# tab separated fields with the csv module's quoting, as the fetcher writes
+# them; empty fields read as NULL, so null_as_default covers DEFAULT columns
+CSV_QUOTED_TSV_SETTINGS = {
+    "format_custom_escaping_rule": "CSV",
+    "format_custom_field_delimiter": "\t",
+    "format_csv_null_representation": "",
+}
+
+STRUCT_FORMATS = {
+    "Bool": "<?",
+    "UInt8": "<B",
+    "UInt16": "<H",
+    "UInt32": "<I",
+    "UInt64": "<Q",
+    "Int8": "<b",
+    "Int16": "<h",
+    "Int32": "<i",
+    "Int64": "<q",
+    "Float32": "<f",
+    "Float64": "<d",
+}
+
+
+def write_varint(value: int, out: bytearray):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def to_utc(value) -> datetime.datetime:
+    # the benchmark parses timestamps as UTC; treat naive ones the same way
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def column_encoder(ch_type: str):
+    """
+    Returns a function appending the RowBinary encoding of one value of a
+    ClickHouse column type to a bytearray. None is written as NULL for
+    Nullable columns and as the type's zero value otherwise.
+    """
+    if ch_type.startswith("LowCardinality("):
+        # RowBinary carries LowCardinality values as the inner type
+        return column_encoder(ch_type[len("LowCardinality(") : -1])
+    if ch_type.startswith("Nullable("):
+        inner = column_encoder(ch_type[len("Nullable(") : -1])
+
+        def encode_nullable(value, out: bytearray):
+            if value is None:
+                out.append(1)
+            else:
+                out.append(0)
+                inner(value, out)
+
+        return encode_nullable
+
+    if ch_type in STRUCT_FORMATS:
+        pack = struct.Struct(STRUCT_FORMATS[ch_type]).pack
+        cast = float if ch_type.startswith("Float") else int
+
+        def encode_number(value, out: bytearray):
+            out += pack(cast(value) if value is not None else cast(0))
+
+        return encode_number
+
+    if ch_type == "String":
+
+        def encode_string(value, out: bytearray):
+            data = b"" if value is None else str(value).encode("utf-8")
+            write_varint(len(data), out)
+            out += data
+
+        return encode_string
+
+    if ch_type.startswith("DateTime64("):
+        precision = int(ch_type[len("DateTime64(") :].split(",")[0].rstrip(")"))
+        pack = struct.Struct("<q").pack
+
+        def encode_datetime64(value, out: bytearray):
+            if value is None:
+                out += pack(0)
+                return
+            micros = (to_utc(value) - EPOCH) // datetime.timedelta(microseconds=1)
+            out += pack(micros * 10**precision // 10**6)
+
+        return encode_datetime64
+
+    if ch_type == "DateTime" or ch_type.startswith("DateTime("):
+        pack = struct.Struct("<I").pack
+
+        def encode_datetime(value, out: bytearray):
+            out += pack(0 if value is None else int(to_utc(value).timestamp()))
+
+        return encode_datetime
+
+    if ch_type == "Date":
+        pack = struct.Struct("<H").pack
+
+        def encode_date(value, out: bytearray):
+            if value is None:
+                out += pack(0)
+            else:
+                day = value.date() if isinstance(value, datetime.datetime) else value
+                out += pack((day - EPOCH.date()).days)
+
+        return encode_date
+
+    raise ValueError(f"RowBinary encoding of {ch_type} columns is not supported")
+
+
+def new_compressor(compression: str):
+    """Returns (compress, flush) functions for an HTTP Content-Encoding."""
+    if compression == "lz4":
+        import lz4.frame
+
+        compressor = lz4.frame.LZ4FrameCompressor()
+        header = compressor.begin()
+
+        def compress_lz4(data: bytes) -> bytes:
+            nonlocal header
+            chunk, header = header + compressor.compress(data), b""
+            return chunk
+
+        def flush_lz4() -> bytes:
+            return header + compressor.flush()
+
+        return compress_lz4, flush_lz4
+    if compression == "zstd":
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor().compressobj()
+        return compressor.compress, compressor.flush
+    if compression == "gzip":
+        compressor = zlib.compressobj(wbits=31)
+        return compressor.compress, compressor.flush
+    return bytes, bytes
+
+
+class ConnectInserter:
+    """clickhouse_connect client inserts, the benchmark's original path."""
+
+    def __init__(self, client, db_name, table_name, column_names, settings=None):
+        self.client = client
+        self.db_name = db_name
+        self.table_name = table_name
+        self.column_names = column_names
+        self.settings = settings
+
+    def insert(self, batch_data: list):
+        self.client.insert(
+            table=self.table_name,
+            data=batch_data,
+            column_names=self.column_names,
+            database=self.db_name,
+            settings=self.settings,
+        )
+
+    def close(self):
+        pass  # the client is closed by the benchmark
+
+
+class HTTPStreamInserter:
+    """
+    Base for inserts whose body is sent as one INSERT ... FORMAT query over
+    HTTP, streamed chunked and compressed through Content-Encoding.
+    """
+
+    def __init__(
+        self, host, port, user, password, db_name, query, compression, settings
+    ):
+        self.compression = compression
+        self.url = f"http://{host}:{port}/"
+        self.fields = {
+            "query": query,
+            "database": db_name,
+            **{key: str(value) for key, value in (settings or {}).items()},
+        }
+        self.headers = {
+            "X-ClickHouse-User": user,
+            "X-ClickHouse-Key": password,
+            "Content-Type": "application/octet-stream",
+        }
+        if compression != "none":
+            self.headers["Content-Encoding"] = compression
+        self.http = urllib3.PoolManager(maxsize=1)
+
+    def compressed(self, chunks):
+        compress, flush = new_compressor(self.compression)
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        data = flush()
+        if data:
+            yield data
+
+    def post(self, chunks):
+        """Sends an iterable of uncompressed body chunks as one insert."""
+        response = self.http.request_encode_url(
+            "POST",
+            self.url,
+            fields=self.fields,
+            body=self.compressed(chunks),
+            headers=self.headers,
+            chunked=True,
+            preload_content=True,
+        )
+        if response.status != 200:
+            raise RuntimeError(
+                f"HTTP {response.status}: {response.data.decode('utf-8', 'replace').strip()}"
+            )
+
+    def close(self):
+        self.http.clear()
+
+
+class RowBinaryInserter(HTTPStreamInserter):
+    """INSERT ... FORMAT RowBinary, the body encoded from the table schema."""
+
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db_name,
+        table_name,
+        table_schema: dict,
+        compression="lz4",
+        settings=None,
+    ):
+        self.encoders = [column_encoder(table_schema[c]["type"]) for c in table_schema]
+        columns = ", ".join(f"`{c}`" for c in table_schema)
+        super().__init__(
+            host,
+            port,
+            user,
+            password,
+            db_name,
+            f"INSERT INTO `{db_name}`.`{table_name}` ({columns}) FORMAT RowBinary",
+            compression,
+            settings,
+        )
+
+    def encode_chunks(self, batch_data: list):
+        """Yields the RowBinary body about STREAM_CHUNK_BYTES at a time."""
+        encoders = self.encoders
+        out = bytearray()
+        for row in batch_data:
+            for encode, value in zip(encoders, row):
+                encode(value, out)
+            if len(out) >= STREAM_CHUNK_BYTES:
+                yield bytes(out)
+                out = bytearray()
+        yield bytes(out)
+
+    def insert(self, batch_data: list):
+        self.post(self.encode_chunks(batch_data))
+
+
+class TSVPassthroughInserter(HTTPStreamInserter):
+    """
+    Sends raw lines of a fetcher export, each chunk behind the header line,
+    for the server to parse. Columns are matched by header name; export
+    columns missing from the table are skipped and empty fields get the
+    column default. TSVWithNames reads ClickHouse TSV escaping, while
+    CustomSeparatedWithNames is set up to read the csv module quoting the
+    fetcher writes, so exports with quoted fields need the latter.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db_name,
+        table_name,
+        header_line: bytes,
+        input_format="TSVWithNames",
+        compression="lz4",
+        settings=None,
+    ):
+        self.header_line = header_line
+        format_settings = dict(PASSTHROUGH_SETTINGS)
+        if input_format == "CustomSeparatedWithNames":
+            format_settings.update(CSV_QUOTED_TSV_SETTINGS)
+        super().__init__(
+            host,
+            port,
+            user,
+            password,
+            db_name,
+            f"INSERT INTO `{db_name}`.`{table_name}` FORMAT {input_format}",
+            compression,
+            {**format_settings, **(settings or {})},
+        )
+
+    def insert_chunk(self, data: bytes):
+        view = memoryview(data)
+        self.post(
+            [self.header_line]
+            + [
+                view[i : i + STREAM_CHUNK_BYTES]
+                for i in range(0, len(view), STREAM_CHUNK_BYTES)
+            ]
+        )
+
+
+class NativeInserter:
+    """The native TCP protocol through clickhouse-driver."""
+
+    def __init__(
+        self,
+        host,
+        native_port,
+        user,
+        password,
+        db_name,
+        table_name,
+        column_names,
+        compression="lz4",
+        settings=None,
+    ):
+        try:
+            from clickhouse_driver import Client
+        except ImportError:
+            sys.exit(
+                "The native transport needs clickhouse-driver "
+                "(pip install 'clickhouse-driver[lz4,zstd]')"
+            )
+        if compression == "gzip":
+            sys.exit("The native protocol compresses with lz4 or zstd, not gzip")
+        self.client = Client(
+            host=host,
+            port=native_port,
+            user=user,
+            password=password,
+            database=db_name,
+            compression=False if compression == "none" else compression,
+            settings=settings or {},
+        )
+        columns = ", ".join(f"`{c}`" for c in column_names)
+        self.query = f"INSERT INTO `{db_name}`.`{table_name}` ({columns}) VALUES"
+
+    def insert(self, batch_data: list):
+        self.client.execute(self.query, batch_data)
+
+    def close(self):
+        self.client.disconnect()
+
+
+def make_inserter(
+    transport: str,
+    client,
+    host,
+    port,
+    native_port,
+    user,
+    password,
+    db_name,
+    table_name,
+    table_schema: dict,
+    compression="lz4",
+    settings=None,
+):
+    column_names = list(table_schema.keys())
+    if transport == "rowbinary":
+        return RowBinaryInserter(
+            host,
+            port,
+            user,
+            password,
+            db_name,
+            table_name,
+            table_schema,
+            compression,
+            settings,
+        )
+    if transport == "native":
+        return NativeInserter(
+            host,
+            native_port,
+            user,
+            password,
+            db_name,
+            table_name,
+            column_names,
+            compression,
+            settings,
+        )
+    return ConnectInserter(client, db_name, table_name, column_names, settings)
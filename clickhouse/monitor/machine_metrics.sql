@@ -4,6 +4,10 @@ CREATE TABLE IF NOT EXISTS `%s`.`%s` (
     `memory_pressure` Nullable(Float64),
     `io_pressure` Nullable(Float64),
     `cpu_pressure` Nullable(Float64),
+    `disk_read_bytes_per_sec` Nullable(Float64), -- rates are only recorded with --daemon
+    `disk_write_bytes_per_sec` Nullable(Float64),
+    `net_rx_bytes_per_sec` Nullable(Float64),
+    `net_tx_bytes_per_sec` Nullable(Float64),
     `insert_time` DateTime64(3, 'UTC') DEFAULT now()
 )
 ENGINE = MergeTree()
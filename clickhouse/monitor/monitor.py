@@ -5,9 +5,16 @@ import argparse
 import clickhouse_connect
 import logging
 import sys
+import time
+import datetime
+import signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "python", "utils"))
+from host_sampler import HostSampler, read_disk_bytes
 
 parser = argparse.ArgumentParser(prog='Periodic Monitoring Script',
-                    description='Monitors key system pressure statistics. Intended to be run once per minute')
+                    description='Monitors key system pressure statistics. Intended to be run once per minute, '
+                                'or continuously with --daemon')
 
 parser.add_argument("--host", default="localhost")
 parser.add_argument("--database", default='metranova')
@@ -16,6 +23,20 @@ parser.add_argument("--user", default="default")
 parser.add_argument("--password", default='unknown')
 parser.add_argument("--log-level", default='warning')
 parser.add_argument("--table-name", default='machine_metrics')
+parser.add_argument("--server-metrics", action='store_true',
+                    help='Also sample parts, merges, insert counters and disk throughput of the ClickHouse server')
+parser.add_argument("--server-table-name", default='server_metrics')
+parser.add_argument("--parts-table-name", default='partition_parts')
+parser.add_argument("--server-interval", type=float, default=10,
+                    help='Seconds between server samples')
+parser.add_argument("--server-samples", type=int, default=6,
+                    help='Server samples per run; the default covers a minute of cron runs')
+parser.add_argument("--daemon", action='store_true',
+                    help='Keep running, reading host statistics from /proc every --interval seconds')
+parser.add_argument("--interval", type=float, default=1,
+                    help='Daemon mode: seconds between host samples')
+parser.add_argument("--flush-interval", type=float, default=10,
+                    help='Daemon mode: seconds between bulk inserts of the buffered samples')
 
 arguments = parser.parse_args()
 
@@ -27,6 +48,9 @@ MEASUREMENTS = {
     "cpu_pressure": { "command": ["cat", "/proc/pressure/cpu"], "parser": rb'some.*avg60=([\d\.]+) '} ,
 }
 
+for measurement in MEASUREMENTS.values():
+    measurement['parser'] = re.compile(measurement['parser'])
+
 logging.basicConfig(level = getattr(logging, arguments.log_level.upper()),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
@@ -41,8 +65,7 @@ def do_measurements():
                          stderr=subprocess.STDOUT)
 
         for line in p.stdout:
-            parser = re.compile(measurement['parser'])
-            match = parser.match(line)
+            match = measurement['parser'].match(line)
             if match:
                 # match.groups(0) is e.g. (b'0.00',)
                 output[column] = float(match.groups(0)[0])
@@ -55,13 +78,156 @@ def do_measurements():
     ]
     return [output[k] for k in keys]
 
-def maybe_create_table(client):
+def maybe_create_table(client, sql_file="machine_metrics.sql", table_name=None):
     file_path = os.path.dirname(os.path.realpath(__file__))
-    with open(os.path.join(file_path, "machine_metrics.sql")) as infile:
+    with open(os.path.join(file_path, sql_file)) as infile:
         create_statement = infile.read()
-        create_statement = create_statement % (arguments.database, arguments.table_name)
+        create_statement = create_statement % (arguments.database, table_name or arguments.table_name)
         client.command(create_statement)
 
+# cumulative system.events counters, stored as is; consumers take differences
+SERVER_EVENTS = {
+    'InsertedRows': 'inserted_rows',
+    'InsertedBytes': 'inserted_bytes',
+    'MergedRows': 'merged_rows',
+    'DelayedInserts': 'delayed_inserts',
+    'RejectedInserts': 'rejected_inserts',
+    'DelayedInsertsMilliseconds': 'delayed_inserts_ms',
+}
+SERVER_METRICS = {
+    'DelayedInserts': 'delayed_inserts_now',
+    'BackgroundMergesAndMutationsPoolTask': 'background_merges_now',
+}
+SERVER_COLUMNS = [
+    'sample_time', 'active_parts', 'max_partition_parts', 'merges_running',
+    'merge_source_parts', 'merge_max_elapsed', 'merge_rows_read',
+    *SERVER_EVENTS.values(), *SERVER_METRICS.values(),
+    'disk_read_bytes', 'disk_write_bytes',
+]
+PARTS_COLUMNS = ['sample_time', 'database', 'table', 'partition', 'active_parts', 'rows', 'bytes_on_disk']
+
+def sample_server(client):
+    """One sample of merge pressure: a server_metrics row and partition_parts rows."""
+    sample_time = datetime.datetime.now(datetime.timezone.utc)
+    partitions = client.query(
+        "SELECT database, table, partition, count(), sum(rows), sum(bytes_on_disk) "
+        "FROM system.parts WHERE active AND database NOT IN ('system', 'INFORMATION_SCHEMA', 'information_schema') "
+        "GROUP BY database, table, partition").result_rows
+    merges = client.query(
+        "SELECT count(), sum(num_parts), max(elapsed), sum(rows_read) FROM system.merges").result_rows[0]
+    events = dict(client.query(
+        "SELECT event, value FROM system.events WHERE has({names:Array(String)}, event)",
+        parameters={'names': list(SERVER_EVENTS)}).result_rows)
+    metrics = dict(client.query(
+        "SELECT metric, value FROM system.metrics WHERE has({names:Array(String)}, metric)",
+        parameters={'names': list(SERVER_METRICS)}).result_rows)
+    try:
+        disk_read_bytes, disk_write_bytes = read_disk_bytes()
+    except OSError as e:
+        logger.warning(f"Could not read /proc/diskstats: {e}")
+        disk_read_bytes = disk_write_bytes = 0
+    row = [
+        sample_time,
+        sum(p[3] for p in partitions),
+        max((p[3] for p in partitions), default=0),
+        merges[0], merges[1] or 0, merges[2] or 0.0, merges[3] or 0,
+        *[events.get(name, 0) for name in SERVER_EVENTS],
+        *[metrics.get(name, 0) for name in SERVER_METRICS],
+        disk_read_bytes, disk_write_bytes,
+    ]
+    return row, [[sample_time, *p] for p in partitions]
+
+def insert_server_samples(client):
+    maybe_create_table(client, "server_metrics.sql", arguments.server_table_name)
+    maybe_create_table(client, "partition_parts.sql", arguments.parts_table_name)
+    server_rows = []
+    parts_rows = []
+    next_sample = time.monotonic()
+    for i in range(arguments.server_samples):
+        time.sleep(max(0.0, next_sample - time.monotonic()))
+        next_sample += arguments.server_interval
+        try:
+            row, partition_rows = sample_server(client)
+        except Exception as e:
+            logger.error(f"Error sampling ClickHouse server state: {e}")
+            continue
+        logger.info('server sample %s', row)
+        server_rows.append(row)
+        parts_rows.extend(partition_rows)
+    if server_rows:
+        client.insert(arguments.server_table_name, server_rows, column_names=SERVER_COLUMNS)
+    if parts_rows:
+        client.insert(arguments.parts_table_name, parts_rows, column_names=PARTS_COLUMNS)
+
+# daemon mode adds rates to the cron columns; insert_time is the sample time
+DAEMON_COLUMNS = [
+    "cpu_idle_percentage", "load_avg", "memory_pressure", "io_pressure", "cpu_pressure",
+    "disk_read_bytes_per_sec", "disk_write_bytes_per_sec", "net_rx_bytes_per_sec", "net_tx_bytes_per_sec",
+    "insert_time",
+]
+MAX_BUFFERED_SAMPLES = 86400
+
+def daemon_row(sample):
+    """A row of DAEMON_COLUMNS from a HostSampler sample."""
+    return [sample['time'] if column == 'insert_time' else sample[column] for column in DAEMON_COLUMNS]
+
+def flush_buffers(client, buffers):
+    """Bulk inserts every buffered table; rows stay buffered if an insert fails."""
+    for table_name, (column_names, rows) in buffers.items():
+        if not rows:
+            continue
+        try:
+            client.insert(table_name, rows, column_names=column_names)
+            logger.info(f"Inserted {len(rows)} rows into {table_name}")
+            rows.clear()
+        except Exception as e:
+            logger.error(f"Error inserting {len(rows)} rows into {table_name}: {e}")
+            del rows[:-MAX_BUFFERED_SAMPLES]
+
+def run_daemon(client):
+    maybe_create_table(client)
+    for column in DAEMON_COLUMNS:
+        if column.endswith('_per_sec'):
+            # tables created before daemon mode lack the rate columns
+            client.command(f"ALTER TABLE `{arguments.database}`.`{arguments.table_name}` "
+                           f"ADD COLUMN IF NOT EXISTS `{column}` Nullable(Float64)")
+    buffers = {arguments.table_name: (DAEMON_COLUMNS, [])}
+    if arguments.server_metrics:
+        maybe_create_table(client, "server_metrics.sql", arguments.server_table_name)
+        maybe_create_table(client, "partition_parts.sql", arguments.parts_table_name)
+        buffers[arguments.server_table_name] = (SERVER_COLUMNS, [])
+        buffers[arguments.parts_table_name] = (PARTS_COLUMNS, [])
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    sampler = HostSampler()
+    start = time.monotonic()
+    next_sample = start + arguments.interval
+    next_server_sample = start
+    next_flush = start + arguments.flush_interval
+    logger.info(f"Sampling every {arguments.interval}s, inserting every {arguments.flush_interval}s")
+    while not stopping:
+        time.sleep(max(0.0, min(next_sample, next_flush) - time.monotonic()))
+        now = time.monotonic()
+        if now >= next_sample:
+            buffers[arguments.table_name][1].append(daemon_row(sampler.sample()))
+            # skip missed ticks instead of sampling in a burst
+            next_sample += arguments.interval * max(1, int((now - next_sample) // arguments.interval) + 1)
+        if arguments.server_metrics and now >= next_server_sample:
+            try:
+                row, partition_rows = sample_server(client)
+                buffers[arguments.server_table_name][1].append(row)
+                buffers[arguments.parts_table_name][1].extend(partition_rows)
+            except Exception as e:
+                logger.error(f"Error sampling ClickHouse server state: {e}")
+            next_server_sample = now + arguments.server_interval
+        if now >= next_flush:
+            flush_buffers(client, buffers)
+            next_flush = now + arguments.flush_interval
+    flush_buffers(client, buffers)
+
 def insert_measurements():
     
     try:
@@ -75,10 +241,16 @@ def insert_measurements():
         logger.error(f"Error connecting to ClickHouse: {e}")
         sys.exit(1)
 
+    if arguments.daemon:
+        run_daemon(client)
+        return
+
     maybe_create_table(client)
     measurements = do_measurements()
     column_names = ["cpu_idle_percentage", "load_avg", "memory_pressure", "io_pressure", "cpu_pressure"]
     logger.info('INSERT INTO measurements %s VALUES %s', column_names, measurements)
     client.insert(arguments.table_name, [measurements], column_names=column_names)
+    if arguments.server_metrics:
+        insert_server_samples(client)
 
 insert_measurements()
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS `%s`.`%s` (
+    `sample_time` DateTime64(3, 'UTC'), -- when the sample was taken
+    `database` String,
+    `table` String,
+    `partition` String,
+    `active_parts` UInt64,
+    `rows` UInt64,
+    `bytes_on_disk` UInt64,
+    `insert_time` DateTime64(3, 'UTC') DEFAULT now()
+)
+ENGINE = MergeTree()
+ORDER BY (`sample_time`, `database`, `table`, `partition`);
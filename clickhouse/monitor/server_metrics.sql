@@ -0,0 +1,22 @@
+CREATE TABLE IF NOT EXISTS `%s`.`%s` (
+    `sample_time` DateTime64(3, 'UTC'), -- when the sample was taken
+    `active_parts` UInt64, -- active parts of all user tables
+    `max_partition_parts` UInt64, -- most active parts in any one partition
+    `merges_running` UInt64, -- rows in system.merges
+    `merge_source_parts` UInt64, -- parts being merged
+    `merge_max_elapsed` Float64, -- seconds, longest running merge
+    `merge_rows_read` UInt64,
+    `inserted_rows` UInt64, -- cumulative system.events counters since server start
+    `inserted_bytes` UInt64,
+    `merged_rows` UInt64,
+    `delayed_inserts` UInt64,
+    `rejected_inserts` UInt64,
+    `delayed_inserts_ms` UInt64,
+    `delayed_inserts_now` Int64, -- system.metrics DelayedInserts
+    `background_merges_now` Int64, -- system.metrics BackgroundMergesAndMutationsPoolTask
+    `disk_read_bytes` UInt64, -- cumulative /proc/diskstats, all disks
+    `disk_write_bytes` UInt64,
+    `insert_time` DateTime64(3, 'UTC') DEFAULT now()
+)
+ENGINE = MergeTree()
+ORDER BY (`sample_time`);
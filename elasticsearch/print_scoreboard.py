@@ -1,7 +1,11 @@
 import argparse
+import csv
+import json
+import statistics
+from datetime import datetime, timezone
 from elasticsearch import Elasticsearch
 
-parser = argparse.ArgumentParser(description='Inserts ESnet Stardust Data into elasticsearch.')
+parser = argparse.ArgumentParser(description='Prints throughput, latency and steady-state statistics from the elasticsearch insert scoreboard.')
 
 parser.add_argument('--user', help='Elasticsearch username', default='timescale')
 parser.add_argument('--password', help='Elasticsearch User Password', default='timescale')
@@ -9,26 +13,244 @@ parser.add_argument('--host', help="remote elastic host", default='localhost')
 parser.add_argument('--port', help="remote elastic port", default='9200')
 
 parser.add_argument('--scoreboard-index', help="Table to insert metrics/scoreboard info.", default='scoreboard')
+parser.add_argument('--values-index', help="Only report scoreboard entries written for this values index. Default: all entries")
 
-parser.add_argument('--batch-size', help="Specify the insert batch size", type=int, default=25000)
+parser.add_argument('--batch-size', help="Rows per bulk, used for scoreboard entries written without a batch_size field", type=int, default=25000)
+parser.add_argument('--interval', help="Timeline resolution, as an elasticsearch fixed_interval (e.g. 10s, 1m, 5m)", default='1m')
+parser.add_argument('--worker-field', help="Scoreboard field identifying the insert worker", default='worker.keyword')
+parser.add_argument('--page-size', help="Composite aggregation page size", type=int, default=1000)
+parser.add_argument('--percentiles', help="Comma separated bulk latency percentiles to report", default='50,90,95,99')
+parser.add_argument('--steady-tolerance', help="Buckets within this fraction of the median rate are considered steady-state", type=float, default=0.2)
+parser.add_argument('--per-worker-timeline', help="Print the timeline of every worker, not only the aggregate", action='store_true')
+parser.add_argument('--csv', help="Write the per-worker and aggregate timelines to this CSV file")
+parser.add_argument('--json', help="Write the full report to this JSON file")
 
 arguments = parser.parse_args()
 
 es_client = Elasticsearch(hosts=["http://%s:%s" % (arguments.host, arguments.port)], basic_auth=(arguments.user, arguments.password))
 
-doc = {
-        'size' : 0,
-        'aggs': {
-            'insertions' : {
-                'date_histogram': {
-                    'field': 'start_time',
-                    'calendar_interval': "1m", 
+INTERVAL_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# bulk latency in milliseconds, computed server side so old scoreboards work too
+LATENCY_SCRIPT = "doc['end_time'].value.toInstant().toEpochMilli() - doc['start_time'].value.toInstant().toEpochMilli()"
+
+def interval_seconds(interval):
+    for unit in sorted(INTERVAL_UNITS, key=len, reverse=True):
+        if interval.endswith(unit):
+            return float(interval[:-len(unit)]) * INTERVAL_UNITS[unit]
+    raise ValueError("unsupported interval '%s'" % interval)
+
+def base_query():
+    if arguments.values_index:
+        return {"term": {"index_name.keyword": arguments.values_index}}
+    return {"match_all": {}}
+
+def composite_buckets(sources, aggs):
+    """Pages through a composite aggregation, yielding buckets as they arrive."""
+    after_key = None
+    while True:
+        composite = {"size": arguments.page_size, "sources": sources}
+        if after_key:
+            composite["after"] = after_key
+        doc = {
+            'size': 0,
+            'query': base_query(),
+            'aggs': {
+                'pages': {
+                    'composite': composite,
+                    'aggs': aggs,
                 }
             }
-       }
-   }
+        }
+        res = es_client.search(index=arguments.scoreboard_index, body=doc)
+        page = res['aggregations']['pages']
+        yield from page['buckets']
+        after_key = page.get('after_key')
+        if not after_key or not page['buckets']:
+            break
+
+def percentile_values(percentiles_agg):
+    return {float(k): v for k, v in percentiles_agg['values'].items()}
+
+def fetch_timelines():
+    """Returns {worker: {bucket_ms: rows}} at the requested resolution."""
+    timelines = {}
+    sources = [
+        {"time": {"date_histogram": {"field": "start_time", "fixed_interval": arguments.interval}}},
+        {"worker": {"terms": {"field": arguments.worker_field, "missing_bucket": True}}},
+    ]
+    aggs = {"rows": {"sum": {"field": "batch_size", "missing": arguments.batch_size}}}
+    for bucket in composite_buckets(sources, aggs):
+        worker = bucket['key']['worker'] or 'unknown'
+        timelines.setdefault(worker, {})[bucket['key']['time']] = bucket['rows']['value']
+    return timelines
+
+def fetch_worker_latencies(percents):
+    latencies = {}
+    sources = [{"worker": {"terms": {"field": arguments.worker_field, "missing_bucket": True}}}]
+    aggs = {
+        "latency": {"percentiles": {"script": {"source": LATENCY_SCRIPT}, "percents": percents}},
+        "rows": {"sum": {"field": "batch_size", "missing": arguments.batch_size}},
+    }
+    for bucket in composite_buckets(sources, aggs):
+        worker = bucket['key']['worker'] or 'unknown'
+        latencies[worker] = {
+            "bulks": bucket['doc_count'],
+            "rows": bucket['rows']['value'],
+            "latency_ms": percentile_values(bucket['latency']),
+        }
+    return latencies
+
+def fetch_overall(percents):
+    doc = {
+        'size': 0,
+        'track_total_hits': True,
+        'query': base_query(),
+        'aggs': {
+            'latency': {'percentiles': {'script': {'source': LATENCY_SCRIPT}, 'percents': percents}},
+            'rows': {'sum': {'field': 'batch_size', 'missing': arguments.batch_size}},
+            'first': {'min': {'field': 'start_time'}},
+            'last': {'max': {'field': 'end_time'}},
+        }
+    }
+    res = es_client.search(index=arguments.scoreboard_index, body=doc)
+    aggs = res['aggregations']
+    return {
+        "bulks": res['hits']['total']['value'],
+        "rows": aggs['rows']['value'],
+        "first_ms": aggs['first']['value'],
+        "last_ms": aggs['last']['value'],
+        "latency_ms": percentile_values(aggs['latency']),
+    }
+
+def fill_timeline(timeline, first, last, step_ms):
+    """Converts {bucket_ms: rows} to a gap-free list of (bucket_ms, rows per second)."""
+    step_seconds = step_ms / 1000
+    return [(t, timeline.get(t, 0) / step_seconds) for t in range(first, last + step_ms, step_ms)]
+
+def steady_state(timeline, tolerance):
+    """
+    Finds the longest contiguous run of buckets whose rate is within `tolerance`
+    of the median non-empty bucket rate. Ramp-up, ramp-down and stragglers fall
+    outside of the run.
+    """
+    rates = [rate for _, rate in timeline if rate > 0]
+    if not rates:
+        return None
+    median = statistics.median(rates)
+    best = None
+    start = None
+    for i, (_, rate) in enumerate(timeline + [(None, -1)]):
+        steady = rate >= 0 and abs(rate - median) <= tolerance * median
+        if steady and start is None:
+            start = i
+        elif not steady and start is not None:
+            if best is None or (i - start) > (best[1] - best[0]):
+                best = (start, i)
+            start = None
+    if best is None:
+        return None
+    window = timeline[best[0]:best[1]]
+    window_rates = [rate for _, rate in window]
+    return {
+        "start_ms": window[0][0],
+        "end_ms": window[-1][0],
+        "buckets": len(window),
+        "median_rate": median,
+        "mean_rate": statistics.mean(window_rates),
+        "stdev_rate": statistics.stdev(window_rates) if len(window_rates) > 1 else 0.0,
+    }
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+percents = [float(p) for p in arguments.percentiles.split(",")]
+step_ms = int(interval_seconds(arguments.interval) * 1000)
+
+overall = fetch_overall(percents)
+if not overall["bulks"]:
+    print("No scoreboard entries found in '%s'" % arguments.scoreboard_index)
+    raise SystemExit(0)
+
+timelines = fetch_timelines()
+worker_latencies = fetch_worker_latencies(percents)
+
+all_buckets = [t for timeline in timelines.values() for t in timeline]
+first_bucket, last_bucket = min(all_buckets), max(all_buckets)
+
+aggregate = {}
+for timeline in timelines.values():
+    for t, rows in timeline.items():
+        aggregate[t] = aggregate.get(t, 0) + rows
+aggregate_timeline = fill_timeline(aggregate, first_bucket, last_bucket, step_ms)
+worker_timelines = {worker: fill_timeline(timeline, first_bucket, last_bucket, step_ms) for worker, timeline in timelines.items()}
+steady = steady_state(aggregate_timeline, arguments.steady_tolerance)
+
+wall_seconds = ((overall["last_ms"] or 0) - (overall["first_ms"] or 0)) / 1000
+
+print("Aggregate throughput (%s buckets):" % arguments.interval)
+for t, rate in aggregate_timeline:
+    print("%s: %.0f inserts per second" % (iso(t), rate))
+
+if arguments.per_worker_timeline:
+    for worker in sorted(worker_timelines):
+        print("\nWorker %s throughput (%s buckets):" % (worker, arguments.interval))
+        for t, rate in worker_timelines[worker]:
+            print("%s: %.0f inserts per second" % (iso(t), rate))
+
+print("\nPer-worker summary:")
+print("%-12s %10s %14s %s" % ("worker", "bulks", "rows", "  ".join("p%g(ms)" % p for p in percents)))
+for worker in sorted(worker_latencies):
+    stats = worker_latencies[worker]
+    print("%-12s %10d %14.0f %s" % (worker, stats["bulks"], stats["rows"], "  ".join("%7.0f" % (stats["latency_ms"].get(p) or 0) for p in percents)))
+
+print("\nOverall:")
+print("  bulks: %d, rows: %.0f, wall time: %.1fs" % (overall["bulks"], overall["rows"], wall_seconds))
+if wall_seconds > 0:
+    print("  average rate over wall time: %.0f inserts per second" % (overall["rows"] / wall_seconds))
+print("  bulk latency: %s" % ", ".join("p%g=%.0fms" % (p, overall["latency_ms"].get(p) or 0) for p in percents))
+
+if steady:
+    print("  steady state: %s -> %s (%d buckets), mean %.0f inserts per second (stdev %.0f)" % (
+        iso(steady["start_ms"]), iso(steady["end_ms"] + step_ms), steady["buckets"], steady["mean_rate"], steady["stdev_rate"]))
+else:
+    print("  steady state: not detected")
 
-res = es_client.search(index=arguments.scoreboard_index, body=doc)
+if arguments.csv:
+    with open(arguments.csv, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["bucket", "worker", "rows", "rows_per_second"])
+        step_seconds = step_ms / 1000
+        for t, rate in aggregate_timeline:
+            writer.writerow([iso(t), "ALL", rate * step_seconds, rate])
+        for worker in sorted(worker_timelines):
+            for t, rate in worker_timelines[worker]:
+                writer.writerow([iso(t), worker, rate * step_seconds, rate])
 
-for bucket in res['aggregations']['insertions']['buckets']:
-    print("%s: %s inserts per second" % (bucket['key_as_string'], (bucket['doc_count'] * arguments.batch_size) / 60))
+if arguments.json:
+    report = {
+        "interval": arguments.interval,
+        "overall": {
+            "bulks": overall["bulks"],
+            "rows": overall["rows"],
+            "first": iso(overall["first_ms"]) if overall["first_ms"] else None,
+            "last": iso(overall["last_ms"]) if overall["last_ms"] else None,
+            "wall_seconds": wall_seconds,
+            "latency_ms": {"p%g" % p: v for p, v in overall["latency_ms"].items()},
+        },
+        "steady_state": steady and dict(steady, start=iso(steady["start_ms"]), end=iso(steady["end_ms"] + step_ms)),
+        "workers": {
+            worker: {
+                "bulks": stats["bulks"],
+                "rows": stats["rows"],
+                "latency_ms": {"p%g" % p: v for p, v in stats["latency_ms"].items()},
+            } for worker, stats in worker_latencies.items()
+        },
+        "timeline": [{"bucket": iso(t), "rows_per_second": rate} for t, rate in aggregate_timeline],
+        "worker_timelines": {
+            worker: [{"bucket": iso(t), "rows_per_second": rate} for t, rate in timeline]
+            for worker, timeline in worker_timelines.items()
+        },
+    }
+    with open(arguments.json, "w") as outfile:
+        json.dump(report, outfile, indent=2)
@@ -31,6 +31,9 @@ if [ -z "$SKIP_SLICE" ]; then
     wait $(jobs -p)
 fi
 
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler org.elasticsearch
+
 # then loop over the worker input directories
 for i in `seq 0 1 $WORKERS_MINUS_ONE`;
 do echo $i;
@@ -41,6 +44,7 @@ done;
 
 # wait for those jobs...
 wait $(jobs -p)
+stop_host_sampler
 
 python print_scoreboard.py --host $HOST --batch-size $BATCH_SIZE
 
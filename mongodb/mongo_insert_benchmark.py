@@ -66,6 +66,51 @@ def parse_timestamp(ts_string):
         return None
 
 
+def load_partition_plan(plan_path: Path, total_workers: int):
+    """Loads a series_catalog.py plan, which must be for total_workers workers."""
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from series_catalog import load_plan
+
+    plan = load_plan(plan_path)
+    if plan.num_workers != total_workers:
+        print(
+            f"Error: partition plan {plan_path} is for {plan.num_workers} workers, not {total_workers}.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    return plan
+
+
+def rate_limiter(rows_per_sec: float, arrivals: str = None, latency_output=None):
+    """
+    A scripts/python/utils/pacing.py limiter spacing the batches to
+    rows_per_sec, closed loop or on an open-loop schedule of arrivals
+    ("constant" or "poisson"), or None to insert as fast as possible.
+    Batch latencies go to latency_output as they complete.
+    """
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from pacing import make_rate_limiter
+
+    return make_rate_limiter(rows_per_sec, arrivals, latency_output)
+
+
+def open_tsv_file(tsv_file: Path):
+    """
+    Opens a fetcher export as TSV text: plain, .gz/.zst compressed or Parquet
+    (see scripts/python/utils/stardust_io.py).
+    """
+    sys.path.insert(
+        0, str(Path(__file__).resolve().parent.parent / "scripts" / "python" / "utils")
+    )
+    from stardust_io import open_input
+
+    return open_input(tsv_file, newline="")
+
+
 # --- Main Function ---
 def insert_data(
     mongo_uri: str,
@@ -76,6 +121,10 @@ def insert_data(
     worker_num: int,
     total_workers: int,
     limit: int,
+    partition_plan: Path = None,
+    rows_per_sec: float = None,
+    arrivals: str = None,
+    latency_output: str = None,
 ):
     worker_log_prefix = f"[Worker {worker_num+1}/{total_workers}]"
     print(f"{worker_log_prefix} Starting. PID: {os.getpid()}")
@@ -84,8 +133,19 @@ def insert_data(
         f"{worker_log_prefix} Explicit metadata TSV fields: {EXPLICIT_METADATA_FIELDS_TSV_NAMES if EXPLICIT_METADATA_FIELDS_TSV_NAMES else 'None (beyond device/interfaceName)'}"
     )
     # ... (other initial print statements from previous script) ...
+    plan = None
+    if partition_plan:
+        plan = load_partition_plan(partition_plan, total_workers)
+        print(
+            f"{worker_log_prefix} Partition plan: {partition_plan} ({plan.strategy}, {len(plan)} series); rows are assigned by series instead of stride"
+        )
     print(f"{worker_log_prefix} Target DB: {db_name}, Collection: {collection_name}")
     print(f"{worker_log_prefix} Document Batch Size: {batch_size}")
+    limiter = rate_limiter(rows_per_sec, arrivals, latency_output)
+    if limiter:
+        print(
+            f"{worker_log_prefix} Pacing: {rows_per_sec} docs/s, {arrivals or 'closed loop'}"
+        )
     print(
         f"{worker_log_prefix} Max docs to process by this worker: {'No limit' if limit < 0 else limit}"
     )
@@ -126,7 +186,7 @@ def insert_data(
 
     try:
         print(f"{worker_log_prefix} Opening file: {tsv_file.name}...")
-        with open(tsv_file, "r", newline="", encoding="utf-8") as tsvfile:
+        with open_tsv_file(tsv_file) as tsvfile:
             reader = csv.DictReader(tsvfile, delimiter="\t")
             tsv_header = reader.fieldnames
             if not tsv_header:
@@ -140,7 +200,17 @@ def insert_data(
             file_line_index = 0
 
             for row_data_dict in reader:
-                if (file_line_index % total_workers) == worker_num:
+                if plan is None:
+                    assigned = (file_line_index % total_workers) == worker_num
+                else:
+                    assigned = (
+                        plan.worker_for(
+                            row_data_dict.get(TSV_NODE_COL) or "",
+                            row_data_dict.get(TSV_INTERFACE_COL) or "",
+                        )
+                        == worker_num
+                    )
+                if assigned:
                     if limit >= 0 and lines_processed_by_this_worker >= limit:
                         print(
                             f"{worker_log_prefix} Reached processing limit of {limit} assigned documents."
@@ -258,8 +328,11 @@ def insert_data(
 
                     if len(batch) >= batch_size:
                         if batch:
+                            scheduled = limiter.wait(len(batch)) if limiter else None
                             try:
                                 collection.insert_many(batch, ordered=False)
+                                if limiter:
+                                    limiter.record(scheduled, len(batch))
                                 docs_sent_by_this_worker += len(batch)
                                 batches_sent_by_this_worker += 1
                                 if batches_sent_by_this_worker % 10 == 0:
@@ -273,6 +346,8 @@ def insert_data(
                                     f"{worker_log_prefix} ERROR inserting batch {batches_sent_by_this_worker+1}: {e}",
                                     file=sys.stderr,
                                 )
+                                if limiter:
+                                    limiter.record(scheduled, len(batch), ok=False)
                                 # Decide if you want to stop or continue on batch insert error
                             finally:
                                 batch = []
@@ -280,8 +355,11 @@ def insert_data(
                 file_line_index += 1
 
             if batch:  # Final batch
+                scheduled = limiter.wait(len(batch)) if limiter else None
                 try:
                     collection.insert_many(batch, ordered=False)
+                    if limiter:
+                        limiter.record(scheduled, len(batch))
                     docs_sent_by_this_worker += len(batch)
                     batches_sent_by_this_worker += 1
                     print(
@@ -292,6 +370,8 @@ def insert_data(
                         f"{worker_log_prefix} ERROR inserting final batch: {e}",
                         file=sys.stderr,
                     )
+                    if limiter:
+                        limiter.record(scheduled, len(batch), ok=False)
 
     except FileNotFoundError:
         print(f"{worker_log_prefix} Error: Input TSV file not found", file=sys.stderr)
@@ -312,6 +392,8 @@ def insert_data(
     print(
         f"{worker_log_prefix} Sent {docs_sent_by_this_worker} documents to MongoDB in {batches_sent_by_this_worker} batches."
     )
+    if limiter:
+        print(f"{worker_log_prefix} Paced batches: {limiter.report()}")
 
     if client:
         try:
@@ -337,7 +419,10 @@ if __name__ == "__main__":
         "--collection", required=True, help="MongoDB Time series collection name."
     )
     parser.add_argument(
-        "--tsv_file", required=True, type=Path, help="Path to the input TSV file."
+        "--tsv_file",
+        required=True,
+        type=Path,
+        help="Path to the input TSV file (.gz/.zst compressed or Parquet exports work too).",
     )
     parser.add_argument(
         "--batch_size", type=int, default=5000, help="Documents per insert batch."
@@ -360,6 +445,33 @@ if __name__ == "__main__":
         default=-1,
         help="Max data lines this worker processes from its stride.",
     )
+    parser.add_argument(
+        "--partition_plan",
+        type=Path,
+        default=None,
+        help="Optional: series_catalog.py plan; each worker then inserts whole series "
+        "instead of every Nth line.",
+    )
+    parser.add_argument(
+        "--rows_per_sec",
+        type=float,
+        default=None,
+        help="Pace this worker's batches to this many documents per second "
+        "(default: as fast as possible).",
+    )
+    parser.add_argument(
+        "--arrivals",
+        choices=["constant", "poisson"],
+        default=None,
+        help="With --rows_per_sec: send batches on a fixed open-loop schedule with "
+        "constant or Poisson gaps instead of after the previous batch.",
+    )
+    parser.add_argument(
+        "--latency_output",
+        default=None,
+        help="With --rows_per_sec: CSV of every batch's latency from its scheduled "
+        "send time (see scripts/python/utils/pacing.py report).",
+    )
     # No --output for detailed CSV, measurement is external
 
     args = parser.parse_args()
@@ -383,4 +495,8 @@ if __name__ == "__main__":
         worker_num=args.worker_num,
         total_workers=args.total_workers,
         limit=args.limit,
+        partition_plan=args.partition_plan,
+        rows_per_sec=args.rows_per_sec,
+        arrivals=args.arrivals,
+        latency_output=args.latency_output,
     )
@@ -15,6 +15,9 @@ import pickle
 import sys
 from opensearchpy import OpenSearch, helpers
 import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "python", "utils"))
+from stardust_io import open_input
+from pacing import make_rate_limiter
 
 logging.basicConfig(format='%(asctime)s :: %(message)s', level=logging.INFO)
 
@@ -33,14 +36,21 @@ parser.add_argument('--scoreboard-index', help="Table to insert metrics/scoreboa
 # partitioning and insert options
 parser.add_argument('--total-partitions', help="use consistent hash partitioning to partition binary output results", type=int, default=0)
 parser.add_argument('--partition', help="the binary output partition to prepare", type=int)
+parser.add_argument('--series-catalog', help="series catalog (scripts/python/utils/series_catalog.py) to assign partitions from, shared with the splitters and other inserters")
+parser.add_argument('--partition-strategy', help="with --series-catalog: 'modulo' keeps the md5 hash placement, 'balanced' equalizes row counts per partition", choices=['modulo', 'balanced'], default='modulo')
+parser.add_argument('--partition-plan', help="partition plan (series_catalog.py plan) for --total-partitions workers; takes precedence over --series-catalog")
 parser.add_argument('--skip', help="Only insert every Nth row", type=int, default=1)
 parser.add_argument('--offset', help="offset to begin inserts from from input file", type=int, default=0)
 parser.add_argument('--limit', help="total insertion limit", type=int, default=20000)
 parser.add_argument('--batch-size', help="Batch size to do inserts, in rows.", type=int, default=5000)
+parser.add_argument('--rows-per-sec', help="Pace the bulk inserts to this many rows per second. Default: as fast as possible", type=float)
+parser.add_argument('--arrivals', help="With --rows-per-sec, send batches on a fixed open-loop schedule with constant or Poisson gaps instead of after the previous batch", choices=['constant', 'poisson'])
+parser.add_argument('--latency-output', help="With --rows-per-sec, write every batch's latency from its scheduled send time to this CSV (see scripts/python/utils/pacing.py report)")
 parser.add_argument('--no-datastream', help="Disable data stream for inserts", action='store_true')
+parser.add_argument('--worker-id', help="Worker name recorded in the scoreboard. Default: name of --transform-input-dir, or the offset/partition being prepared")
 
 # input file and format
-parser.add_argument('--infile', help="Read rows from infile. Default: sys.stdin", default=sys.stdin, type=argparse.FileType('r'))
+parser.add_argument('--infile', help="Read rows from infile: a fetcher export as TSV, .tsv.gz, .tsv.zst or .parquet. Default: sys.stdin", default=sys.stdin, type=open_input)
 parser.add_argument('--wide', help="Use stardust 'wide' format, including all columns.", action='store_true')
 
 # intermediate transform output
@@ -49,6 +59,27 @@ parser.add_argument('--transform-output-intermediate', help="save binary interme
 parser.add_argument('--transform-input-dir', help="read COPY batches fron binary intermediate input. See also: --transform-output-intermediate.")
 
 arguments = parser.parse_args()
+rate_limiter = make_rate_limiter(arguments.rows_per_sec, arguments.arrivals, arguments.latency_output)
+
+worker_id = arguments.worker_id
+if worker_id is None and arguments.transform_input_dir:
+    worker_id = os.path.basename(os.path.normpath(arguments.transform_input_dir))
+elif worker_id is None:
+    worker_id = str(arguments.partition if arguments.total_partitions else arguments.offset)
+
+series_catalog = None
+partition_plan = None
+if arguments.series_catalog or arguments.partition_plan:
+    from series_catalog import load_catalog, load_plan
+if arguments.partition_plan:
+    partition_plan = load_plan(arguments.partition_plan)
+    if partition_plan.num_workers != arguments.total_partitions:
+        sys.exit("partition plan %s is for %s workers, but --total-partitions is %s" % (arguments.partition_plan, partition_plan.num_workers, arguments.total_partitions))
+    logging.info("loaded %s plan for %s series from %s" % (partition_plan.strategy, len(partition_plan), arguments.partition_plan))
+elif arguments.series_catalog:
+    series_catalog = load_catalog(arguments.series_catalog)
+    logging.info("loaded %s series from %s (%s partitions)" % (len(series_catalog), arguments.series_catalog, arguments.partition_strategy))
+
 basic_auth = None
 if arguments.user and arguments.password:
     basic_auth = (arguments.user, arguments.password)
@@ -96,8 +127,7 @@ def timed_assembly(infile, header, batch_size=1, timing_bucket="assembly", offse
         curr_line += 1
         row = line.rstrip("\n").split("\t")
         if arguments.total_partitions:
-            hash_output = hash_row(row)
-            hash_bucket = int(hash_output, 16) % arguments.total_partitions
+            hash_bucket = row_partition(row)
             if hash_bucket != arguments.partition:
                 continue
             if curr_line % 1000 == 0:
@@ -163,11 +193,14 @@ def timed_write_transformed(batch, timing_bucket="write_transformed", factory=tm
 
 def timed_bulk_insert(f, timing_bucket="insert"):
     batch = pickle.load(f)
+    scheduled = rate_limiter.wait(len(batch)) if rate_limiter else None
     before = time.perf_counter()
     before_timestamp = datetime.now()
     helpers.bulk(os_client, batch, index=arguments.values_index, raise_on_error=False)
     logging.info('.bulk() %s rows (opensearch insert time)' % arguments.batch_size)
     after = time.perf_counter()
+    if rate_limiter:
+        rate_limiter.record(scheduled, len(batch))
     after_timestamp = datetime.now()
     execution_time = after - before
     timing_buckets[timing_bucket]["total"] += execution_time
@@ -178,20 +211,31 @@ def timed_bulk_insert(f, timing_bucket="insert"):
     timing_buckets[timing_bucket]["count"] += 1
     os_client.index(body={
         "index_name": arguments.values_index, 
-        "batch_size": arguments.batch_size,
+        "batch_size": len(batch),
+        "worker": worker_id,
         "start_time": before_timestamp.isoformat(),
         "end_time": after_timestamp.isoformat()
     }, index=arguments.scoreboard_index)
 
-def hash_row(row):
+def row_series(row):
     ROUTER_IDX = 19
     PORT_IDX = 34
     if arguments.wide:
         ROUTER_IDX = 605
         PORT_IDX = 610
-    port_string = "%s::%s" % (row[ROUTER_IDX], row[PORT_IDX])
+    return row[ROUTER_IDX], row[PORT_IDX]
+
+def hash_row(row):
+    port_string = "%s::%s" % row_series(row)
     return hashlib.md5(port_string.encode('UTF-8')).hexdigest()
 
+def row_partition(row):
+    if partition_plan is not None:
+        return partition_plan.worker_for(*row_series(row))
+    if series_catalog is not None:
+        return series_catalog.worker_for(*row_series(row), arguments.total_partitions, arguments.partition_strategy)
+    return int(hash_row(row), 16) % arguments.total_partitions
+
 total_inserts = 0
 
 if arguments.transform_input_dir:
@@ -210,3 +254,6 @@ else:
         timed_write_transformed(batch, factory=tmpfile_factory(preserve_files=arguments.transform_output_intermediate))
         if total_inserts >= arguments.limit:
             break
+
+if rate_limiter:
+    logging.info(rate_limiter.report())
@@ -0,0 +1,348 @@
+"""
+Query executors for query_benchmark.py, one per engine. Each takes the
+parsed arguments, runs the requests queries.py builds for it and returns
+the result rows, and clears whatever server side caches the engine lets a
+client clear for the cold pass:
+
+  clickhouse       mark, uncompressed, query and page caches (SYSTEM DROP)
+  timescaledb      nothing; shared_buffers only empty on a restart
+  elasticsearch,   the query, request and fielddata caches of the queried
+  opensearch       indexes; cold requests also skip the request cache
+  mongodb          the plan caches of the queried collections; the
+                   WiredTiger cache only empties on a restart
+  victoriametrics  the rollup result cache; cold requests also pass nocache=1
+
+The operating system's page cache is dropped separately with
+--drop_os_cache, on the database host.
+
+For mixed_load.py, ingest_probe() reports how many rows of the SNMP table
+are visible to queries and the newest @timestamp among them (None where
+the engine cannot tell cheaply). VictoriaMetrics counts ingested samples
+from its /metrics page instead.
+
+Executors are shared by the benchmark's threads: the SQL engines keep a
+connection per thread, the HTTP engines a pool as large as the highest
+concurrency level.
+"""
+
+import datetime
+import json
+import sys
+import threading
+
+import urllib3
+
+from queries import quote_clickhouse
+
+ENGINES = [
+    "clickhouse",
+    "timescaledb",
+    "elasticsearch",
+    "opensearch",
+    "mongodb",
+    "victoriametrics",
+]
+DEFAULT_PORTS = {
+    "clickhouse": 8123,
+    "timescaledb": 5432,
+    "elasticsearch": 9200,
+    "opensearch": 9200,
+    "mongodb": 27017,
+    "victoriametrics": 8428,
+}
+# the tables, indexes and collections the insert scripts fill by default;
+# mongo_insert_benchmark.py has no default collection
+DEFAULT_TABLES = {
+    "clickhouse": ("datastoreEval.snmp_data", "metranova.flow_enriched"),
+    "timescaledb": ("values_wide_inline", "values_flow"),
+    "elasticsearch": ("metranova_values", "metranova_values"),
+    "opensearch": ("metranova_values", "metranova_values"),
+    "mongodb": (None, None),
+    "victoriametrics": (None, None),
+}
+CLICKHOUSE_CACHE_DROPS = [
+    "SYSTEM DROP MARK CACHE",
+    "SYSTEM DROP UNCOMPRESSED CACHE",
+    "SYSTEM DROP QUERY CACHE",
+    "SYSTEM DROP PAGE CACHE",
+]
+
+
+def as_utc(value):
+    """Aware UTC datetime of a driver's timestamp; drivers return naive UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+class ThreadConnections:
+    """One connection per thread, all closed by close_all()."""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def get(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.connect()
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def close_all(self, close):
+        for connection in self.connections:
+            close(connection)
+        self.connections = []
+
+
+class ClickHouseExecutor:
+    def __init__(self, args):
+        try:
+            import clickhouse_connect
+        except ImportError:
+            sys.exit("The clickhouse engine needs clickhouse-connect")
+
+        self.connections = ThreadConnections(
+            lambda: clickhouse_connect.get_client(
+                host=args.host,
+                port=args.port,
+                user=args.user or "default",
+                password=args.password or "",
+                # sessions would serialize the threads' queries
+                autogenerate_session_id=False,
+            )
+        )
+        self.table = args.table
+
+    def execute(self, request, cold=False) -> list:
+        sql, parameters = request
+        return self.connections.get().query(sql, parameters=parameters).result_rows
+
+    def clear_caches(self) -> list:
+        warnings = []
+        client = self.connections.get()
+        for statement in CLICKHOUSE_CACHE_DROPS:
+            try:
+                client.command(statement)
+            except Exception as e:
+                # the query and page caches are missing from older servers
+                warnings.append(f"{statement} failed: {e}")
+        return warnings
+
+    def ingest_probe(self) -> tuple:
+        rows, newest = (
+            self.connections.get()
+            .query(
+                f"SELECT count(), max(`@timestamp`) FROM {quote_clickhouse(self.table)}"
+            )
+            .result_rows[0]
+        )
+        # max() of an empty table is the epoch
+        return rows, as_utc(newest) if rows else None
+
+    def close(self):
+        self.connections.close_all(lambda client: client.close())
+
+
+class TimescaleExecutor:
+    def __init__(self, args):
+        try:
+            import psycopg2
+        except ImportError:
+            sys.exit(
+                "The timescaledb engine needs psycopg2 (pip install psycopg2-binary)"
+            )
+
+        def connect():
+            connection = psycopg2.connect(
+                host=args.host,
+                port=args.port,
+                dbname=args.database or "timescale",
+                user=args.user or "timescale",
+                password=args.password,
+            )
+            connection.autocommit = True
+            return connection
+
+        self.connections = ThreadConnections(connect)
+        self.table = args.table
+
+    def execute(self, request, cold=False) -> list:
+        sql, parameters = request
+        with self.connections.get().cursor() as cursor:
+            cursor.execute(sql, parameters)
+            return cursor.fetchall()
+
+    def clear_caches(self) -> list:
+        return ["PostgreSQL cannot drop shared_buffers without a restart"]
+
+    def ingest_probe(self) -> tuple:
+        # count(*) scans the hypertable; keep --probe_interval long on big ones
+        rows, newest = self.execute(
+            (f"SELECT count(*), max(_timestamp) FROM {self.table}", None)
+        )[0]
+        return rows, as_utc(newest)
+
+    def close(self):
+        self.connections.close_all(lambda connection: connection.close())
+
+
+class HTTPExecutor:
+    """Base for the engines queried over HTTP with urllib3."""
+
+    def __init__(self, args):
+        self.base_url = f"{args.scheme}://{args.host}:{args.port}"
+        self.headers = {"Content-Type": "application/json"}
+        if args.user:
+            self.headers.update(
+                urllib3.make_headers(basic_auth=f"{args.user}:{args.password or ''}")
+            )
+        self.http = urllib3.PoolManager(
+            maxsize=max(args.concurrency_levels),
+            cert_reqs="CERT_NONE" if args.insecure else "CERT_REQUIRED",
+        )
+
+    def request(self, method, path, fields=None, body=None) -> dict:
+        if fields:
+            response = self.http.request_encode_url(
+                method, self.base_url + path, fields=fields, headers=self.headers
+            )
+        else:
+            response = self.http.request(
+                method,
+                self.base_url + path,
+                body=None if body is None else json.dumps(body),
+                headers=self.headers,
+            )
+        if response.status != 200:
+            raise RuntimeError(
+                f"HTTP {response.status}: {response.data.decode('utf-8', 'replace').strip()[:500]}"
+            )
+        return json.loads(response.data) if response.data else {}
+
+    def close(self):
+        self.http.clear()
+
+
+def leaf_buckets(aggregation: dict) -> list:
+    """The innermost buckets of nested bucket aggregations all named buckets."""
+    rows = []
+    for bucket in aggregation["buckets"]:
+        if "buckets" in bucket:
+            rows.extend(leaf_buckets(bucket["buckets"]))
+        else:
+            rows.append(bucket)
+    return rows
+
+
+class SearchExecutor(HTTPExecutor):
+    """Elasticsearch and OpenSearch _search requests."""
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.indexes = ",".join(sorted({args.table, args.flow_table}))
+        self.table = args.table
+
+    def execute(self, request, cold=False) -> list:
+        path, body = request
+        if cold:
+            path += "?request_cache=false"
+        response = self.request("POST", path, body=body)
+        return leaf_buckets(response["aggregations"]["buckets"])
+
+    def clear_caches(self) -> list:
+        self.request("POST", f"/{self.indexes}/_cache/clear")
+        return []
+
+    def ingest_probe(self) -> tuple:
+        response = self.request(
+            "POST",
+            f"/{self.table}/_search",
+            body={
+                "size": 0,
+                "track_total_hits": True,
+                "aggs": {"newest": {"max": {"field": "@timestamp"}}},
+            },
+        )
+        newest = response["aggregations"]["newest"]["value"]
+        return response["hits"]["total"]["value"], (
+            None
+            if newest is None
+            else datetime.datetime.fromtimestamp(newest / 1000, datetime.timezone.utc)
+        )
+
+
+class VictoriaMetricsExecutor(HTTPExecutor):
+    def execute(self, request, cold=False) -> list:
+        path, fields = request
+        if cold:
+            fields = {**fields, "nocache": 1}
+        response = self.request("GET", path, fields=fields)
+        if response.get("status") != "success":
+            raise RuntimeError(response.get("error", response))
+        return response["data"]["result"]
+
+    def clear_caches(self) -> list:
+        self.http.request("GET", self.base_url + "/internal/resetRollupResultCache")
+        return []
+
+    def ingest_probe(self) -> tuple:
+        """Samples ingested by the server, from the same counter as insert.py --benchmark."""
+        response = self.http.request("GET", self.base_url + "/metrics")
+        samples = 0.0
+        for line in response.data.decode("utf-8").splitlines():
+            if line.startswith("vm_rows_inserted_total"):
+                samples += float(line.rpartition(" ")[2])
+        return samples, None
+
+
+class MongoExecutor:
+    def __init__(self, args):
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            sys.exit("The mongodb engine needs pymongo")
+
+        self.client = MongoClient(
+            args.uri or f"mongodb://{args.host}:{args.port}",
+            maxPoolSize=max(args.concurrency_levels),
+        )
+        self.db = self.client[args.database or "metranova"]
+        self.collections = sorted({args.table, args.flow_table})
+        self.table = args.table
+
+    def execute(self, request, cold=False) -> list:
+        collection, pipeline = request
+        return list(self.db[collection].aggregate(pipeline, allowDiskUse=True))
+
+    def clear_caches(self) -> list:
+        for collection in self.collections:
+            self.db.command({"planCacheClear": collection})
+        return ["MongoDB cannot drop the WiredTiger cache without a restart"]
+
+    def ingest_probe(self) -> tuple:
+        collection = self.db[self.table]
+        newest = collection.find_one({}, {"timestamp": 1}, sort=[("timestamp", -1)])
+        return collection.count_documents({}), (
+            as_utc(newest["timestamp"]) if newest else None
+        )
+
+    def close(self):
+        self.client.close()
+
+
+def make_executor(engine: str, args):
+    if engine == "clickhouse":
+        return ClickHouseExecutor(args)
+    if engine == "timescaledb":
+        return TimescaleExecutor(args)
+    if engine in ("elasticsearch", "opensearch"):
+        return SearchExecutor(args)
+    if engine == "mongodb":
+        return MongoExecutor(args)
+    return VictoriaMetricsExecutor(args)
@@ -0,0 +1,583 @@
+"""
+Ingests and queries at the same time: for every ingest rate and query
+concurrency, starts the engine's own insert script paced to the rate (see
+scripts/python/utils/pacing.py) while query threads send a weighted mix of
+the dashboard queries over the most recently ingested data.
+
+Each step reports the ingest rate the datastore made visible to queries and
+how far visibility fell behind the paced schedule (ingest lag, in seconds
+at the target rate), next to the latency of the queries. Comparing a step
+with the one at the same query concurrency but no ingest, and with the one
+at the same rate but no queries, shows how much each side slows the other.
+
+Insert commands that take {latency_output} write their batch latencies
+there (see scripts/python/utils/pacing.py); the steps then also report
+ingest latency percentiles, and with --ingest_p99_ms the highest rate that
+kept the p99 under target at every query concurrency.
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "python", "utils"
+    ),
+)
+from engines import make_executor
+from queries import QUERY_NAMES, engine_queries
+from query_benchmark import (
+    add_engine_arguments,
+    parse_utc,
+    percentile,
+    pick_interface,
+    resolve_engine_arguments,
+    timed_request,
+    utc_now,
+)
+from pacing import read_latencies, summarize
+
+DEFAULT_QUERY_MIX = "interface_rate=5,top_interfaces=3,location_rollup=2"
+DEFAULT_INGEST_RATES = "0,10000,50000"
+DEFAULT_QUERY_CONCURRENCY = "0,4,16"
+WRITER_STOP_SECONDS = 10
+
+
+def parse_query_mix(text: str) -> dict:
+    """{query name: weight} of "name=weight,..."."""
+    mix = {}
+    for item in text.split(","):
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        if name not in QUERY_NAMES:
+            raise ValueError(f"unknown query {name!r}, expected one of {QUERY_NAMES}")
+        mix[name] = float(weight or 1)
+    if not mix or not any(weight > 0 for weight in mix.values()):
+        raise ValueError("the query mix needs a query with a positive weight")
+    return mix
+
+
+def rate_text(rows_per_sec: float) -> str:
+    return f"{rows_per_sec:g}"
+
+
+def latency_path(args, step: int, writer: int) -> Path:
+    return args.log_dir / f"step{step}_writer{writer}_latency.csv"
+
+
+def start_writers(args, step: int, rows_per_sec: float) -> list:
+    """Starts --writers insert commands, each paced to its share of the rate."""
+    args.log_dir.mkdir(parents=True, exist_ok=True)
+    writers = []
+    for writer in range(args.writers):
+        command = args.insert_command.format(
+            rows_per_sec=rate_text(rows_per_sec / args.writers),
+            writer=writer,
+            writers=args.writers,
+            step=step,
+            latency_output=latency_path(args, step, writer),
+        )
+        log_path = args.log_dir / f"step{step}_writer{writer}.log"
+        print(f"  writer {writer}: {command} > {log_path}")
+        with open(log_path, "w") as log:
+            writers.append(
+                subprocess.Popen(
+                    command,
+                    shell=True,
+                    cwd=args.insert_dir,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    # own process group, so the shell and the inserter stop together
+                    start_new_session=True,
+                )
+            )
+    return writers
+
+
+def stop_writers(writers: list) -> int:
+    """Stops the writers still running; returns how many had failed on their own."""
+    failed = sum(1 for w in writers if w.poll() not in (None, 0))
+    for w in writers:
+        if w.poll() is None:
+            os.killpg(w.pid, signal.SIGTERM)
+    for w in writers:
+        try:
+            w.wait(timeout=WRITER_STOP_SECONDS)
+        except subprocess.TimeoutExpired:
+            os.killpg(w.pid, signal.SIGKILL)
+            w.wait()
+    return failed
+
+
+def probe_ingest(executor, samples_per_row: float, start: float) -> tuple:
+    """(seconds since start, visible rows, newest timestamp); rows None on errors."""
+    try:
+        visible, newest = executor.ingest_probe()
+    except Exception as e:
+        print(f"  Warning: ingest probe failed: {e}", file=sys.stderr)
+        return time.monotonic() - start, None, None
+    return time.monotonic() - start, visible / samples_per_row, newest
+
+
+def watch_ingest(executor, args, start, samples: list, stop: threading.Event):
+    while not stop.wait(args.probe_interval):
+        samples.append(probe_ingest(executor, args.vm_samples_per_row, start))
+
+
+def window_params(base_params: dict, samples: list, args) -> dict:
+    """The query window: --lookback seconds up to --end or the newest visible row."""
+    end = args.end_time
+    if end is None:
+        end = next((s[2] for s in reversed(samples) if s[2] is not None), None)
+        # the queries exclude the end of the window
+        end = (
+            end + datetime.timedelta(seconds=1)
+            if end
+            else datetime.datetime.now(datetime.timezone.utc)
+        )
+    start = end - datetime.timedelta(seconds=args.lookback)
+    return {**base_params, "start": start, "end": end, "window": args.lookback}
+
+
+def query_worker(engine, executor, base_params, mix, samples, args, stop, timings):
+    rng = random.Random()
+    names = list(mix)
+    weights = list(mix.values())
+    while not stop.is_set():
+        query = rng.choices(names, weights)[0]
+        request = engine_queries(engine, window_params(base_params, samples, args))[
+            query
+        ]
+        seconds, rows, error = timed_request(executor, request)
+        timings.append((query, seconds, error))
+
+
+def ingest_summary(samples: list, rows_per_sec: float) -> dict:
+    """Visible rows, their rate and the ingest lag behind the paced schedule."""
+    samples = [s for s in samples if s[1] is not None]
+    if len(samples) < 2:
+        return {"ingested_rows": 0, "achieved_rows_per_sec": 0.0}
+    t0, visible0, newest0 = samples[0]
+    t1, visible1, newest1 = samples[-1]
+    summary = {
+        "ingested_rows": round(visible1 - visible0),
+        "achieved_rows_per_sec": round(
+            (visible1 - visible0) / (t1 - t0) if t1 > t0 else 0.0, 1
+        ),
+    }
+    if rows_per_sec:
+        # seconds of the schedule not yet visible when each probe ran
+        lags = [
+            max(0.0, (t - t0) - (visible - visible0) / rows_per_sec)
+            for t, visible, newest in samples[1:]
+        ]
+        summary["ingest_lag_p50_s"] = round(statistics.median(lags), 2)
+        summary["ingest_lag_max_s"] = round(max(lags), 2)
+    return summary
+
+
+def ingest_latency_summary(args, step: int) -> dict:
+    """Batch latency from the scheduled send time, over the writers' latency files."""
+    batches = []
+    for writer in range(args.writers):
+        path = latency_path(args, step, writer)
+        if path.exists():
+            batches += read_latencies(path)
+    if not batches:
+        return {}
+    summary = summarize(batches)
+    return {
+        "ingest_batches": summary["batches"],
+        "ingest_failed_batches": summary["failed"],
+        "ingest_latency_p50_ms": summary["latency_p50_ms"],
+        "ingest_latency_p99_ms": summary["latency_p99_ms"],
+        "ingest_latency_max_ms": summary["latency_max_ms"],
+    }
+
+
+def query_summary(timings: list, seconds: float) -> dict:
+    latencies_ms = [s * 1000 for query, s, error in timings if error is None]
+    return {
+        "requests": len(timings),
+        "errors": sum(1 for query, s, error in timings if error is not None),
+        "queries_per_sec": round(len(latencies_ms) / seconds if seconds else 0.0, 2),
+        "latency_p50_ms": round(
+            statistics.median(latencies_ms) if latencies_ms else 0.0, 2
+        ),
+        "latency_p95_ms": round(percentile(latencies_ms, 95), 2),
+        "latency_p99_ms": round(percentile(latencies_ms, 99), 2),
+        "latency_max_ms": round(max(latencies_ms, default=0.0), 2),
+    }
+
+
+def run_step(args, executor, pools, base_params, mix, step, rows_per_sec, concurrency):
+    """One ingest rate and query concurrency; a result row per query and one for all."""
+    query_pool, probe_pool = pools
+    print(
+        f"\n=== Step {step}: ingest {rate_text(rows_per_sec)} rows/s, "
+        f"{concurrency} query threads, {args.step_seconds}s ==="
+    )
+    start = time.monotonic()
+    samples = [
+        probe_pool.submit(
+            probe_ingest, executor, args.vm_samples_per_row, start
+        ).result()
+    ]
+    started_at = utc_now()
+    writers = start_writers(args, step, rows_per_sec) if rows_per_sec else []
+    stop = threading.Event()
+    watcher = probe_pool.submit(watch_ingest, executor, args, start, samples, stop)
+    timings = []
+    workers = [
+        query_pool.submit(
+            query_worker,
+            args.engine,
+            executor,
+            base_params,
+            mix,
+            samples,
+            args,
+            stop,
+            timings,
+        )
+        for i in range(concurrency)
+    ]
+    deadline = start + args.step_seconds
+    while time.monotonic() < deadline:
+        if writers and all(w.poll() is not None for w in writers):
+            print("  All writers exited before the end of the step", file=sys.stderr)
+            break
+        time.sleep(0.5)
+    stop.set()
+    for future in workers + [watcher]:
+        future.result()
+    seconds = time.monotonic() - start
+    writer_failures = stop_writers(writers)
+    if writer_failures:
+        print(
+            f"  {writer_failures} writers failed, see {args.log_dir}", file=sys.stderr
+        )
+    samples.append(
+        probe_pool.submit(
+            probe_ingest, executor, args.vm_samples_per_row, start
+        ).result()
+    )
+
+    step_row = {
+        "step": step,
+        "engine": args.engine,
+        "ingest_rows_per_sec": rows_per_sec,
+        "query_concurrency": concurrency,
+        "started_at": started_at,
+        "finished_at": utc_now(),
+        "seconds": round(seconds, 1),
+        "writer_failures": writer_failures,
+        "ingested_rows": 0,
+        "achieved_rows_per_sec": 0.0,
+        "ingest_lag_p50_s": "",
+        "ingest_lag_max_s": "",
+        "ingest_batches": "",
+        "ingest_failed_batches": "",
+        "ingest_latency_p50_ms": "",
+        "ingest_latency_p99_ms": "",
+        "ingest_latency_max_ms": "",
+    }
+    step_row.update(ingest_summary(samples, rows_per_sec))
+    if rows_per_sec:
+        step_row.update(ingest_latency_summary(args, step))
+    if not concurrency:
+        return [{**step_row, "query": "", **query_summary([], seconds)}]
+    errors = [error for query, s, error in timings if error is not None]
+    if errors:
+        print(
+            f"  {len(errors)} of {len(timings)} requests failed: {errors[0]}",
+            file=sys.stderr,
+        )
+    results = [{**step_row, "query": "all", **query_summary(timings, seconds)}]
+    for query in mix:
+        results.append(
+            {
+                **step_row,
+                "query": query,
+                **query_summary([t for t in timings if t[0] == query], seconds),
+            }
+        )
+    return results
+
+
+def add_degradation(results: list):
+    """
+    Query p99 relative to the step without ingest at the same concurrency,
+    and the achieved ingest rate relative to the step without queries at
+    the same rate.
+    """
+    quiet_queries = {
+        (r["query_concurrency"], r["query"]): r["latency_p99_ms"]
+        for r in results
+        if r["ingest_rows_per_sec"] == 0
+    }
+    quiet_ingest = {
+        r["ingest_rows_per_sec"]: r["achieved_rows_per_sec"]
+        for r in results
+        if r["query_concurrency"] == 0
+    }
+    for r in results:
+        baseline_p99 = quiet_queries.get((r["query_concurrency"], r["query"]))
+        r["p99_vs_no_ingest"] = (
+            round(r["latency_p99_ms"] / baseline_p99, 2)
+            if r["ingest_rows_per_sec"] and r["query_concurrency"] and baseline_p99
+            else ""
+        )
+        baseline_rate = quiet_ingest.get(r["ingest_rows_per_sec"])
+        r["ingest_vs_no_queries"] = (
+            round(r["achieved_rows_per_sec"] / baseline_rate, 2)
+            if r["ingest_rows_per_sec"] and r["query_concurrency"] and baseline_rate
+            else ""
+        )
+
+
+def sustainable_rates(results: list, target_p99_ms: float) -> dict:
+    """
+    {query concurrency: highest ingest rate whose batch p99 met the target},
+    counting a rate only if every lower rate met it too.
+    """
+    steps = {}
+    for r in results:
+        if r["ingest_rows_per_sec"] and r["ingest_latency_p99_ms"] != "":
+            steps[(r["query_concurrency"], r["ingest_rows_per_sec"])] = r[
+                "ingest_latency_p99_ms"
+            ]
+    sustainable = {}
+    for concurrency in sorted({concurrency for concurrency, rate in steps}):
+        sustainable[concurrency] = 0
+        for rate in sorted(rate for c, rate in steps if c == concurrency):
+            if steps[(concurrency, rate)] > target_p99_ms:
+                break
+            sustainable[concurrency] = rate
+    return sustainable
+
+
+def run_mixed_load(args) -> list:
+    mix = args.mix
+    executor = make_executor(args.engine, args)
+    base_params = {
+        "step": args.step,
+        "top_n": args.top_n,
+        "device": args.device,
+        "interface": args.interface,
+        "table": args.table,
+        "flow_table": args.flow_table,
+        "timescale_layout": args.timescale_layout,
+    }
+    results = []
+    try:
+        if "interface_rate" in mix and not (args.device and args.interface):
+            samples = [probe_ingest(executor, args.vm_samples_per_row, 0.0)]
+            pick_interface(
+                args.engine, executor, window_params(base_params, samples, args)
+            )
+        with ThreadPoolExecutor(
+            max_workers=max(max(args.query_threads), 1)
+        ) as query_pool, ThreadPoolExecutor(max_workers=1) as probe_pool:
+            step = 0
+            for rows_per_sec in args.rates:
+                for concurrency in args.query_threads:
+                    if not rows_per_sec and not concurrency:
+                        continue
+                    step += 1
+                    results += run_step(
+                        args,
+                        executor,
+                        (query_pool, probe_pool),
+                        base_params,
+                        mix,
+                        step,
+                        rows_per_sec,
+                        concurrency,
+                    )
+    finally:
+        executor.close()
+    add_degradation(results)
+    return results
+
+
+def print_results(results: list):
+    print(f"\n--- Mixed Load ({results[0]['engine']}) ---")
+    print(
+        f"{'step':>4} {'rows/s':>9} {'achieved':>9} {'lag p50':>8} {'lag max':>8} "
+        f"{'conc':>5} {'query':>17} {'qps':>8} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'p99 x':>6} {'ingest x':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['step']:>4} {rate_text(r['ingest_rows_per_sec']):>9} "
+            f"{r['achieved_rows_per_sec']:>9} {r['ingest_lag_p50_s']:>8} "
+            f"{r['ingest_lag_max_s']:>8} {r['query_concurrency']:>5} {r['query']:>17} "
+            f"{r['queries_per_sec']:>8} {r['latency_p50_ms']:>9} {r['latency_p99_ms']:>9} "
+            f"{r['p99_vs_no_ingest']:>6} {r['ingest_vs_no_queries']:>8}"
+        )
+
+
+def print_sustainable_rates(results: list, target_p99_ms: float):
+    sustainable = sustainable_rates(results, target_p99_ms)
+    if not sustainable:
+        print(
+            "\nNo ingest latencies to compare with --ingest_p99_ms; give the insert "
+            "command --latency-output {latency_output}",
+            file=sys.stderr,
+        )
+        return
+    print(f"\n--- Sustainable ingest rate at p99 <= {target_p99_ms} ms ---")
+    for concurrency, rate in sustainable.items():
+        print(
+            f"{concurrency:>5} query threads: "
+            f"{rate_text(rate) + ' rows/s' if rate else 'none of the rates'}"
+        )
+
+
+def write_results(results: list, output_file: Path):
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nMixed load results written to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs an engine's insert script at a series of paced rates "
+        "while threads send a weighted mix of the dashboard queries, and reports "
+        "ingest lag and query latency for every rate and query concurrency."
+    )
+    add_engine_arguments(parser)
+    parser.add_argument(
+        "--insert_command",
+        default=None,
+        help="Shell command of one insert writer, with {rows_per_sec} for the "
+        "writer's paced rate and optionally {writer}, {writers}, {step} and "
+        "{latency_output} (a file for the writer's --latency-output) "
+        "(e.g. python insert.py --transform-input-dir /data/part{writer} "
+        "--rows-per-sec {rows_per_sec}); needed unless --ingest_rates is 0",
+    )
+    parser.add_argument(
+        "--insert_dir",
+        type=Path,
+        default=Path("."),
+        help="Directory --insert_command runs in (e.g. ../elasticsearch)",
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=1,
+        help="Insert commands per step, sharing the rate",
+    )
+    parser.add_argument(
+        "--ingest_rates",
+        default=DEFAULT_INGEST_RATES,
+        help=f"Comma separated rows per second to ingest at, 0 for no ingest "
+        f"(default: {DEFAULT_INGEST_RATES})",
+    )
+    parser.add_argument(
+        "--query_concurrency",
+        default=DEFAULT_QUERY_CONCURRENCY,
+        help=f"Comma separated query threads, 0 for no queries "
+        f"(default: {DEFAULT_QUERY_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--query_mix",
+        default=DEFAULT_QUERY_MIX,
+        help=f"Comma separated query=weight (default: {DEFAULT_QUERY_MIX})",
+    )
+    parser.add_argument(
+        "--step_seconds",
+        type=float,
+        default=120,
+        help="Seconds per ingest rate and query concurrency",
+    )
+    parser.add_argument(
+        "--lookback",
+        type=int,
+        default=3600,
+        help="Seconds of data the queries cover, up to the newest visible row",
+    )
+    parser.add_argument(
+        "--end",
+        default=None,
+        help="Fixed end of the queried window, ISO 8601 UTC, instead of the "
+        "newest visible row; required for victoriametrics",
+    )
+    parser.add_argument(
+        "--probe_interval",
+        type=float,
+        default=5,
+        help="Seconds between counts of the visible rows",
+    )
+    parser.add_argument(
+        "--vm_samples_per_row",
+        type=float,
+        default=1,
+        help="victoriametrics: samples each inserted row becomes (its metric "
+        "columns), to turn ingested samples into rows",
+    )
+    parser.add_argument(
+        "--ingest_p99_ms",
+        type=float,
+        default=None,
+        help="Report the highest rate whose ingest batch p99, from the writers' "
+        "{latency_output} files, stayed at or under this",
+    )
+    parser.add_argument(
+        "--log_dir",
+        type=Path,
+        default=Path("mixed_load_logs"),
+        help="Directory for the writers' output",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("mixed_load.csv"),
+        help="CSV file for the results",
+    )
+
+    args = parser.parse_args()
+    # the writers run in --insert_dir, so their {latency_output} must not be relative
+    args.log_dir = args.log_dir.resolve()
+
+    try:
+        args.mix = parse_query_mix(args.query_mix)
+    except ValueError as e:
+        parser.error(f"--query_mix: {e}")
+    args.rates = [float(r) for r in args.ingest_rates.split(",") if r]
+    args.query_threads = [int(c) for c in args.query_concurrency.split(",") if c]
+    if any(args.rates) and not args.insert_command:
+        parser.error("--insert_command is required to ingest")
+    if args.writers < 1:
+        parser.error("--writers must be > 0")
+    args.end_time = parse_utc(args.end) if args.end else None
+    if args.engine == "victoriametrics" and args.end_time is None:
+        parser.error("--end is required for victoriametrics")
+    if not args.rates or not args.query_threads:
+        parser.error("--ingest_rates and --query_concurrency need a value each")
+    resolve_engine_arguments(parser, args, list(args.mix))
+    # the executors size their connection pools for the query threads and the probe
+    args.concurrency_levels = [max(args.query_threads) + 1]
+
+    results = run_mixed_load(args)
+    if results:
+        print_results(results)
+        if args.ingest_p99_ms:
+            print_sustainable_rates(results, args.ingest_p99_ms)
+        write_results(results, args.output)
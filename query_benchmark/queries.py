@@ -0,0 +1,464 @@
+"""
+The dashboard query set, written once per engine against the tables each
+directory's insert script fills:
+
+  interface_rate    in and out bits per second of one interface, per step
+  top_interfaces    the top_n interfaces by inbound bits over the window
+  location_rollup   inbound bits per second per device_info.loc_name, per step
+  flow_top_talkers  the top_n source/destination organization pairs by bits
+
+Rates are bucket sums of the .delta counters divided by the step, the same
+in every engine. The flow query reads the flow_enriched view of
+clickhouse.old/sql/stardust_flow.sql on ClickHouse and the Stardust flow
+export (values.num_bits, meta.src_organization, meta.dst_organization)
+everywhere else.
+
+Every *_queries() function takes the params dict built by
+query_benchmark.py (start and end as UTC datetimes, step and window in
+seconds, top_n, device, interface, the table names) and returns
+{query name: request}, where a request is whatever the engine's executor in
+engines.py sends.
+"""
+
+QUERY_NAMES = [
+    "interface_rate",
+    "top_interfaces",
+    "location_rollup",
+    "flow_top_talkers",
+]
+
+# snmp fields of the Timescale tables: values_inline and values_wide_inline
+# keep the metadata in one jsonb column, values_wide_inline_normalized in
+# one column per field
+TIMESCALE_FIELDS = {
+    "jsonb": {
+        "device": "metadata->>'device'",
+        "interface": "metadata->>'name'",
+        "loc_name": "metadata#>>'{device_info,loc_name}'",
+    },
+    "columns": {
+        "device": '"meta.device"',
+        "interface": '"meta.name"',
+        "loc_name": '"meta.device_info.loc_name"',
+    },
+}
+
+# document fields of the search engines. Elasticsearch's mappings.py keeps
+# the fetcher's names; OpenSearch's drops the values./meta. prefixes,
+# flattens values.*.delta to *_delta and keeps the other dots, which
+# assemble.py nests. OpenSearch has no flow format, so a flow index there
+# holds the fetcher's names.
+FLOW_SEARCH_FIELDS = {
+    "src_organization": "meta.src_organization",
+    "dst_organization": "meta.dst_organization",
+    "num_bits": "values.num_bits",
+}
+SEARCH_FIELDS = {
+    "elasticsearch": {
+        "device": "meta.device",
+        "interface": "meta.name",
+        "in_bits": "values.in_bits.delta",
+        "out_bits": "values.out_bits.delta",
+        "loc_name": "meta.device_info.loc_name",
+        **FLOW_SEARCH_FIELDS,
+    },
+    "opensearch": {
+        "device": "device",
+        "interface": "name",
+        "in_bits": "in_bits_delta",
+        "out_bits": "out_bits_delta",
+        "loc_name": "device_info.loc_name",
+        **FLOW_SEARCH_FIELDS,
+    },
+}
+LOC_NAME_BUCKETS = 1000
+# the params the SQL queries bind rather than format into the text
+BOUND_PARAMS = ["start", "end", "step", "top_n", "device", "interface"]
+
+
+def quote_clickhouse(name: str) -> str:
+    return ".".join(f"`{part}`" for part in name.split("."))
+
+
+def clickhouse_queries(params: dict) -> dict:
+    """(sql, parameters) pairs for clickhouse_connect's server side binding."""
+    table = quote_clickhouse(params["table"])
+    flow_table = quote_clickhouse(params["flow_table"])
+    bound = {key: params[key] for key in BOUND_PARAMS}
+    in_range = (
+        "`@timestamp` >= {start:DateTime64(3)} AND `@timestamp` < {end:DateTime64(3)}"
+    )
+    bucket = "toStartOfInterval(`@timestamp`, toIntervalSecond({step:UInt32}))"
+    return {
+        "interface_rate": (
+            f"SELECT {bucket} AS bucket, "
+            "sum(`values.in_bits.delta`) / {step:UInt32} AS in_bps, "
+            "sum(`values.out_bits.delta`) / {step:UInt32} AS out_bps "
+            f"FROM {table} "
+            "WHERE `meta.device` = {device:String} AND `meta.name` = {interface:String} "
+            f"AND {in_range} GROUP BY bucket ORDER BY bucket",
+            bound,
+        ),
+        "top_interfaces": (
+            "SELECT `meta.device`, `meta.name`, sum(`values.in_bits.delta`) AS bits "
+            f"FROM {table} WHERE {in_range} "
+            "GROUP BY `meta.device`, `meta.name` ORDER BY bits DESC LIMIT {top_n:UInt32}",
+            bound,
+        ),
+        "location_rollup": (
+            f"SELECT `meta.device_info.loc_name` AS loc_name, {bucket} AS bucket, "
+            "sum(`values.in_bits.delta`) / {step:UInt32} AS in_bps "
+            f"FROM {table} WHERE {in_range} "
+            "GROUP BY loc_name, bucket ORDER BY loc_name, bucket",
+            bound,
+        ),
+        "flow_top_talkers": (
+            "SELECT organization_src, organization_dst, sum(bytes) * 8 AS bits "
+            f"FROM {flow_table} "
+            "WHERE start_time_ms >= {start:DateTime64(3)} AND start_time_ms < {end:DateTime64(3)} "
+            "GROUP BY organization_src, organization_dst "
+            "ORDER BY bits DESC LIMIT {top_n:UInt32}",
+            bound,
+        ),
+    }
+
+
+def timescale_queries(params: dict) -> dict:
+    """(sql, parameters) pairs for psycopg2."""
+    fields = TIMESCALE_FIELDS[params["timescale_layout"]]
+    table = params["table"]
+    bound = {key: params[key] for key in BOUND_PARAMS}
+    in_range = "_timestamp >= %(start)s AND _timestamp < %(end)s"
+    bucket = "time_bucket(make_interval(secs => %(step)s), _timestamp)"
+    return {
+        "interface_rate": (
+            f"SELECT {bucket} AS bucket, "
+            "sum(in_bits_delta) / %(step)s AS in_bps, "
+            "sum(out_bits_delta) / %(step)s AS out_bps "
+            f"FROM {table} "
+            f"WHERE {fields['device']} = %(device)s AND {fields['interface']} = %(interface)s "
+            f"AND {in_range} GROUP BY bucket ORDER BY bucket",
+            bound,
+        ),
+        "top_interfaces": (
+            f"SELECT {fields['device']}, {fields['interface']}, sum(in_bits_delta) AS bits "
+            f"FROM {table} WHERE {in_range} "
+            "GROUP BY 1, 2 ORDER BY bits DESC NULLS LAST LIMIT %(top_n)s",
+            bound,
+        ),
+        "location_rollup": (
+            f"SELECT {fields['loc_name']} AS loc_name, {bucket} AS bucket, "
+            "sum(in_bits_delta) / %(step)s AS in_bps "
+            f"FROM {table} WHERE {in_range} "
+            "GROUP BY 1, 2 ORDER BY 1, 2",
+            bound,
+        ),
+        "flow_top_talkers": (
+            'SELECT "meta.src_organization", "meta.dst_organization", '
+            'sum("values.num_bits") AS bits '
+            f"FROM {params['flow_table']} WHERE {in_range} "
+            "GROUP BY 1, 2 ORDER BY bits DESC NULLS LAST LIMIT %(top_n)s",
+            bound,
+        ),
+    }
+
+
+def search_queries(params: dict, engine: str) -> dict:
+    """(path, body) pairs of _search requests for Elasticsearch and OpenSearch."""
+    fields = SEARCH_FIELDS[engine]
+    time_range = {
+        "range": {
+            "@timestamp": {
+                "gte": params["start"].isoformat(),
+                "lt": params["end"].isoformat(),
+            }
+        }
+    }
+    histogram = {
+        "field": "@timestamp",
+        "fixed_interval": f"{params['step']}s",
+        "min_doc_count": 1,
+    }
+
+    def per_second(sum_name: str) -> dict:
+        return {
+            "bucket_script": {
+                "buckets_path": {"bits": sum_name},
+                "script": f"params.bits / {params['step']}",
+            }
+        }
+
+    def top_pairs(first: str, second: str, value: str) -> dict:
+        return {
+            "multi_terms": {
+                "terms": [{"field": first}, {"field": second}],
+                "size": params["top_n"],
+                "order": {"bits": "desc"},
+            },
+            "aggs": {"bits": {"sum": {"field": value}}},
+        }
+
+    path = f"/{params['table']}/_search"
+    return {
+        "interface_rate": (
+            path,
+            {
+                "size": 0,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {fields["device"]: params["device"]}},
+                            {"term": {fields["interface"]: params["interface"]}},
+                            time_range,
+                        ]
+                    }
+                },
+                "aggs": {
+                    "buckets": {
+                        "date_histogram": histogram,
+                        "aggs": {
+                            "in_bits": {"sum": {"field": fields["in_bits"]}},
+                            "out_bits": {"sum": {"field": fields["out_bits"]}},
+                            "in_bps": per_second("in_bits"),
+                            "out_bps": per_second("out_bits"),
+                        },
+                    }
+                },
+            },
+        ),
+        "top_interfaces": (
+            path,
+            {
+                "size": 0,
+                "query": {"bool": {"filter": [time_range]}},
+                "aggs": {
+                    "buckets": top_pairs(
+                        fields["device"], fields["interface"], fields["in_bits"]
+                    )
+                },
+            },
+        ),
+        "location_rollup": (
+            path,
+            {
+                "size": 0,
+                "query": {"bool": {"filter": [time_range]}},
+                "aggs": {
+                    "buckets": {
+                        "terms": {
+                            "field": fields["loc_name"],
+                            "size": LOC_NAME_BUCKETS,
+                        },
+                        "aggs": {
+                            "buckets": {
+                                "date_histogram": histogram,
+                                "aggs": {
+                                    "in_bits": {"sum": {"field": fields["in_bits"]}},
+                                    "in_bps": per_second("in_bits"),
+                                },
+                            }
+                        },
+                    }
+                },
+            },
+        ),
+        "flow_top_talkers": (
+            f"/{params['flow_table']}/_search",
+            {
+                "size": 0,
+                "query": {"bool": {"filter": [time_range]}},
+                "aggs": {
+                    "buckets": top_pairs(
+                        fields["src_organization"],
+                        fields["dst_organization"],
+                        fields["num_bits"],
+                    )
+                },
+            },
+        ),
+    }
+
+
+def mongo_queries(params: dict) -> dict:
+    """
+    (collection, pipeline) pairs. mongo_insert_benchmark.py keeps the dots of
+    the field names after the values./meta. prefix, so in_bits.delta and
+    device_info.loc_name are read with $getField.
+    """
+    in_range = {"timestamp": {"$gte": params["start"], "$lt": params["end"]}}
+    bucket = {
+        "$dateTrunc": {
+            "date": "$timestamp",
+            "unit": "second",
+            "binSize": params["step"],
+        }
+    }
+    in_bits = {"$getField": "in_bits.delta"}
+    out_bits = {"$getField": "out_bits.delta"}
+    loc_name = {"$getField": {"field": "device_info.loc_name", "input": "$metadata"}}
+    step = params["step"]
+    return {
+        "interface_rate": (
+            params["table"],
+            [
+                {
+                    "$match": {
+                        "metadata.device": params["device"],
+                        "metadata.interfaceName": params["interface"],
+                        **in_range,
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": bucket,
+                        "in_bits": {"$sum": in_bits},
+                        "out_bits": {"$sum": out_bits},
+                    }
+                },
+                {
+                    "$project": {
+                        "in_bps": {"$divide": ["$in_bits", step]},
+                        "out_bps": {"$divide": ["$out_bits", step]},
+                    }
+                },
+                {"$sort": {"_id": 1}},
+            ],
+        ),
+        "top_interfaces": (
+            params["table"],
+            [
+                {"$match": in_range},
+                {
+                    "$group": {
+                        "_id": {
+                            "device": "$metadata.device",
+                            "interface": "$metadata.interfaceName",
+                        },
+                        "bits": {"$sum": in_bits},
+                    }
+                },
+                {"$sort": {"bits": -1}},
+                {"$limit": params["top_n"]},
+            ],
+        ),
+        "location_rollup": (
+            params["table"],
+            [
+                {"$match": in_range},
+                {
+                    "$group": {
+                        "_id": {"loc_name": loc_name, "bucket": bucket},
+                        "in_bits": {"$sum": in_bits},
+                    }
+                },
+                {"$project": {"in_bps": {"$divide": ["$in_bits", step]}}},
+                {"$sort": {"_id.loc_name": 1, "_id.bucket": 1}},
+            ],
+        ),
+        "flow_top_talkers": (
+            params["flow_table"],
+            [
+                {"$match": in_range},
+                {
+                    "$group": {
+                        "_id": {
+                            "src": "$metadata.src_organization",
+                            "dst": "$metadata.dst_organization",
+                        },
+                        "bits": {"$sum": "$num_bits"},
+                    }
+                },
+                {"$sort": {"bits": -1}},
+                {"$limit": params["top_n"]},
+            ],
+        ),
+    }
+
+
+def metricsql_string(value: str) -> str:
+    value = "" if value is None else str(value)
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def victoriametrics_queries(params: dict) -> dict:
+    """
+    (path, query arguments) pairs for the Prometheus querying API. The CSV
+    import keeps the fetcher's column names as metric and label names. Top N
+    queries are instant queries at the end of the window.
+    """
+    step = params["step"]
+    window = params["window"]
+    range_args = {
+        "start": params["start"].timestamp(),
+        "end": params["end"].timestamp(),
+        "step": f"{step}s",
+    }
+    instant_args = {"time": params["end"].timestamp()}
+    interface = (
+        f"meta.device={metricsql_string(params['device'])},"
+        f"meta.name={metricsql_string(params['interface'])}"
+    )
+
+    def interface_bps(direction: str) -> str:
+        return (
+            f'label_set(sum(sum_over_time({{__name__="values.{direction}_bits.delta",'
+            f'{interface}}}[{step}s])) / {step}, "direction", "{direction}")'
+        )
+
+    return {
+        "interface_rate": (
+            "/api/v1/query_range",
+            {"query": f"{interface_bps('in')} or {interface_bps('out')}", **range_args},
+        ),
+        "top_interfaces": (
+            "/api/v1/query",
+            {
+                "query": f"topk({params['top_n']}, sum by (meta.device, meta.name) "
+                f'(sum_over_time({{__name__="values.in_bits.delta"}}[{window}s])))',
+                **instant_args,
+            },
+        ),
+        "location_rollup": (
+            "/api/v1/query_range",
+            {
+                "query": "sum by (meta.device_info.loc_name) "
+                f'(sum_over_time({{__name__="values.in_bits.delta"}}[{step}s])) / {step}',
+                **range_args,
+            },
+        ),
+        "flow_top_talkers": (
+            "/api/v1/query",
+            {
+                "query": f"topk({params['top_n']}, "
+                "sum by (meta.src_organization, meta.dst_organization) "
+                f'(sum_over_time({{__name__="values.num_bits"}}[{window}s])))',
+                **instant_args,
+            },
+        ),
+    }
+
+
+def engine_queries(engine: str, params: dict) -> dict:
+    if engine == "clickhouse":
+        return clickhouse_queries(params)
+    if engine == "timescaledb":
+        return timescale_queries(params)
+    if engine in SEARCH_FIELDS:
+        return search_queries(params, engine)
+    if engine == "mongodb":
+        return mongo_queries(params)
+    return victoriametrics_queries(params)
+
+
+def top_interface(engine: str, rows: list):
+    """(device, interface) of the first top_interfaces result row, or None."""
+    if not rows:
+        return None
+    row = rows[0]
+    if engine in ("clickhouse", "timescaledb"):
+        return row[0], row[1]
+    if engine in SEARCH_FIELDS:
+        return tuple(row["key"])
+    if engine == "mongodb":
+        return row["_id"]["device"], row["_id"]["interface"]
+    return row["metric"].get("meta.device"), row["metric"].get("meta.name")
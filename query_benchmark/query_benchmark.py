@@ -0,0 +1,373 @@
+import argparse
+import csv
+import datetime
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from engines import DEFAULT_PORTS, DEFAULT_TABLES, ENGINES, make_executor
+from queries import QUERY_NAMES, engine_queries, top_interface
+
+DEFAULT_CONCURRENCY = "1,4,16"
+FLOW_QUERIES = ["flow_top_talkers"]
+
+
+def parse_utc(text: str) -> datetime.datetime:
+    """ISO 8601 time, UTC unless it says otherwise."""
+    dt = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def utc_now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(
+        timespec="milliseconds"
+    )
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def drop_os_cache():
+    """Drops the local page cache; needs root, and only helps on the database host."""
+    subprocess.run(["sync"], check=False)
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError as e:
+        print(f"Warning: could not drop the page cache: {e}", file=sys.stderr)
+
+
+def timed_request(executor, request, cold=False) -> tuple:
+    """(seconds, result rows, error) of one request; rows is None on errors."""
+    start = time.perf_counter()
+    try:
+        rows = executor.execute(request, cold=cold)
+        error = None
+    except Exception as e:
+        rows = None
+        error = str(e)
+    return time.perf_counter() - start, rows, error
+
+
+def summarize(
+    engine, query, phase, concurrency, timings, wall_seconds, started_at
+) -> dict:
+    latencies_ms = [seconds * 1000 for seconds, rows, error in timings if error is None]
+    errors = [error for seconds, rows, error in timings if error is not None]
+    if errors:
+        print(
+            f"  {len(errors)} of {len(timings)} {query} requests failed: {errors[0]}",
+            file=sys.stderr,
+        )
+    result_rows = [len(rows) for seconds, rows, error in timings if rows is not None]
+    return {
+        "engine": engine,
+        "query": query,
+        "pass": phase,
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "errors": len(errors),
+        "result_rows": result_rows[-1] if result_rows else 0,
+        "queries_per_sec": round(
+            len(latencies_ms) / wall_seconds if wall_seconds > 0 else 0.0, 2
+        ),
+        "latency_p50_ms": round(
+            statistics.median(latencies_ms) if latencies_ms else 0.0, 2
+        ),
+        "latency_p90_ms": round(percentile(latencies_ms, 90), 2),
+        "latency_p95_ms": round(percentile(latencies_ms, 95), 2),
+        "latency_p99_ms": round(percentile(latencies_ms, 99), 2),
+        "latency_max_ms": round(max(latencies_ms, default=0.0), 2),
+        "started_at": started_at,
+        "finished_at": utc_now(),
+    }
+
+
+def cold_pass(engine, executor, queries: dict, runs: int, os_cache: bool) -> list:
+    """Every query alone, right after clearing the caches, runs times."""
+    results = []
+    for query, request in queries.items():
+        print(f"\n=== {query}, cold, {runs} runs ===")
+        started_at = utc_now()
+        timings = []
+        for i in range(runs):
+            for warning in executor.clear_caches():
+                if i == 0:
+                    print(f"  Note: {warning}", file=sys.stderr)
+            if os_cache:
+                drop_os_cache()
+            timings.append(timed_request(executor, request, cold=True))
+        results.append(
+            summarize(
+                engine,
+                query,
+                "cold",
+                1,
+                timings,
+                sum(seconds for seconds, rows, error in timings),
+                started_at,
+            )
+        )
+    return results
+
+
+def warm_pass(
+    engine, executor, queries: dict, concurrency_levels: list, requests: int
+) -> list:
+    """Every query after one warm-up request, requests times per concurrency level."""
+    results = []
+    for query, request in queries.items():
+        timed_request(executor, request)
+        for concurrency in concurrency_levels:
+            print(f"\n=== {query}, warm, concurrency {concurrency} ===")
+            started_at = utc_now()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                timings = list(
+                    pool.map(
+                        lambda i: timed_request(executor, request), range(requests)
+                    )
+                )
+            wall_seconds = time.perf_counter() - start
+            results.append(
+                summarize(
+                    engine,
+                    query,
+                    "warm",
+                    concurrency,
+                    timings,
+                    wall_seconds,
+                    started_at,
+                )
+            )
+    return results
+
+
+def build_params(args) -> dict:
+    start = parse_utc(args.start)
+    end = parse_utc(args.end)
+    if end <= start:
+        sys.exit("Error: --end must be after --start.")
+    return {
+        "start": start,
+        "end": end,
+        "step": args.step,
+        "window": int((end - start).total_seconds()),
+        "top_n": args.top_n,
+        "device": args.device,
+        "interface": args.interface,
+        "table": args.table,
+        "flow_table": args.flow_table,
+        "timescale_layout": args.timescale_layout,
+    }
+
+
+def pick_interface(engine, executor, params: dict):
+    """Fills in the busiest interface for interface_rate from top_interfaces."""
+    seconds, rows, error = timed_request(
+        executor, engine_queries(engine, params)["top_interfaces"]
+    )
+    if error is not None:
+        sys.exit(f"Error: could not pick an interface with top_interfaces: {error}")
+    picked = top_interface(engine, rows)
+    if picked is None:
+        sys.exit("Error: top_interfaces found no interface in the time window.")
+    params["device"], params["interface"] = picked
+    print(f"Querying interface {picked[0]} {picked[1]} for interface_rate")
+
+
+def run_benchmark(args) -> list:
+    params = build_params(args)
+    executor = make_executor(args.engine, args)
+    try:
+        if "interface_rate" in args.queries and not (args.device and args.interface):
+            pick_interface(args.engine, executor, params)
+        queries = engine_queries(args.engine, params)
+        queries = {query: queries[query] for query in args.queries}
+        results = []
+        if args.cold_runs:
+            results += cold_pass(
+                args.engine, executor, queries, args.cold_runs, args.drop_os_cache
+            )
+        results += warm_pass(
+            args.engine, executor, queries, args.concurrency_levels, args.requests
+        )
+    finally:
+        executor.close()
+    return results
+
+
+def print_results(results: list):
+    print(f"\n--- Query Benchmark ({results[0]['engine']}) ---")
+    print(
+        f"{'query':>17} {'pass':>5} {'conc':>5} {'reqs':>5} {'errors':>6} "
+        f"{'rows':>7} {'qps':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+        f"{'max ms':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['query']:>17} {result['pass']:>5} {result['concurrency']:>5} "
+            f"{result['requests']:>5} {result['errors']:>6} {result['result_rows']:>7} "
+            f"{result['queries_per_sec']:>9} {result['latency_p50_ms']:>10} "
+            f"{result['latency_p95_ms']:>10} {result['latency_p99_ms']:>10} "
+            f"{result['latency_max_ms']:>10}"
+        )
+
+
+def write_results(results: list, output_file: Path):
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nQuery benchmark results written to {output_file}")
+
+
+def add_engine_arguments(parser):
+    """The connection, table and query shape arguments, shared with mixed_load.py."""
+    parser.add_argument("--engine", required=True, choices=ENGINES)
+    parser.add_argument("--host", default="localhost", help="Datastore host")
+    parser.add_argument(
+        "--port", type=int, default=None, help="Port (default: the engine's usual port)"
+    )
+    parser.add_argument("--user", default=None, help="User, if the engine needs one")
+    parser.add_argument("--password", default=None, help="Password")
+    parser.add_argument(
+        "--database",
+        default=None,
+        help="Timescale database (default: timescale) or MongoDB database "
+        "(default: metranova)",
+    )
+    parser.add_argument(
+        "--uri", default=None, help="MongoDB connection URI, instead of host and port"
+    )
+    parser.add_argument(
+        "--scheme",
+        choices=["http", "https"],
+        default="http",
+        help="Elasticsearch, OpenSearch and VictoriaMetrics URL scheme",
+    )
+    parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="Skip TLS certificate verification with --scheme https",
+    )
+    parser.add_argument(
+        "--table",
+        default=None,
+        help="SNMP table, index or collection (default: what the engine's insert "
+        "script fills); ClickHouse tables as db.table",
+    )
+    parser.add_argument(
+        "--flow_table",
+        default=None,
+        help="Flow table, index or collection (ClickHouse default: the "
+        "metranova.flow_enriched view)",
+    )
+    parser.add_argument(
+        "--timescale_layout",
+        choices=["jsonb", "columns"],
+        default="jsonb",
+        help="Timescale SNMP metadata: one jsonb column (values_inline, "
+        "values_wide_inline) or one column per field (values_wide_inline_normalized)",
+    )
+    parser.add_argument(
+        "--step", type=int, default=300, help="Seconds per bucket of the time series"
+    )
+    parser.add_argument(
+        "--top_n", type=int, default=10, help="Rows of the top N queries"
+    )
+    parser.add_argument(
+        "--device",
+        default=None,
+        help="interface_rate device (default: the busiest interface of top_interfaces)",
+    )
+    parser.add_argument("--interface", default=None, help="interface_rate interface")
+
+
+def resolve_engine_arguments(parser, args, queries: list):
+    """Fills in the engine's default port and tables for the queries that run."""
+    if args.port is None:
+        args.port = DEFAULT_PORTS[args.engine]
+    default_table, default_flow_table = DEFAULT_TABLES[args.engine]
+    args.table = args.table or default_table
+    args.flow_table = args.flow_table or default_flow_table
+    if args.engine == "mongodb":
+        if any(q not in FLOW_QUERIES for q in queries) and not args.table:
+            parser.error("--table is required for mongodb")
+        if any(q in FLOW_QUERIES for q in queries) and not args.flow_table:
+            parser.error("--flow_table is required for mongodb flow queries")
+        args.table = args.table or args.flow_table
+        args.flow_table = args.flow_table or args.table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the same dashboard queries (see queries.py) against any "
+        "of the evaluated datastores: a cold pass of single requests after "
+        "clearing the caches, then warm passes at each concurrency level, "
+        "reporting latency percentiles and queries per second."
+    )
+    add_engine_arguments(parser)
+    parser.add_argument(
+        "--start", required=True, help="Start of the queried window, ISO 8601 UTC"
+    )
+    parser.add_argument(
+        "--end", required=True, help="End of the queried window, ISO 8601 UTC"
+    )
+    parser.add_argument(
+        "--queries",
+        nargs="+",
+        choices=QUERY_NAMES,
+        default=QUERY_NAMES,
+        help="Queries to run",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default=DEFAULT_CONCURRENCY,
+        help=f"Comma separated concurrent requests of the warm passes "
+        f"(default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=50,
+        help="Requests per query and concurrency level in the warm passes",
+    )
+    parser.add_argument(
+        "--cold_runs",
+        type=int,
+        default=3,
+        help="Cold requests per query, each after clearing the caches; 0 skips "
+        "the cold pass",
+    )
+    parser.add_argument(
+        "--drop_os_cache",
+        action="store_true",
+        help="Also drop the page cache before cold requests; needs root and only "
+        "helps when run on the database host",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("query_benchmark.csv"),
+        help="CSV file for the results",
+    )
+
+    args = parser.parse_args()
+
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",") if c]
+    resolve_engine_arguments(parser, args, args.queries)
+
+    results = run_benchmark(args)
+    if results:
+        print_results(results)
+        write_results(results, args.output)
@@ -1,13 +1,25 @@
 import argparse
 import csv
+import io
 import json
 import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import scan
 import sys
 from formats import WIDE_FORMAT, NARROW_FORMAT, FLOW_FORMAT
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from stardust_io import ParquetRowWriter, compression_of, open_output
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 parser = argparse.ArgumentParser(description='Fetches public data from ESnet Stardust, formatting the output as csv, tsv, or json.')
 
 now = datetime.datetime.now() - datetime.timedelta(minutes=30) # processing delay, appx
@@ -17,21 +29,66 @@ fourteen_days_ago = datetime.datetime.now() - fourteen_days
 
 parser.add_argument('--start', help='Start date for fetch, in ISO8601 format. Default: 14 days, 30m ago.', default=fourteen_days_ago.isoformat())
 parser.add_argument('--end', help='End date for fetch, in ISO8601 format. Default: 30 min ago', default=now.isoformat())
-parser.add_argument('--format', help='Record dump format. Note that the "json" formatter dumps one json object per line, rather than an array of objects, to preserve streaming', default='tsv', choices=['tsv', 'json', 'csv'])
+parser.add_argument('--format', help='Record dump format. Note that the "json" formatter dumps one json object per line, rather than an array of objects, to preserve streaming. "parquet" writes zstd compressed row groups per --row-group-minutes of @timestamp', default='tsv', choices=['tsv', 'json', 'csv', 'parquet'])
 parser.add_argument('--stardust-url', default="https://el.gc1.prod.stardust.es.net:9200")
 parser.add_argument('--index', default='sd_public_interfaces')
-parser.add_argument('--outfile', default=sys.stdout, type=argparse.FileType('a'))
+parser.add_argument('--outfile', help='File to append to, "-" for stdout. Text formats are compressed when the name ends in .gz or .zst. Parquet output replaces the file', default='-')
+parser.add_argument('--compression-level', help='gzip or zstd level for .gz/.zst outfiles. Default: 6 for gzip, 3 for zstd', type=int)
+parser.add_argument('--row-group-minutes', help='Time window of @timestamp covered by one Parquet row group', type=float, default=60)
 parser.add_argument('--wide', action='store_true')
 parser.add_argument('--flow', action='store_true')
 parser.add_argument('--initial-count', default=0, type=int)
 parser.add_argument('--username', help='Username for Elasticsearch authentication (optional)')
 parser.add_argument('--password', help='Password for Elasticsearch authentication (optional)')
+parser.add_argument('--parts-dir', help='Fetch [start, end] as concurrent time slices into part files in this directory, with checkpoints. Rerunning with the same arguments resumes unfinished slices')
+parser.add_argument('--slice-hours', help='Length of a time slice with --parts-dir', type=float, default=6)
+parser.add_argument('--concurrency', help='Slices fetched concurrently with --parts-dir', type=int, default=4)
+parser.add_argument('--page-size', help='Hits per search_after page with --parts-dir', type=int, default=5000)
+parser.add_argument('--keep-alive', help='Point-in-time keep alive between pages with --parts-dir', default='5m')
+parser.add_argument('--no-concatenate', help='With --parts-dir, leave the finished parts in place instead of concatenating them to --outfile', action='store_true')
 
 args = parser.parse_args()
 
+if args.format == 'parquet' and compression_of(args.outfile):
+    parser.error("parquet output is compressed internally, don't name it .gz or .zst")
+
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger()
 
+def compile_extractor(fieldnames):
+    """
+    Compiles dotted field names into a function mapping a nested _source
+    document to the list of their values, in fieldname order.
+
+    The paths are split once into a prefix tree, so every shared prefix
+    ("values", "meta.device_info", ...) is looked up once per record rather
+    than once per field. Missing fields and paths through non-objects
+    resolve to None.
+    """
+    tree = {}
+    for idx, fieldname in enumerate(fieldnames):
+        node = tree
+        keys = fieldname.split(".")
+        for key in keys[:-1]:
+            node = node.setdefault(key, [None, {}])[1]
+        node.setdefault(keys[-1], [None, {}])[0] = idx
+    size = len(fieldnames)
+
+    def walk(doc, node, row):
+        for key, (idx, children) in node.items():
+            value = doc.get(key)
+            if idx is not None:
+                row[idx] = value
+            if children and type(value) is dict:
+                walk(value, children, row)
+
+    def extract(record):
+        row = [None] * size
+        walk(record, tree, row)
+        return row
+
+    return extract
+
 class DataDumper:
     def __init__(self, url, verify_certs=False, request_timeout=60, username=None, password=None):
         self.url = url
@@ -51,6 +108,12 @@ class DataDumper:
             es_params['basic_auth'] = (username, password)
         
         self.es = Elasticsearch(**es_params)
+        self.fieldnames = self.get_fieldnames(wide=args.wide, flow=args.flow)
+        self.extract = compile_extractor(self.fieldnames)
+
+    def source_filter(self):
+        # only ship the fields the output format needs
+        return {"includes": list(self.fieldnames)}
 
     def query(self, index=args.index, start=args.start, end=args.end):
         query = { "query": { 
@@ -61,6 +124,7 @@ class DataDumper:
                   }
                 }
             },
+            "_source": self.source_filter(),
             "sort": [{
                 "@timestamp": {
                     "order": "asc"
@@ -80,18 +144,16 @@ class DataDumper:
             return FLOW_FORMAT
         return NARROW_FORMAT
 
-    def resolve(self, record, keys):
-        key = keys.pop(0)
-        if len(keys) > 0:
-            return self.resolve(record.get(key, {}), keys)
-        return record.get(key)
+    def csv_kwargs(self, fmt):
+        if fmt == 'tsv':
+            return { "delimiter":'\t', "lineterminator":'\n'}
+        return {}
 
-    def format_record(self, record, wide=False, flow=False):
-        output = {}
-        for compound_key in self.get_fieldnames(wide=wide, flow=flow):
-            keys = compound_key.split(".")
-            output[compound_key] = self.resolve(record, keys)
-        return output
+    def json_line(self, record):
+        row = dict(zip(self.fieldnames, self.extract(record)))
+        if orjson is not None:
+            return orjson.dumps(row) + b"\n"
+        return (json.dumps(row) + "\n").encode("utf-8")
 
     def enumerate_keys(self, d, parent_key=""):
         for k in d.keys():
@@ -100,25 +162,207 @@ class DataDumper:
             if type(d[k]) == dict:
                 yield from self.enumerate_keys(d[k], parent_key=key)
 
-    
+    def render_header(self, fmt):
+        out = io.StringIO()
+        csv.writer(out, **self.csv_kwargs(fmt)).writerow(self.fieldnames)
+        return out.getvalue().encode("utf-8")
+
+    def render(self, records, fmt=args.format):
+        if fmt == "json":
+            return b"".join(self.json_line(record) for record in records)
+        out = io.StringIO()
+        csv.writer(out, **self.csv_kwargs(fmt)).writerows(self.extract(record) for record in records)
+        return out.getvalue().encode("utf-8")
+
+    def slices(self, start, end, slice_hours):
+        """Splits [start, end] into (start, end, is_last) slices of slice_hours."""
+        start_dt = datetime.datetime.fromisoformat(start)
+        end_dt = datetime.datetime.fromisoformat(end)
+        step = datetime.timedelta(hours=slice_hours)
+        slices = []
+        while start_dt < end_dt:
+            slice_end = min(start_dt + step, end_dt)
+            slices.append((start_dt.isoformat(), slice_end.isoformat(), slice_end == end_dt))
+            start_dt = slice_end
+        return slices
+
+    def fetch_slice(self, index, slice_start, slice_end, is_last, part_path, fmt, progress):
+        """
+        Fetches one time slice with a point in time and search_after, appending
+        to its part file. After every page a checkpoint records where the last
+        timestamp in the part begins (byte offset and epoch millis). A resumed
+        fetch truncates the part to that offset and refetches from that
+        timestamp, so rows sharing a timestamp are neither lost nor repeated.
+        """
+        checkpoint_path = part_path + ".checkpoint"
+        checkpoint = {"done": False, "rows": 0, "offset": 0, "resume_from": None}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+        if checkpoint["done"]:
+            progress(checkpoint["rows"], skipped=True)
+            return checkpoint["rows"]
+
+        time_filter = [{"range": {"@timestamp": {"gte": slice_start, ("lte" if is_last else "lt"): slice_end}}}]
+        if checkpoint["resume_from"] is not None:
+            time_filter.append({"range": {"@timestamp": {"gte": checkpoint["resume_from"], "format": "epoch_millis"}}})
+        rows = checkpoint["rows"]
+        group_ts = checkpoint["resume_from"]
+        group_offset = checkpoint["offset"]
+        group_rows = 0
+
+        def save(done=False):
+            state = {"done": done, "rows": rows - group_rows, "offset": group_offset, "resume_from": group_ts}
+            if done:
+                state = {"done": True, "rows": rows, "offset": group_offset, "resume_from": None}
+            with open(checkpoint_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+        pit_id = self.es.open_point_in_time(index=index, keep_alive=args.keep_alive)["id"]
+        try:
+            with open(part_path, "ab") as part:
+                part.truncate(checkpoint["offset"])
+                part.seek(checkpoint["offset"])
+                search_after = None
+                while True:
+                    body = {
+                        "size": args.page_size,
+                        "query": {"bool": {"filter": time_filter}},
+                        "pit": {"id": pit_id, "keep_alive": args.keep_alive},
+                        "_source": self.source_filter(),
+                        "sort": [{"@timestamp": {"order": "asc", "format": "epoch_millis"}}, {"_shard_doc": "asc"}],
+                        "track_total_hits": False,
+                    }
+                    if search_after:
+                        body["search_after"] = search_after
+                    res = self.es.search(body=body)
+                    pit_id = res.get("pit_id", pit_id)
+                    hits = res["hits"]["hits"]
+                    if not hits:
+                        break
+                    timestamps = [int(hit["sort"][0]) for hit in hits]
+                    last_ts = timestamps[-1]
+                    first_of_last = timestamps.index(last_ts)
+                    records = [hit["_source"] for hit in hits]
+                    if last_ts != group_ts or first_of_last > 0:
+                        # the last timestamp group starts in this page
+                        part.write(self.render(records[:first_of_last], fmt))
+                        group_offset = part.tell()
+                        group_ts = last_ts
+                        group_rows = 0
+                        records = records[first_of_last:]
+                    part.write(self.render(records, fmt))
+                    part.flush()
+                    rows += len(hits)
+                    group_rows += len(records)
+                    save()
+                    progress(len(hits))
+                    search_after = hits[-1]["sort"]
+                part.flush()
+                os.fsync(part.fileno())
+        finally:
+            try:
+                self.es.close_point_in_time(id=pit_id)
+            except Exception as e:
+                logger.warning("closing point in time failed: %s" % e)
+        save(done=True)
+        return rows
+
+    def dump_sliced(self, index=args.index, start=args.start, end=args.end, outfile=None, fmt=args.format, parts_dir=args.parts_dir):
+        os.makedirs(parts_dir, exist_ok=True)
+        slices = self.slices(start, end, args.slice_hours)
+        manifest = {"index": index, "start": start, "end": end, "slice_hours": args.slice_hours, "format": fmt,
+                    "wide": args.wide, "flow": args.flow, "slices": [[s, e] for s, e, _ in slices]}
+        manifest_path = os.path.join(parts_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                if json.load(f) != manifest:
+                    logger.error("%s belongs to a fetch with different arguments, refusing to resume" % manifest_path)
+                    sys.exit(1)
+        else:
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+
+        lock = threading.Lock()
+        totals = {"rows": 0, "next_log": 100000}
+        def progress(rows, skipped=False):
+            with lock:
+                totals["rows"] += rows
+                if totals["rows"] >= totals["next_log"]:
+                    logger.warning("Dumped %s rows across %s slices" % (totals["rows"], len(slices)))
+                    totals["next_log"] += 100000
+
+        # parquet cannot be appended to, so its slices are fetched as tsv parts
+        part_fmt = "tsv" if fmt == "parquet" else fmt
+        part_paths = [os.path.join(parts_dir, "part-%05d.%s" % (i, part_fmt)) for i in range(len(slices))]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = [executor.submit(self.fetch_slice, index, slice_start, slice_end, is_last, part_path, part_fmt, progress)
+                       for (slice_start, slice_end, is_last), part_path in zip(slices, part_paths)]
+            for (slice_start, slice_end, _), future in zip(slices, futures):
+                logger.warning("slice %s - %s: %s rows" % (slice_start, slice_end, future.result()))
+
+        if args.no_concatenate:
+            logger.warning("All %s slices complete in %s" % (len(slices), parts_dir))
+            return
+        # parts are concatenated in time order behind a single header
+        if fmt == "parquet":
+            writer = ParquetRowWriter(outfile, self.fieldnames, args.row_group_minutes * 60)
+            for part_path in part_paths:
+                with open(part_path, newline='') as part:
+                    for row in csv.reader(part, delimiter='\t'):
+                        writer.write(row)
+            writer.close()
+            logger.warning("Wrote %s parts, %s rows in %s row groups" % (len(part_paths), writer.rows, writer.row_groups))
+            return
+        if fmt in ["tsv", "csv"]:
+            outfile.write(self.render_header(fmt))
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                while True:
+                    chunk = part.read(16 * 1024 * 1024)
+                    if not chunk:
+                        break
+                    outfile.write(chunk)
+        outfile.flush()
+        logger.warning("Concatenated %s parts, %s rows" % (len(part_paths), totals["rows"]))
+
     def dump(self, index=args.index, start=args.start, end=args.end, outfile=None, fmt=args.format, initial_count=0):
+        """Dumps to outfile, a binary stream from open_output()."""
+        if fmt == "parquet":
+            writer = ParquetRowWriter(outfile, self.fieldnames, args.row_group_minutes * 60)
+            extract = self.extract
+            i = initial_count
+            for record in self.query(index=index, start=start, end=end):
+                writer.write(extract(record))
+                i += 1
+                if (i % 10000 == 0):
+                    logger.warning("Dumped 10,000 rows. Total: %s rows. last record timestamp: %s" % (i , record['@timestamp']))
+            writer.close()
         if fmt in ["tsv", "csv"]:
-            kwargs = {}
-            if fmt == 'tsv':
-                kwargs = { "delimiter":'\t', "lineterminator":'\n'}
-            writer = csv.DictWriter(outfile, self.get_fieldnames(wide=args.wide, flow=args.flow), **kwargs)
-            writer.writeheader()
+            text = io.TextIOWrapper(outfile, encoding="utf-8", newline="")
+            writer = csv.writer(text, **self.csv_kwargs(fmt))
+            writer.writerow(self.fieldnames)
+            extract = self.extract
             i = initial_count
             for record in self.query(index=index, start=start, end=end):
-                r = self.format_record(record, wide=args.wide, flow=args.flow)
-                writer.writerow(r)
+                writer.writerow(extract(record))
                 i += 1
                 if (i % 10000 == 0):
                     logger.warning("Dumped 10,000 rows. Total: %s rows. last record timestamp: %s" % (i , record['@timestamp']))
+            text.flush()
+            text.detach()
         if fmt == "json":
             for record in self.query(index=index, start=start, end=end):
-                r = self.format_record(record)
-                json.dump(r, outfile)
-                outfile.write("\n")
+                outfile.write(self.json_line(record))
+        outfile.flush()
 
-DataDumper(url=args.stardust_url, username=args.username, password=args.password).dump(index=args.index, start=args.start, end=args.end, outfile=args.outfile, fmt=args.format, initial_count=args.initial_count)
+dumper = DataDumper(url=args.stardust_url, username=args.username, password=args.password)
+if args.parts_dir and args.no_concatenate:
+    dumper.dump_sliced(index=args.index, start=args.start, end=args.end, fmt=args.format, parts_dir=args.parts_dir)
+    sys.exit(0)
+with open_output(args.outfile, append=args.format != 'parquet', compresslevel=args.compression_level) as outfile:
+    if args.parts_dir:
+        dumper.dump_sliced(index=args.index, start=args.start, end=args.end, outfile=outfile, fmt=args.format, parts_dir=args.parts_dir)
+    else:
+        dumper.dump(index=args.index, start=args.start, end=args.end, outfile=outfile, fmt=args.format, initial_count=args.initial_count)
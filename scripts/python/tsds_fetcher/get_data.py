@@ -1,12 +1,59 @@
 import argparse
 import csv
+import heapq
+import json
 import os
 import re
+import shutil
 import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 from time import time
 
 from globalnoc import wsc
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "utils"))
+sys.path.insert(0, os.path.join(HERE, "..", "stardust_fetcher"))
+from formats import NARROW_FORMAT
+from sort_tsv_by_time import make_key_function, merge_runs
+from stardust_io import ParquetRowWriter, is_parquet, open_output
+
+AGGREGATE_SECONDS = 60
+INPUT_KEY = f"aggregate(values.input, {AGGREGATE_SECONDS}, average)"
+OUTPUT_KEY = f"aggregate(values.output, {AGGREGATE_SECONDS}, average)"
+
+# TSDS metadata written to the Stardust narrow layout; other fields are dropped
+STARDUST_META_COLUMNS = {
+    "node": "meta.device",
+    "intf": "meta.name",
+    "description": "meta.descr",
+    "node_role": "meta.device_info.role",
+}
+STARDUST_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+MAX_FANIN = 128
+
+
+def new_client():
+    client = wsc.WSC()
+    client.strict_content_type = False
+    return client
+
+
+_thread_clients = threading.local()
+
+
+def thread_client():
+    """
+    The WSC client of the calling thread. Clients carry their url between
+    calls, so threads cannot share one; each keeps its own for all of its
+    queries, reusing its connection.
+    """
+    if not hasattr(_thread_clients, "client"):
+        _thread_clients.client = new_client()
+    return _thread_clients.client
+
 
 def get_nodes(client, start: int, end: int, base_url: str, node_role: str):
     client.url = f"{base_url}query.cgi"
@@ -44,6 +91,38 @@ def get_interface_data(
         return None
 
 
+def get_batch_data(
+    client,
+    node: str,
+    interfaces: list,
+    meta_fields: list,
+    start: int,
+    end: int,
+    base_url: str,
+):
+    """
+    Fetches all interfaces of a node in one request, or only the given
+    interfaces. Returns one result per interface that has data.
+    """
+    client.url = f"{base_url}query.cgi"
+    where = f'node="{node}"'
+    if interfaces:
+        intf_filter = " or ".join(f'intf="{intf}"' for intf in interfaces)
+        where = f'({intf_filter}) and node="{node}"'
+    print(
+        f"Getting data for {len(interfaces) or 'all'} interfaces of {node} from {start} to {end}"
+    )
+
+    meta_field_str = "".join(f"{field}, " for field in meta_fields)
+
+    query = f"get {meta_field_str}{INPUT_KEY}, {OUTPUT_KEY} between({start}, {end}) by intf, node from interface where({where})"
+    res = client.query(query=query)
+
+    if int(res["total"]) > 0:
+        return res["results"]
+    return []
+
+
 def get_metadata_fields(client, base_url: str):
     client.url = f"{base_url}metadata.cgi"
     res = client.get_meta_fields(measurement_type="interface")
@@ -113,78 +192,358 @@ def sanitize_filename(name):
     return re.sub(r'[\/:*?"<>|]', "_", name)
 
 
-def write_data(data: dict, output_dir: str):
-    for node, interfaces in data.items():
-        for interface, data in interfaces.items():
-            safe_node = sanitize_filename(node)
-            safe_interface = sanitize_filename(interface)
-            filename = f"{output_dir}/{safe_node}_{safe_interface}.tsv"
+def write_interface(data: dict, output_dir: str, node: str, interface: str) -> str:
+    """
+    Writes the TSV of one interface and returns its filename. The file is
+    written under a temporary name and renamed when complete, so an
+    interrupted run never leaves a partial file behind.
+    """
+    safe_node = sanitize_filename(node)
+    safe_interface = sanitize_filename(interface)
+    filename = f"{output_dir}/{safe_node}_{safe_interface}.tsv"
 
-            with open(filename, mode="w", newline="", encoding="utf-8") as tsvfile:
-                writer = csv.writer(tsvfile, delimiter="\t")
+    with open(filename + ".tmp", mode="w", newline="", encoding="utf-8") as tsvfile:
+        writer = csv.writer(tsvfile, delimiter="\t")
 
-                input_key = "aggregate(values.input, 60, average)"
-                output_key = "aggregate(values.output, 60, average)"
-                metadata_keys = [
-                    k for k in data.keys() if k not in [input_key, output_key]
-                ]
+        metadata_keys = [k for k in data.keys() if k not in [INPUT_KEY, OUTPUT_KEY]]
 
-                writer.writerow(metadata_keys + ["timestamp", input_key, output_key])
-
-                input_results = {t[0]: t[1] for t in data.get(input_key, [])}
-                output_results = {t[0]: t[1] for t in data.get(output_key, [])}
-
-                for timestamp in sorted(
-                    set(input_results.keys()).union(output_results.keys())
-                ):
-                    row = [data[key] for key in metadata_keys]
-                    row.extend(
-                        [
-                            timestamp,
-                            input_results.get(timestamp, ""),
-                            output_results.get(timestamp, ""),
-                        ]
-                    )
-                    writer.writerow(row)
+        writer.writerow(metadata_keys + ["timestamp", INPUT_KEY, OUTPUT_KEY])
 
-    print(f"TSV files written to {output_dir}/")
+        input_results = {t[0]: t[1] for t in data.get(INPUT_KEY, [])}
+        output_results = {t[0]: t[1] for t in data.get(OUTPUT_KEY, [])}
+
+        for timestamp in sorted(set(input_results.keys()).union(output_results.keys())):
+            row = [data[key] for key in metadata_keys]
+            row.extend(
+                [
+                    timestamp,
+                    input_results.get(timestamp, ""),
+                    output_results.get(timestamp, ""),
+                ]
+            )
+            writer.writerow(row)
+    os.replace(filename + ".tmp", filename)
+    return filename
+
+
+def manifest_path(output_dir: str, start: int, end: int) -> str:
+    return os.path.join(output_dir, f"manifest_{start}_{end}.jsonl")
+
+
+def load_manifest(path: str) -> set:
+    """(node, intf) pairs a previous run over the same time range finished."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of an interrupted run may be cut short
+                continue
+            done.add((entry["node"], entry["intf"]))
+    return done
+
+
+def fetch_interface(
+    node: str,
+    interface: str,
+    meta_fields: list,
+    start: int,
+    end: int,
+    base_url: str,
+    output_dir: str,
+):
+    """Fetches and writes one interface in a pool thread; returns its filename or None."""
+    interface_data = get_interface_data(
+        thread_client(), node, interface, meta_fields, start, end, base_url
+    )
+    if not interface_data:
+        return None
+    return write_interface(interface_data["results"][0], output_dir, node, interface)
 
 
 def main(
-    start: int, end: int, base_url: str, limit: int, output_dir: str, node_role: str
+    start: int,
+    end: int,
+    base_url: str,
+    limit: int,
+    output_dir: str,
+    node_role: str,
+    concurrency: int,
 ):
-    client = wsc.WSC()
-    client.strict_content_type = False
+    client = new_client()
 
     metafields = get_metadata_fields(client, base_url)
     parsed_meta_fields = parse_meta_fields(metafields)
 
-    data = {}
+    manifest_file = manifest_path(output_dir, start, end)
+    done = load_manifest(manifest_file)
+    if done:
+        print(f"Resuming: {len(done)} interfaces already finished in {manifest_file}")
+
+    def pending_interfaces():
+        for node in get_nodes(client, start, end, base_url, node_role):
+            for interface in get_interfaces(client, node, start, end, base_url):
+                if (node, interface) not in done:
+                    yield node, interface
+
     total = 0
+    skipped = 0
+    pairs = pending_interfaces()
+    in_flight = {}
+    with (
+        open(manifest_file, "a", encoding="utf-8") as manifest,
+        ThreadPoolExecutor(max_workers=concurrency) as executor,
+    ):
+        while True:
+            # at most two queries per thread are queued, so memory stays bounded
+            while len(in_flight) < 2 * concurrency and (
+                limit == 0 or total + len(in_flight) < limit
+            ):
+                pair = next(pairs, None)
+                if pair is None:
+                    break
+                future = executor.submit(
+                    fetch_interface,
+                    *pair,
+                    parsed_meta_fields,
+                    start,
+                    end,
+                    base_url,
+                    output_dir,
+                )
+                in_flight[future] = pair
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                node, interface = in_flight.pop(future)
+                filename = future.result()
+                if filename is None:
+                    print(f"Skipping {node}-{interface} because no data was returned")
+                    skipped += 1
+                else:
+                    total += 1
+                entry = {"node": node, "intf": interface, "file": filename}
+                manifest.write(json.dumps(entry) + "\n")
+                manifest.flush()
+
+    print(
+        f"TSV files for {total} interfaces written to {output_dir}/ ({skipped} without data)"
+    )
 
-    nodes = get_nodes(client, start, end, base_url, node_role)
-    for node in nodes:
-        if limit != 0 and total >= limit:
-            break
 
-        interfaces = get_interfaces(client, node, start, end, base_url)
-        data[node] = {}
+def stardust_rows(result: dict) -> list:
+    """
+    Converts the result of one interface to rows in the Stardust narrow
+    column layout. TSDS averages rates over AGGREGATE_SECONDS, so the bit
+    deltas are those rates times AGGREGATE_SECONDS.
+    """
+    meta = [None] * len(NARROW_FORMAT)
+    for field, column in STARDUST_META_COLUMNS.items():
+        if field in result:
+            meta[NARROW_FORMAT.index(column)] = result[field]
+    timestamp_idx = NARROW_FORMAT.index("@timestamp")
+    in_idx = NARROW_FORMAT.index("values.in_bits.delta")
+    out_idx = NARROW_FORMAT.index("values.out_bits.delta")
+
+    input_results = {t[0]: t[1] for t in result.get(INPUT_KEY) or []}
+    output_results = {t[0]: t[1] for t in result.get(OUTPUT_KEY) or []}
+    rows = []
+    for timestamp in sorted(set(input_results.keys()).union(output_results.keys())):
+        row = list(meta)
+        row[timestamp_idx] = datetime.fromtimestamp(
+            timestamp, tz=timezone.utc
+        ).strftime(STARDUST_TIMESTAMP_FORMAT)
+        for idx, results in [(in_idx, input_results), (out_idx, output_results)]:
+            if results.get(timestamp) is not None:
+                row[idx] = results[timestamp] * AGGREGATE_SECONDS
+        rows.append(row)
+    return rows
+
+
+def sort_key_columns() -> list:
+    return [NARROW_FORMAT.index(c) for c in ["@timestamp", "meta.device", "meta.name"]]
+
+
+def write_run(rows: list, run_path: str):
+    """Writes rows as a headerless TSV run sorted by time, device and interface."""
+    key_idxs = sort_key_columns()
+    rows.sort(key=lambda row: tuple(row[idx] or "" for idx in key_idxs))
+    with open(run_path + ".tmp", mode="w", newline="", encoding="utf-8") as run:
+        csv.writer(run, delimiter="\t", lineterminator="\n").writerows(rows)
+    os.replace(run_path + ".tmp", run_path)
+
+
+def fetch_batch(
+    node: str,
+    interfaces: list,
+    meta_fields: list,
+    start: int,
+    end: int,
+    base_url: str,
+    run_path: str,
+):
+    """Fetches one batch in a pool thread into a sorted run; returns (interfaces, rows)."""
+    results = get_batch_data(
+        thread_client(), node, interfaces, meta_fields, start, end, base_url
+    )
+    rows = []
+    for result in results:
+        rows.extend(stardust_rows(result))
+    write_run(rows, run_path)
+    return len(results), len(rows)
 
-        for interface in interfaces:
-            if limit != 0 and total >= limit:
-                break
 
-            interface_data = get_interface_data(
-                client, node, interface, parsed_meta_fields, start, end, base_url
+def consolidate(
+    run_paths: list, runs_dir: str, output_file: str, row_group_minutes: float
+):
+    """
+    Merges the sorted runs into one time sorted export with a Stardust narrow
+    header: TSV, .gz/.zst compressed TSV or Parquet, by the output name.
+    """
+    key_function = make_key_function(sort_key_columns())
+    merge_pass = 0
+    while len(run_paths) > MAX_FANIN:
+        merge_pass += 1
+        merged_paths = []
+        for group_index in range(0, len(run_paths), MAX_FANIN):
+            merged_path = os.path.join(
+                runs_dir, f"merge_{merge_pass}_{len(merged_paths):05d}.tsv"
             )
+            with open(merged_path, "wb") as merged:
+                merge_runs(
+                    run_paths[group_index : group_index + MAX_FANIN],
+                    merged,
+                    key_function,
+                )
+            merged_paths.append(merged_path)
+        run_paths = merged_paths
+
+    with open_output(output_file, append=False) as outfile:
+        if is_parquet(output_file):
+            writer = ParquetRowWriter(outfile, NARROW_FORMAT, row_group_minutes * 60)
+            run_files = [open(path, "rb") for path in run_paths]
+            try:
+                for line in heapq.merge(*run_files, key=key_function):
+                    writer.write(
+                        next(csv.reader([line.decode("utf-8")], delimiter="\t"))
+                    )
+            finally:
+                for run_file in run_files:
+                    run_file.close()
+            writer.close()
+        else:
+            header = "\t".join(NARROW_FORMAT) + "\n"
+            outfile.write(header.encode("utf-8"))
+            merge_runs(run_paths, outfile, key_function)
+
+
+def main_batched(
+    start: int,
+    end: int,
+    base_url: str,
+    limit: int,
+    output_dir: str,
+    node_role: str,
+    concurrency: int,
+    intf_batch_size: int,
+    output_file: str,
+    row_group_minutes: float,
+):
+    """
+    Fetches many interfaces per request, by node or in batches of
+    intf_batch_size interfaces, into sorted runs, then merges the runs into
+    one export in the Stardust narrow layout. Runs and their manifest are kept
+    in a directory next to the output until the export is complete, so a rerun
+    only fetches the batches that are missing.
+    """
+    client = new_client()
 
-            if interface_data:
-                data[node][interface] = interface_data["results"][0]
-                total = total + 1
-            else:
-                print(f"Skipping {node}-{interface} because no data was returned")
-
-    write_data(data, output_dir)
+    metafields = get_metadata_fields(client, base_url)
+    parsed_meta_fields = parse_meta_fields(metafields)
+    meta_fields = [
+        field
+        for field in STARDUST_META_COLUMNS
+        if field not in ["node", "intf"] and field in parsed_meta_fields
+    ]
+
+    runs_dir = os.path.join(output_dir, f".runs_{start}_{end}")
+    os.makedirs(runs_dir, exist_ok=True)
+    manifest_file = os.path.join(runs_dir, "manifest.jsonl")
+    done = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, encoding="utf-8") as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[entry["run"]] = entry
+        print(f"Resuming: {len(done)} batches already fetched in {runs_dir}")
+
+    def batches():
+        for node in get_nodes(client, start, end, base_url, node_role):
+            if intf_batch_size == 0:
+                yield node, []
+                continue
+            interfaces = get_interfaces(client, node, start, end, base_url)
+            for batch_start in range(0, len(interfaces), intf_batch_size):
+                yield node, interfaces[batch_start : batch_start + intf_batch_size]
+
+    run_paths = []
+    total = sum(entry["interfaces"] for entry in done.values())
+    rows = sum(entry["rows"] for entry in done.values())
+    in_flight = {}
+    pending = batches()
+    with (
+        open(manifest_file, "a", encoding="utf-8") as manifest,
+        ThreadPoolExecutor(max_workers=concurrency) as executor,
+    ):
+        while True:
+            while len(in_flight) < 2 * concurrency and (limit == 0 or total < limit):
+                batch = next(pending, None)
+                if batch is None:
+                    break
+                node, interfaces = batch
+                run_name = f"{sanitize_filename(node)}_{len(run_paths):06d}.tsv"
+                run_path = os.path.join(runs_dir, run_name)
+                run_paths.append(run_path)
+                if run_name in done:
+                    continue
+                future = executor.submit(
+                    fetch_batch,
+                    node,
+                    interfaces,
+                    meta_fields,
+                    start,
+                    end,
+                    base_url,
+                    run_path,
+                )
+                in_flight[future] = run_name
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                run_name = in_flight.pop(future)
+                batch_interfaces, batch_rows = future.result()
+                total += batch_interfaces
+                rows += batch_rows
+                entry = {
+                    "run": run_name,
+                    "interfaces": batch_interfaces,
+                    "rows": batch_rows,
+                }
+                manifest.write(json.dumps(entry) + "\n")
+                manifest.flush()
+
+    print(f"Fetched {total} interfaces, {rows} rows in {len(run_paths)} batches")
+    consolidate(run_paths, runs_dir, output_file, row_group_minutes)
+    shutil.rmtree(runs_dir)
+    print(f"Wrote {rows} rows to {output_file}")
 
 
 if __name__ == "__main__":
@@ -227,7 +586,69 @@ if __name__ == "__main__":
         default="core",
         help="The node role to pull data for.",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Number of interface queries run concurrently.",
+    )
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Fetch many interfaces per query and write one time sorted export "
+        "in the Stardust narrow layout instead of a TSV per interface.",
+    )
+    parser.add_argument(
+        "--intf_batch_size",
+        type=int,
+        default=0,
+        help="With --batched, interfaces per query. 0 queries all interfaces "
+        "of a node at once.",
+    )
+    parser.add_argument(
+        "--output_file",
+        type=str,
+        help="With --batched, the export to write: .tsv, .tsv.gz, .tsv.zst or "
+        ".parquet. Default: tsds_<start>_<end>.tsv in --output_dir.",
+    )
+    parser.add_argument(
+        "--row_group_minutes",
+        type=float,
+        default=60,
+        help="With --batched and a Parquet export, minutes of data per row group.",
+    )
 
     args = parser.parse_args()
 
-    main(args.start, args.end, args.url, args.limit, args.output_dir, args.node_role)
+    if args.concurrency < 1 or args.intf_batch_size < 0:
+        print(
+            "Error: --concurrency must be positive, --intf_batch_size not negative.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    if args.batched:
+        main_batched(
+            args.start,
+            args.end,
+            args.url,
+            args.limit,
+            args.output_dir,
+            args.node_role,
+            args.concurrency,
+            args.intf_batch_size,
+            args.output_file
+            or os.path.join(args.output_dir, f"tsds_{args.start}_{args.end}.tsv"),
+            args.row_group_minutes,
+        )
+        sys.exit(0)
+
+    main(
+        args.start,
+        args.end,
+        args.url,
+        args.limit,
+        args.output_dir,
+        args.node_role,
+        args.concurrency,
+    )
@@ -0,0 +1,537 @@
+"""
+Samples host pressure while a benchmark runs, the same way for every
+datastore: CPU, PSI, memory, disk and network I/O of the host, and CPU, RSS
+and I/O of the database server processes. Everything is read from /proc with
+the standard library, once per --interval.
+
+Samples go to a local file, Parquet (needs pyarrow) or CSV by suffix, with
+UTC timestamps so they line up with the insert scoreboards. Cumulative CPU
+seconds make "CPU per million rows" a difference of two samples; the report
+command prints it for a time window and row count.
+
+The run_*.sh scripts start a recorder for the length of the run. Run it on
+the database host; on a separate client host only the host columns mean
+anything.
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import re
+import signal
+import sys
+import time
+from pathlib import Path
+
+SECTOR_BYTES = 512
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_BYTES = os.sysconf("SC_PAGE_SIZE")
+PRESSURE_TOTAL = re.compile(r"some .*total=(\d+)")
+DEFAULT_MATCH = [
+    "clickhouse-server",
+    "postgres",
+    "mongod",
+    "org.elasticsearch",
+    "org.opensearch",
+    "victoria-metrics",
+]
+FIELDS = [
+    "timestamp",
+    "epoch_ms",
+    "interval_seconds",
+    "cpu_idle_percentage",
+    "cpu_user_percentage",
+    "cpu_system_percentage",
+    "cpu_iowait_percentage",
+    "host_cpu_seconds",
+    "load_avg",
+    "memory_pressure",
+    "io_pressure",
+    "cpu_pressure",
+    "mem_available_bytes",
+    "disk_read_bytes_per_sec",
+    "disk_write_bytes_per_sec",
+    "net_rx_bytes_per_sec",
+    "net_tx_bytes_per_sec",
+    "proc_count",
+    "proc_cpu_percentage",
+    "proc_cpu_seconds",
+    "proc_rss_bytes",
+    "proc_read_bytes_per_sec",
+    "proc_write_bytes_per_sec",
+]
+# host_cpu_seconds and proc_cpu_seconds add up since the recorder started;
+# every other field is a rate over interval_seconds or a gauge
+INTEGER_FIELDS = ["epoch_ms", "mem_available_bytes", "proc_count", "proc_rss_bytes"]
+
+
+def physical_disks():
+    """
+    Whole disks of /sys/block that no other block device is stacked on:
+    device mapper (LVM, dm-crypt) and md RAID devices have the disks under
+    them as slaves, so counting them too would count every byte twice.
+    None without /sys/block.
+    """
+    if not os.path.isdir("/sys/block"):
+        return None
+    disks = set()
+    for name in os.listdir("/sys/block"):
+        slaves = os.path.join("/sys/block", name, "slaves")
+        if os.path.isdir(slaves) and os.listdir(slaves):
+            continue
+        disks.add(name)
+    return disks
+
+
+def read_disk_bytes():
+    """Cumulative bytes read and written by the physical disks, from /proc/diskstats."""
+    disks = physical_disks()
+    read_bytes = write_bytes = 0
+    with open("/proc/diskstats") as infile:
+        for line in infile:
+            fields = line.split()
+            name = fields[2]
+            if name.startswith(("loop", "ram", "zram")) or (
+                disks is not None and name not in disks
+            ):
+                continue
+            read_bytes += int(fields[5]) * SECTOR_BYTES
+            write_bytes += int(fields[9]) * SECTOR_BYTES
+    return read_bytes, write_bytes
+
+
+def read_net_bytes():
+    """Cumulative bytes received and sent on all interfaces but lo, from /proc/net/dev."""
+    rx_bytes = tx_bytes = 0
+    with open("/proc/net/dev") as infile:
+        for line in infile.readlines()[2:]:
+            name, values = line.split(":", 1)
+            if name.strip() == "lo":
+                continue
+            values = values.split()
+            rx_bytes += int(values[0])
+            tx_bytes += int(values[8])
+    return rx_bytes, tx_bytes
+
+
+def read_mem_available():
+    with open("/proc/meminfo") as infile:
+        for line in infile:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def find_pids(match: list) -> list:
+    """PIDs whose command line contains any of the match strings."""
+    pids = []
+    own_pid = os.getpid()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == own_pid:
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as infile:
+                cmdline = infile.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        except OSError:
+            continue
+        if any(text in cmdline for text in match):
+            pids.append(int(entry))
+    return pids
+
+
+def read_process(pid: int):
+    """(cpu ticks, rss bytes, read bytes, write bytes) of a process, None once it exited."""
+    try:
+        with open(f"/proc/{pid}/stat") as infile:
+            # the command name may contain spaces; fields follow its closing parenthesis
+            fields = infile.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    ticks = int(fields[11]) + int(fields[12])
+    rss_bytes = int(fields[21]) * PAGE_BYTES
+    read_bytes = write_bytes = None
+    try:
+        with open(f"/proc/{pid}/io") as infile:
+            io = dict(line.split(": ") for line in infile.read().splitlines())
+        read_bytes, write_bytes = int(io["read_bytes"]), int(io["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        pass  # other users' processes need root
+    return ticks, rss_bytes, read_bytes, write_bytes
+
+
+class HostSampler:
+    """
+    Reads host statistics from /proc. Every sample() returns a dict of
+    FIELDS; percentages and rates cover the time since the previous sample,
+    and pressure is the share of that time some task stalled, from the PSI
+    totals, rather than a kernel average. With match strings the matching
+    processes are tracked too, rescanned every rescan_seconds.
+    """
+
+    def __init__(self, match: list = None, pids: list = None, rescan_seconds=10):
+        self.match = match or []
+        self.fixed_pids = pids or []
+        self.rescan_seconds = rescan_seconds
+        self.pids = list(self.fixed_pids)
+        self.next_rescan = 0.0
+        self.host_cpu_seconds = 0.0
+        self.proc_cpu_seconds = 0.0
+        self.previous = self.read_counters()
+
+    def read_counters(self) -> dict:
+        counters = {"time": time.monotonic()}
+        with open("/proc/stat") as infile:
+            # user nice system idle iowait irq softirq steal; guest time is part of user
+            cpu = [int(v) for v in infile.readline().split()[1:9]]
+        counters["cpu"] = cpu
+        for resource in ("memory", "io", "cpu"):
+            try:
+                with open(f"/proc/pressure/{resource}") as infile:
+                    match = PRESSURE_TOTAL.match(infile.readline())
+                counters[f"{resource}_stall_us"] = int(match.group(1))
+            except (OSError, AttributeError):
+                counters[f"{resource}_stall_us"] = None
+        counters["disk_read_bytes"], counters["disk_write_bytes"] = read_disk_bytes()
+        counters["net_rx_bytes"], counters["net_tx_bytes"] = read_net_bytes()
+
+        if self.match and counters["time"] >= self.next_rescan:
+            self.pids = sorted(set(self.fixed_pids + find_pids(self.match)))
+            self.next_rescan = counters["time"] + self.rescan_seconds
+        processes = {}
+        for pid in self.pids:
+            process = read_process(pid)
+            if process is not None:
+                processes[pid] = process
+        counters["processes"] = processes
+        return counters
+
+    def sample(self) -> dict:
+        current = self.read_counters()
+        previous, self.previous = self.previous, current
+        seconds = current["time"] - previous["time"]
+
+        def rate(name):
+            if current[name] is None or previous[name] is None or seconds <= 0:
+                return None
+            return (current[name] - previous[name]) / seconds
+
+        cpu = [now - before for now, before in zip(current["cpu"], previous["cpu"])]
+        cpu_total = sum(cpu)
+
+        def cpu_percentage(*indexes):
+            if cpu_total <= 0:
+                return None
+            return 100.0 * sum(cpu[i] for i in indexes) / cpu_total
+
+        self.host_cpu_seconds += (cpu_total - cpu[3] - cpu[4]) / CLOCK_TICKS
+
+        with open("/proc/loadavg") as infile:
+            load_avg = float(infile.read().split()[0])
+
+        # processes seen in both samples; new ones count from their next sample
+        processes = current["processes"]
+        common = [pid for pid in processes if pid in previous["processes"]]
+        proc_ticks = sum(
+            processes[pid][0] - previous["processes"][pid][0] for pid in common
+        )
+        self.proc_cpu_seconds += proc_ticks / CLOCK_TICKS
+
+        def proc_rate(index):
+            values = [
+                (processes[pid][index], previous["processes"][pid][index])
+                for pid in common
+                if processes[pid][index] is not None
+                and previous["processes"][pid][index] is not None
+            ]
+            if not values or seconds <= 0:
+                return None
+            return sum(now - before for now, before in values) / seconds
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        sample = {
+            "time": now,
+            "timestamp": now.strftime("%Y-%m-%dT%H:%M:%S.")
+            + f"{now.microsecond // 1000:03d}Z",
+            "epoch_ms": int(now.timestamp() * 1000),
+            "interval_seconds": seconds,
+            "cpu_idle_percentage": cpu_percentage(3),
+            "cpu_user_percentage": cpu_percentage(0, 1),
+            "cpu_system_percentage": cpu_percentage(2, 5, 6),
+            "cpu_iowait_percentage": cpu_percentage(4),
+            "host_cpu_seconds": self.host_cpu_seconds,
+            "load_avg": load_avg,
+            "mem_available_bytes": read_mem_available(),
+            "disk_read_bytes_per_sec": rate("disk_read_bytes"),
+            "disk_write_bytes_per_sec": rate("disk_write_bytes"),
+            "net_rx_bytes_per_sec": rate("net_rx_bytes"),
+            "net_tx_bytes_per_sec": rate("net_tx_bytes"),
+            "proc_count": len(processes),
+            "proc_cpu_percentage": (
+                100.0 * proc_ticks / CLOCK_TICKS / seconds if seconds > 0 else None
+            ),
+            "proc_cpu_seconds": self.proc_cpu_seconds,
+            "proc_rss_bytes": sum(process[1] for process in processes.values()),
+            "proc_read_bytes_per_sec": proc_rate(2),
+            "proc_write_bytes_per_sec": proc_rate(3),
+        }
+        for resource in ("memory", "io", "cpu"):
+            stall_us = rate(f"{resource}_stall_us")
+            # microseconds stalled per second, as a percentage
+            sample[f"{resource}_pressure"] = (
+                None if stall_us is None else stall_us / 1e4
+            )
+        return sample
+
+
+class SampleWriter:
+    """Appends samples to a Parquet file, one row group per flush, or a CSV file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rows = []
+        if str(path).endswith(".parquet"):
+            from stardust_io import require_pyarrow
+
+            pa, pq = require_pyarrow()
+            self.pa = pa
+            self.schema = pa.schema(
+                [
+                    pa.field(
+                        name,
+                        (
+                            pa.string()
+                            if name == "timestamp"
+                            else pa.int64() if name in INTEGER_FIELDS else pa.float64()
+                        ),
+                    )
+                    for name in FIELDS
+                ]
+            )
+            self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+            self.csv_file = None
+        else:
+            self.writer = None
+            self.csv_file = open(path, "w", newline="")
+            self.csv_writer = csv.DictWriter(
+                self.csv_file, fieldnames=FIELDS, extrasaction="ignore"
+            )
+            self.csv_writer.writeheader()
+
+    def write(self, sample: dict):
+        self.rows.append(sample)
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.writer is not None:
+            table = self.pa.Table.from_pylist(
+                [{name: row[name] for name in FIELDS} for row in self.rows],
+                schema=self.schema,
+            )
+            self.writer.write_table(table)
+        else:
+            self.csv_writer.writerows(self.rows)
+            self.csv_file.flush()
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.csv_file.close()
+
+
+def record(
+    output: Path,
+    interval: float,
+    flush_interval: float,
+    match: list,
+    pids: list,
+    duration: float,
+):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    sampler = HostSampler(match, pids)
+    writer = SampleWriter(output)
+    print(
+        f"Sampling every {interval}s into {output} "
+        f"({len(sampler.pids)} processes matching {match or pids})",
+        file=sys.stderr,
+    )
+    start = time.monotonic()
+    next_sample = start + interval
+    next_flush = start + flush_interval
+    samples = 0
+    try:
+        while not stopping and (not duration or time.monotonic() - start < duration):
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+            if stopping:
+                break
+            now = time.monotonic()
+            writer.write(sampler.sample())
+            samples += 1
+            # skip missed ticks instead of sampling in a burst
+            next_sample += interval * (int((now - next_sample) // interval) + 1)
+            if now >= next_flush:
+                writer.flush()
+                next_flush = now + flush_interval
+    finally:
+        writer.close()
+    print(f"Wrote {samples} samples to {output}", file=sys.stderr)
+
+
+def read_samples(path: Path) -> list:
+    if str(path).endswith(".parquet"):
+        from stardust_io import require_pyarrow
+
+        pa, pq = require_pyarrow()
+        return pq.read_table(path).to_pylist()
+    with open(path, newline="") as infile:
+        return [
+            {
+                name: (value if name == "timestamp" or value == "" else float(value))
+                for name, value in row.items()
+            }
+            for row in csv.DictReader(infile)
+        ]
+
+
+def parse_time(text: str) -> int:
+    """ISO 8601 time, UTC unless it says otherwise, as epoch milliseconds."""
+    dt = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def mean(values: list):
+    values = [value for value in values if value not in (None, "")]
+    return sum(values) / len(values) if values else None
+
+
+def report(path: Path, start: str, end: str, rows: int):
+    samples = read_samples(path)
+    if start:
+        samples = [s for s in samples if s["epoch_ms"] >= parse_time(start)]
+    if end:
+        samples = [s for s in samples if s["epoch_ms"] <= parse_time(end)]
+    if len(samples) < 2:
+        print("Error: Fewer than two samples in the window.", file=sys.stderr)
+        sys.exit(1)
+    first, last = samples[0], samples[-1]
+    seconds = (last["epoch_ms"] - first["epoch_ms"]) / 1000
+    host_cpu = last["host_cpu_seconds"] - first["host_cpu_seconds"]
+    proc_cpu = last["proc_cpu_seconds"] - first["proc_cpu_seconds"]
+    print(f"Window: {first['timestamp']} - {last['timestamp']} ({seconds:.0f}s)")
+    print(f"Samples: {len(samples)}")
+    print(f"Host CPU busy: {host_cpu:.1f} core-seconds")
+    print(f"Database process CPU: {proc_cpu:.1f} core-seconds")
+    for name, unit, scale in [
+        ("cpu_idle_percentage", "%", 1),
+        ("cpu_iowait_percentage", "%", 1),
+        ("load_avg", "", 1),
+        ("memory_pressure", "%", 1),
+        ("io_pressure", "%", 1),
+        ("cpu_pressure", "%", 1),
+        ("disk_read_bytes_per_sec", " MB/s", 1e6),
+        ("disk_write_bytes_per_sec", " MB/s", 1e6),
+        ("net_rx_bytes_per_sec", " MB/s", 1e6),
+        ("net_tx_bytes_per_sec", " MB/s", 1e6),
+        ("proc_cpu_percentage", "% of a core", 1),
+    ]:
+        values = [s[name] for s in samples[1:]]
+        average = mean(values)
+        if average is None:
+            continue
+        peak = max(v for v in values if v not in (None, ""))
+        print(f"{name}: mean {average / scale:.2f}{unit}, max {peak / scale:.2f}{unit}")
+    peak_rss = max(s["proc_rss_bytes"] or 0 for s in samples)
+    print(f"Database process peak RSS: {peak_rss / 2**30:.2f} GiB")
+    if rows:
+        print(f"Rows: {rows}")
+        print(f"Host CPU per million rows: {host_cpu / rows * 1e6:.2f} core-seconds")
+        print(
+            f"Database process CPU per million rows: {proc_cpu / rows * 1e6:.2f} core-seconds"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Records host and database process pressure from /proc into a "
+        "local Parquet or CSV file, and reports on a time window of it.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser(
+        "record", help="Sample until stopped with SIGTERM or SIGINT."
+    )
+    record_parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Sample file to write: .parquet (needs pyarrow) or .csv.",
+    )
+    record_parser.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between samples."
+    )
+    record_parser.add_argument(
+        "--flush_interval",
+        type=float,
+        default=10.0,
+        help="Seconds between writes to the sample file.",
+    )
+    record_parser.add_argument(
+        "--match",
+        default=",".join(DEFAULT_MATCH),
+        help="Comma separated strings; processes whose command line contains one "
+        "are sampled as the database server.",
+    )
+    record_parser.add_argument(
+        "--pids",
+        default="",
+        help="Comma separated PIDs to sample as the database server, besides --match.",
+    )
+    record_parser.add_argument(
+        "--duration",
+        type=float,
+        default=0,
+        help="Stop after this many seconds; 0 runs until stopped.",
+    )
+
+    report_parser = subparsers.add_parser(
+        "report", help="Summarize the samples of a time window."
+    )
+    report_parser.add_argument(
+        "--input", type=Path, required=True, help="Sample file to read."
+    )
+    report_parser.add_argument(
+        "--start", default=None, help="Window start, ISO 8601 (UTC unless given)."
+    )
+    report_parser.add_argument(
+        "--end", default=None, help="Window end, ISO 8601 (UTC unless given)."
+    )
+    report_parser.add_argument(
+        "--rows",
+        type=int,
+        default=0,
+        help="Rows inserted in the window, for CPU seconds per million rows.",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(
+            args.output,
+            args.interval,
+            args.flush_interval,
+            [text for text in args.match.split(",") if text],
+            [int(pid) for pid in args.pids.split(",") if pid],
+            args.duration,
+        )
+    else:
+        report(args.input, args.start, args.end, args.rows)
@@ -0,0 +1,36 @@
+# Starts and stops host_sampler.py around the insert phase of a run_*.sh.
+# Source it, then:
+#
+#   start_host_sampler <match>   # command line text of the database server
+#   ... start the insert workers, wait $(jobs -p) ...
+#   stop_host_sampler
+#
+# Samples go to host_samples_<engine>_<UTC start time>.parquet in the current
+# directory, or HOST_SAMPLES_DIR. The sampler reads the local /proc, so run
+# the script on the database host; set HOST_SAMPLER=0 to skip sampling.
+
+HOST_SAMPLER_PY="$(dirname "${BASH_SOURCE[0]}")/host_sampler.py"
+
+start_host_sampler() {
+    if [ "$HOST_SAMPLER" = "0" ]; then
+        return
+    fi
+    HOST_SAMPLES="${HOST_SAMPLES_DIR:-.}/host_samples_$(basename "$PWD")_$(date -u +%Y%m%dT%H%M%SZ).parquet"
+    python "$HOST_SAMPLER_PY" record --output "$HOST_SAMPLES" --match "$1" &
+    HOST_SAMPLER_PID=$!
+    # keep it out of the workers' wait $(jobs -p)
+    disown $HOST_SAMPLER_PID
+}
+
+stop_host_sampler() {
+    if [ -z "$HOST_SAMPLER_PID" ]; then
+        return
+    fi
+    kill $HOST_SAMPLER_PID
+    while kill -0 $HOST_SAMPLER_PID 2>/dev/null; do
+        sleep 0.1
+    done
+    echo "Host samples: $HOST_SAMPLES"
+    echo "Summarize with: python $HOST_SAMPLER_PY report --input $HOST_SAMPLES --rows <rows inserted>"
+    HOST_SAMPLER_PID=
+}
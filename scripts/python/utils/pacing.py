@@ -0,0 +1,265 @@
+"""
+Paces inserts to a target rate, so that a datastore can be loaded at a known
+rate instead of as fast as the inserter goes. Every insert script takes it
+as --rows-per-sec (--rows_per_sec in the ClickHouse and MongoDB scripts);
+query_benchmark/mixed_load.py starts them at a series of rates while it
+queries.
+
+Two loops are available:
+
+  closed  (default) spaces the batches of one inserter; a batch that is late
+          because the previous insert was slow goes out right away, and the
+          schedule restarts from there. This finds the peak rate but hides
+          queueing: a stalled database simply gets fewer batches.
+  open    (--arrivals constant or poisson) sends batches on a fixed schedule
+          that never waits for the database, with constant or exponentially
+          distributed gaps. A batch that cannot go on time is counted late.
+
+Batch latency is measured from the scheduled send time. In the closed loop
+that is when the batch went out, so it is the service time alone; the open
+loop keeps its schedule, so time spent queued behind a slow insert counts
+against the database instead of being left out (coordinated omission). The
+insert scripts write the latencies with --latency-output, a row as each
+batch completes so that a stopped inserter leaves its file complete; the
+report command below merges the files of several workers and checks a p99
+target, the way to find the highest sustainable rate rather than the peak.
+"""
+
+import argparse
+import csv
+import datetime
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+ARRIVALS = ["constant", "poisson"]
+LATENCY_FIELDS = ["scheduled_at", "rows", "latency_ms", "ok"]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(batches: list, rows_per_sec: float = None) -> dict:
+    """Latency percentiles of (scheduled epoch seconds, rows, latency seconds, ok)."""
+    succeeded = [b for b in batches if b[3]]
+    latencies_ms = [b[2] * 1000 for b in succeeded]
+    seconds = (
+        max(b[0] + b[2] for b in batches) - min(b[0] for b in batches)
+        if batches
+        else 0.0
+    )
+    rows = sum(b[1] for b in succeeded)
+    return {
+        "batches": len(batches),
+        "failed": len(batches) - len(succeeded),
+        "rows": rows,
+        "target_rows_per_sec": rows_per_sec or "",
+        "achieved_rows_per_sec": round(rows / seconds if seconds > 0 else 0.0, 1),
+        "latency_p50_ms": round(percentile(latencies_ms, 50), 2),
+        "latency_p90_ms": round(percentile(latencies_ms, 90), 2),
+        "latency_p99_ms": round(percentile(latencies_ms, 99), 2),
+        "latency_p999_ms": round(percentile(latencies_ms, 99.9), 2),
+        "latency_max_ms": round(max(latencies_ms, default=0.0), 2),
+    }
+
+
+def summary_text(summary: dict) -> str:
+    return (
+        "%s batches (%s failed), %s rows at %s rows/sec (target %s); latency from "
+        "scheduled send p50 %s ms, p90 %s ms, p99 %s ms, p99.9 %s ms, max %s ms"
+        % (
+            summary["batches"],
+            summary["failed"],
+            summary["rows"],
+            summary["achieved_rows_per_sec"],
+            summary["target_rows_per_sec"] or "none",
+            summary["latency_p50_ms"],
+            summary["latency_p90_ms"],
+            summary["latency_p99_ms"],
+            summary["latency_p999_ms"],
+            summary["latency_max_ms"],
+        )
+    )
+
+
+class RateLimiter:
+    """
+    Lets rows_per_sec rows through per second, in batches, closed loop.
+    Shared by the upload threads of one inserter, which then add up to the
+    rate. wait() returns the batch's scheduled send time for record(), which
+    also appends the batch to the output latency file.
+    """
+
+    def __init__(self, rows_per_sec: float, output: Path = None):
+        if rows_per_sec <= 0:
+            raise ValueError("rows_per_sec must be > 0")
+        self.rows_per_sec = rows_per_sec
+        self.next_send = None
+        self.lock = threading.Lock()
+        # monotonic to wall clock, for the scheduled_at of the latency file
+        self.epoch_offset = time.time() - time.monotonic()
+        self.batches = []
+        self.output = None
+        if output:
+            self.output = open(output, "w", newline="")
+            self.writer = csv.writer(self.output)
+            self.writer.writerow(LATENCY_FIELDS)
+            self.output.flush()
+
+    def schedule(self, rows: int, now: float) -> float:
+        send_at = now if self.next_send is None else max(self.next_send, now)
+        self.next_send = send_at + rows / self.rows_per_sec
+        return send_at
+
+    def wait(self, rows: int) -> float:
+        """Blocks until a batch of rows is due; returns its scheduled send time."""
+        with self.lock:
+            send_at = self.schedule(rows, time.monotonic())
+        delay = send_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return send_at
+
+    def record(self, scheduled: float, rows: int, ok: bool = True):
+        """Records a batch sent at its scheduled time once the datastore answered."""
+        batch = (scheduled + self.epoch_offset, rows, time.monotonic() - scheduled, ok)
+        with self.lock:
+            self.batches.append(batch)
+            if self.output:
+                self.writer.writerow(latency_row(batch))
+                self.output.flush()
+
+    def summary(self) -> dict:
+        with self.lock:
+            return summarize(list(self.batches), self.rows_per_sec)
+
+    def report(self) -> str:
+        """One line summary of the batches so far."""
+        return summary_text(self.summary())
+
+
+class OpenLoopSchedule(RateLimiter):
+    """
+    Sends batches at rows_per_sec on a schedule fixed in advance: the gap
+    after a batch of rows is rows / rows_per_sec, or exponentially
+    distributed with that mean for Poisson arrivals. Late batches go out
+    right away but keep their scheduled time, so the latency of everything
+    queued behind a slow insert shows up in the percentiles.
+    """
+
+    def __init__(
+        self, rows_per_sec: float, arrivals: str = "constant", output=None, seed=None
+    ):
+        super().__init__(rows_per_sec, output)
+        if arrivals not in ARRIVALS:
+            raise ValueError(f"arrivals must be one of {ARRIVALS}")
+        self.arrivals = arrivals
+        self.random = random.Random(seed)
+
+    def schedule(self, rows: int, now: float) -> float:
+        send_at = now if self.next_send is None else self.next_send
+        if rows <= 0:
+            # an empty batch takes no time of the schedule
+            return send_at
+        mean_gap = rows / self.rows_per_sec
+        if self.arrivals == "poisson":
+            self.next_send = send_at + self.random.expovariate(1 / mean_gap)
+        else:
+            self.next_send = send_at + mean_gap
+        return send_at
+
+
+def make_rate_limiter(rows_per_sec, arrivals=None, latency_output=None):
+    """
+    A closed loop RateLimiter, an OpenLoopSchedule with arrivals 'constant'
+    or 'poisson', or None when rows_per_sec is unset or 0 (no limit).
+    """
+    if not rows_per_sec:
+        return None
+    if arrivals:
+        return OpenLoopSchedule(rows_per_sec, arrivals, latency_output)
+    return RateLimiter(rows_per_sec, latency_output)
+
+
+def latency_row(batch: tuple) -> list:
+    scheduled, rows, latency, ok = batch
+    return [
+        datetime.datetime.fromtimestamp(scheduled, datetime.timezone.utc).isoformat(
+            timespec="milliseconds"
+        ),
+        rows,
+        round(latency * 1000, 3),
+        int(ok),
+    ]
+
+
+def read_latencies(path: Path) -> list:
+    with open(path, newline="") as f:
+        return [
+            (
+                datetime.datetime.fromisoformat(row["scheduled_at"]).timestamp(),
+                int(row["rows"]),
+                float(row["latency_ms"]) / 1000,
+                row["ok"] == "1",
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def report(paths: list, rows_per_sec: float, target_p99_ms: float) -> bool:
+    """Prints the merged latencies of paths; False if the p99 misses the target."""
+    batches = []
+    for path in paths:
+        batches += read_latencies(path)
+    if not batches:
+        print("Error: No batches in the latency files.", file=sys.stderr)
+        sys.exit(1)
+    summary = summarize(batches, rows_per_sec)
+    print(summary_text(summary))
+    if not target_p99_ms:
+        return True
+    met = summary["latency_p99_ms"] <= target_p99_ms
+    print(
+        f"p99 {summary['latency_p99_ms']} ms {'meets' if met else 'misses'} "
+        f"the {target_p99_ms} ms target"
+    )
+    return met
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merges the --latency-output files of paced insert workers "
+        "and reports latency from the scheduled send time.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser(
+        "report", help="Summarize the batches of one or more latency files."
+    )
+    report_parser.add_argument(
+        "--input", type=Path, nargs="+", required=True, help="Latency files to read."
+    )
+    report_parser.add_argument(
+        "--rows_per_sec",
+        type=float,
+        default=None,
+        help="Target rate of all the workers together, for the summary.",
+    )
+    report_parser.add_argument(
+        "--target_p99_ms",
+        type=float,
+        default=None,
+        help="Exit with status 1 if the p99 latency is above this.",
+    )
+
+    args = parser.parse_args()
+
+    if not report(args.input, args.rows_per_sec, args.target_p99_ms):
+        sys.exit(1)
@@ -1,10 +1,82 @@
 # reverse_tsv_order_tac.py
 import argparse
+import mmap
 import shutil  # For checking if tac exists
 import subprocess
 import sys
 from pathlib import Path
 
+DEFAULT_BLOCK_SIZE_MB = 64
+DEFAULT_WRITE_BUFFER_MB = 16
+
+
+def reverse_tsv_with_mmap(
+    input_filepath: Path,
+    output_filepath: Path,
+    block_size: int = DEFAULT_BLOCK_SIZE_MB * 1024 * 1024,
+    write_buffer_size: int = DEFAULT_WRITE_BUFFER_MB * 1024 * 1024,
+):
+    """
+    Reverses a TSV file in pure Python, keeping the header first.
+
+    The file is memory-mapped and scanned backwards from EOF in blocks of
+    about block_size bytes, each cut at a line boundary. The lines of a block
+    are written in reverse order through a large buffered writer, so memory
+    use stays constant (a block, or one line if it is longer) regardless of
+    the file size. A final line without a trailing newline gets one.
+    """
+    print(f"Reversing TSV file using mmap: {input_filepath} -> {output_filepath}")
+
+    if not input_filepath.is_file():
+        print(f"Error: Input file not found: {input_filepath}", file=sys.stderr)
+        return False
+
+    try:
+        file_size = input_filepath.stat().st_size
+        with open(output_filepath, "wb", buffering=write_buffer_size) as outfile:
+            if file_size == 0:
+                print("Input file was empty. Output file is empty.")
+                return True
+            with open(input_filepath, "rb") as infile, mmap.mmap(
+                infile.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm:
+                header_end = mm.find(b"\n") + 1
+                if header_end == 0:  # header only, without newline
+                    outfile.write(mm[:] + b"\n")
+                    return True
+                outfile.write(mm[:header_end])
+
+                end = file_size
+                if mm[end - 1 : end] != b"\n":
+                    last_newline = mm.rfind(b"\n", header_end, end)
+                    if last_newline < 0:  # the only data line
+                        last_newline = header_end - 1
+                    outfile.write(mm[last_newline + 1 : end] + b"\n")
+                    end = last_newline + 1
+
+                print(
+                    "Processing data lines (this might take a while for large files)..."
+                )
+                while end > header_end:
+                    low = end - block_size
+                    cut = -1
+                    if low > header_end:
+                        cut = mm.rfind(b"\n", header_end, low)
+                    start = cut + 1 if cut >= 0 else header_end
+                    # block holds whole lines, each ending in a newline
+                    lines = mm[start : end - 1].split(b"\n")
+                    lines.reverse()
+                    outfile.write(b"\n".join(lines))
+                    outfile.write(b"\n")
+                    end = start
+
+        print(f"File reversal complete. Output written to {output_filepath}")
+        return True
+
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        return False
+
 
 def reverse_tsv_with_tac(input_filepath: Path, output_filepath: Path):
     """
@@ -25,7 +97,7 @@ def reverse_tsv_with_tac(input_filepath: Path, output_filepath: Path):
                 file=sys.stderr,
             )
             print(
-                "This script relies on standard Unix utilities. For other systems, consider the pure Python version.",
+                "This method relies on standard Unix utilities. For other systems, use --method mmap.",
                 file=sys.stderr,
             )
             return False
@@ -121,7 +193,8 @@ def reverse_tsv_with_tac(input_filepath: Path, output_filepath: Path):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Reverse the order of lines in a TSV file using 'tac', keeping the header first.",
+        description="Reverse the order of lines in a TSV file, keeping the header first. "
+        "Uses a constant-memory, mmap based pure Python reverse by default, or 'tac'.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument(
@@ -136,6 +209,24 @@ if __name__ == "__main__":
         required=True,
         help="Path to write the new TSV file (timestamps in ascending order).",
     )
+    parser.add_argument(
+        "--method",
+        choices=["mmap", "tac"],
+        default="mmap",
+        help="Reverse in Python over an mmap of the input, or shell out to head/tail/tac.",
+    )
+    parser.add_argument(
+        "--block_size_mb",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE_MB,
+        help="mmap method: size of the blocks scanned backwards from EOF.",
+    )
+    parser.add_argument(
+        "--write_buffer_mb",
+        type=int,
+        default=DEFAULT_WRITE_BUFFER_MB,
+        help="mmap method: output write buffer size.",
+    )
 
     args = parser.parse_args()
 
@@ -143,8 +234,21 @@ if __name__ == "__main__":
         print("Error: Input and output file paths must be different.", file=sys.stderr)
         sys.exit(1)
 
-    # For this script, we directly call the tac version
-    # You could add a flag to choose between python/tac versions if desired.
-    success = reverse_tsv_with_tac(args.input_file, args.output_file)
+    if args.block_size_mb < 1 or args.write_buffer_mb < 1:
+        print(
+            "Error: --block_size_mb and --write_buffer_mb must be positive.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    if args.method == "tac":
+        success = reverse_tsv_with_tac(args.input_file, args.output_file)
+    else:
+        success = reverse_tsv_with_mmap(
+            args.input_file,
+            args.output_file,
+            block_size=args.block_size_mb * 1024 * 1024,
+            write_buffer_size=args.write_buffer_mb * 1024 * 1024,
+        )
     if not success:
         sys.exit(1)
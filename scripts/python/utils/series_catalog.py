@@ -0,0 +1,390 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+CATALOG_HEADER = ["key", "hash", "rows", "device", "name"]
+PLAN_HEADER = ["device", "name", "rows", "worker"]
+ASSIGNMENTS = ["modulo", "balanced"]
+SAMPLE_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def series_hash(device: str, name: str) -> int:
+    """
+    md5 of "device::name", the same hash the timescaledb, elasticsearch and
+    opensearch inserters partition on, so modulo assignment keeps their
+    existing placement.
+    """
+    return int(hashlib.md5(f"{device}::{name}".encode("utf-8")).hexdigest(), 16)
+
+
+class SeriesCatalog:
+    """
+    Series of a dataset with a dense integer key, hash and row count each.
+
+    Assignments are computed from the catalog alone, so every splitter and
+    inserter that loads the same catalog places a series on the same worker:
+
+    - modulo: hash % N
+    - balanced: greedy bin packing, largest series first onto the least
+      loaded worker, so row totals per worker come out (nearly) equal
+
+    Series missing from the catalog fall back to hash % N.
+    """
+
+    def __init__(self, entries):
+        # entries: list of (key, hash, rows, device, name)
+        self.entries = entries
+        self.index = {
+            (device, name): i for i, (_, _, _, device, name) in enumerate(entries)
+        }
+        self._assignments = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def assignment(self, num_workers: int, strategy: str = "modulo") -> list:
+        """Returns the worker index of every entry, in catalog order."""
+        cache_key = (num_workers, strategy)
+        if cache_key in self._assignments:
+            return self._assignments[cache_key]
+        if strategy == "modulo":
+            workers = [entry[1] % num_workers for entry in self.entries]
+        elif strategy == "balanced":
+            workers = [0] * len(self.entries)
+            loads = [(0, worker) for worker in range(num_workers)]
+            order = sorted(
+                range(len(self.entries)),
+                key=lambda i: (-self.entries[i][2], self.entries[i][0]),
+            )
+            for i in order:
+                load, worker = heapq.heappop(loads)
+                workers[i] = worker
+                heapq.heappush(loads, (load + self.entries[i][2], worker))
+        else:
+            raise ValueError(f"unknown assignment strategy '{strategy}'")
+        self._assignments[cache_key] = workers
+        return workers
+
+    def worker_for(
+        self, device: str, name: str, num_workers: int, strategy: str = "modulo"
+    ) -> int:
+        i = self.index.get((device, name))
+        if i is None:
+            return series_hash(device, name) % num_workers
+        return self.assignment(num_workers, strategy)[i]
+
+    def worker_loads(self, num_workers: int, strategy: str = "modulo") -> list:
+        loads = [0] * num_workers
+        for entry, worker in zip(self.entries, self.assignment(num_workers, strategy)):
+            loads[worker] += entry[2]
+        return loads
+
+
+class PartitionPlan:
+    """
+    A frozen series -> worker assignment for a fixed number of workers,
+    written by "series_catalog.py plan". Series missing from the plan fall
+    back to hash % N.
+    """
+
+    def __init__(self, num_workers: int, workers: dict, strategy: str = None):
+        self.num_workers = num_workers
+        self.workers = workers
+        self.strategy = strategy
+
+    def __len__(self):
+        return len(self.workers)
+
+    def worker_for(self, device: str, name: str) -> int:
+        worker = self.workers.get((device, name))
+        if worker is None:
+            return series_hash(device, name) % self.num_workers
+        return worker
+
+
+def load_catalog(catalog_path: Path) -> SeriesCatalog:
+    entries = []
+    with open(catalog_path, "r", newline="", encoding="utf-8") as catalog_file:
+        reader = csv.reader(catalog_file, delimiter="\t")
+        header = next(reader)
+        if header != CATALOG_HEADER:
+            raise ValueError(
+                f"{catalog_path} is not a series catalog (header: {header})"
+            )
+        for key, hash_hex, rows, device, name in reader:
+            entries.append((int(key), int(hash_hex, 16), int(rows), device, name))
+    return SeriesCatalog(entries)
+
+
+def write_catalog(catalog_path: Path, counts: dict):
+    """Writes {(device, name): rows} as a catalog, keys in (device, name) order."""
+    catalog_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(catalog_path, "w", newline="", encoding="utf-8") as catalog_file:
+        writer = csv.writer(catalog_file, delimiter="\t", lineterminator="\n")
+        writer.writerow(CATALOG_HEADER)
+        for key, (device, name) in enumerate(sorted(counts)):
+            writer.writerow(
+                [
+                    key,
+                    f"{series_hash(device, name):032x}",
+                    counts[(device, name)],
+                    device,
+                    name,
+                ]
+            )
+
+
+def write_plan(
+    plan_path: Path, catalog: SeriesCatalog, num_workers: int, strategy: str
+):
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(plan_path, "w", newline="", encoding="utf-8") as plan_file:
+        plan_file.write(f"# workers={num_workers} strategy={strategy}\n")
+        writer = csv.writer(plan_file, delimiter="\t", lineterminator="\n")
+        writer.writerow(PLAN_HEADER)
+        for entry, worker in zip(
+            catalog.entries, catalog.assignment(num_workers, strategy)
+        ):
+            writer.writerow([entry[3], entry[4], entry[2], worker])
+
+
+def load_plan(plan_path: Path) -> PartitionPlan:
+    with open(plan_path, "r", newline="", encoding="utf-8") as plan_file:
+        settings = dict(
+            item.split("=", 1) for item in plan_file.readline().lstrip("# ").split()
+        )
+        reader = csv.reader(plan_file, delimiter="\t")
+        header = next(reader)
+        if "workers" not in settings or header != PLAN_HEADER:
+            raise ValueError(f"{plan_path} is not a partition plan")
+        workers = {(device, name): int(worker) for device, name, _, worker in reader}
+    return PartitionPlan(int(settings["workers"]), workers, settings.get("strategy"))
+
+
+def count_chunk(
+    input_file: Path,
+    start: int,
+    end: int,
+    node_col_idx: int,
+    intf_col_idx: int,
+    sample_stride: int = 1,
+):
+    """
+    Counts rows per (node, intf) in the byte range [start, end) of the input.
+    With a sample stride above 1 only every stride-th block of
+    SAMPLE_BLOCK_BYTES is read, and its counts stand in for the skipped ones.
+    """
+    from split_tsv_by_worker import series_fields
+
+    counts = Counter()
+    malformed_lines = 0
+    block_bytes = SAMPLE_BLOCK_BYTES if sample_stride > 1 else end - start
+    with open(input_file, "rb") as infile:
+        for block_start in range(start, end, block_bytes * sample_stride):
+            block_end = min(block_start + block_bytes, end)
+            infile.seek(block_start)
+            position = block_start
+            if block_start != start:
+                # finish the line the previous block started
+                position += len(infile.readline())
+            while position < block_end:
+                line = infile.readline()
+                if not line:
+                    break
+                position += len(line)
+                fields = series_fields(line, node_col_idx, intf_col_idx)
+                if fields is None:
+                    malformed_lines += 1
+                    continue
+                counts[fields] += 1
+    if sample_stride > 1:
+        for fields in counts:
+            counts[fields] *= sample_stride
+    return counts, malformed_lines
+
+
+def build_catalog(
+    input_file: Path,
+    catalog_path: Path,
+    node_col_name: str,
+    intf_col_name: str,
+    num_jobs: int,
+    sample_fraction: float = 1.0,
+):
+    from split_tsv_by_worker import find_chunk_boundaries, read_header
+
+    header_line, header_list = read_header(input_file)
+    try:
+        node_col_idx = header_list.index(node_col_name)
+        intf_col_idx = header_list.index(intf_col_name)
+    except ValueError:
+        print(
+            f"Error: Node ('{node_col_name}') or Interface ('{intf_col_name}') column not in header.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    chunks = find_chunk_boundaries(input_file, len(header_line), num_jobs)
+    sample_stride = max(1, round(1 / sample_fraction))
+    if sample_stride > 1:
+        print(
+            f"Sampling 1 in {sample_stride} blocks of {SAMPLE_BLOCK_BYTES} bytes; row counts are estimates."
+        )
+    print(f"Counting rows per series in {input_file} with {len(chunks)} processes...")
+    totals = Counter()
+    malformed_lines = 0
+    with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+        futures = [
+            executor.submit(
+                count_chunk,
+                input_file,
+                start,
+                end,
+                node_col_idx,
+                intf_col_idx,
+                sample_stride,
+            )
+            for start, end in chunks
+        ]
+        for future in futures:
+            counts, chunk_malformed = future.result()
+            totals.update(counts)
+            malformed_lines += chunk_malformed
+
+    counts = {
+        (node.decode("utf-8"), intf.decode("utf-8")): rows
+        for (node, intf), rows in totals.items()
+    }
+    write_catalog(catalog_path, counts)
+    if malformed_lines:
+        print(
+            f"Warning: skipped {malformed_lines} malformed data lines.", file=sys.stderr
+        )
+    print(f"Wrote {len(counts)} series ({sum(counts.values())} rows) to {catalog_path}")
+
+
+def print_report(catalog: SeriesCatalog, num_workers: int, strategies=ASSIGNMENTS):
+    """Prints the rows per worker of every assignment strategy."""
+    total_rows = sum(entry[2] for entry in catalog.entries)
+    print(f"{len(catalog)} series, {total_rows} rows, {num_workers} workers")
+    for strategy in strategies:
+        loads = catalog.worker_loads(num_workers, strategy)
+        mean = total_rows / num_workers
+        imbalance = max(loads) / mean if mean else 0.0
+        print(f"\n{strategy}: max/mean rows per worker = {imbalance:.3f}")
+        for worker, rows in enumerate(loads):
+            print(f"  worker {worker + 1}: {rows} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Builds and inspects the series catalog: a sidecar TSV mapping every "
+        "device/name series to an integer key, hash and row count, shared by the splitters "
+        "and inserters for worker assignment.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="Count rows per series of a TSV into a catalog."
+    )
+    build_parser.add_argument(
+        "--input_file", type=Path, required=True, help="Path to the input TSV file."
+    )
+    build_parser.add_argument(
+        "--catalog", type=Path, required=True, help="Catalog file to write."
+    )
+    build_parser.add_argument(
+        "--node_col_name",
+        default="meta.device",
+        help="TSV header column for node/device.",
+    )
+    build_parser.add_argument(
+        "--intf_col_name",
+        default="meta.name",
+        help="TSV header column for interface/name.",
+    )
+    build_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of counting processes.",
+    )
+    build_parser.add_argument(
+        "--sample_fraction",
+        type=float,
+        default=1.0,
+        help="Fraction of the input to read, in evenly spaced blocks. Row counts are "
+        "scaled up, which is enough to plan with on time-ordered dumps.",
+    )
+
+    report_parser = subparsers.add_parser(
+        "report", help="Print rows per worker for each assignment strategy."
+    )
+    report_parser.add_argument(
+        "--catalog", type=Path, required=True, help="Catalog file to read."
+    )
+    report_parser.add_argument(
+        "--workers", type=int, required=True, help="Number of workers."
+    )
+
+    plan_parser = subparsers.add_parser(
+        "plan",
+        help="Write a series -> worker plan for a fixed number of workers and "
+        "report its imbalance against hash modulo.",
+    )
+    plan_parser.add_argument(
+        "--catalog", type=Path, required=True, help="Catalog file to read."
+    )
+    plan_parser.add_argument(
+        "--workers", type=int, required=True, help="Number of workers."
+    )
+    plan_parser.add_argument(
+        "--plan", type=Path, required=True, help="Plan file to write."
+    )
+    plan_parser.add_argument(
+        "--strategy",
+        choices=ASSIGNMENTS,
+        default="balanced",
+        help="Assignment strategy.",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not args.input_file.is_file():
+            print(f"Error: Input file not found: {args.input_file}", file=sys.stderr)
+            sys.exit(1)
+        if args.jobs < 1:
+            print("Error: --jobs must be positive.", file=sys.stderr)
+            sys.exit(1)
+        if not 0 < args.sample_fraction <= 1:
+            print("Error: --sample_fraction must be in (0, 1].", file=sys.stderr)
+            sys.exit(1)
+        build_catalog(
+            args.input_file,
+            args.catalog,
+            args.node_col_name,
+            args.intf_col_name,
+            args.jobs,
+            args.sample_fraction,
+        )
+    else:
+        if args.workers < 1:
+            print("Error: --workers must be positive.", file=sys.stderr)
+            sys.exit(1)
+        catalog = load_catalog(args.catalog)
+        if args.command == "plan":
+            write_plan(args.plan, catalog, args.workers, args.strategy)
+            print_report(catalog, args.workers, sorted({"modulo", args.strategy}))
+            print(
+                f"\nWrote {args.strategy} plan for {args.workers} workers to {args.plan}"
+            )
+        else:
+            print_report(catalog, args.workers)
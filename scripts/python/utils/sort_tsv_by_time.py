@@ -0,0 +1,320 @@
+import argparse
+import csv
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from split_tsv_by_worker import find_chunk_boundaries, read_header
+
+DEFAULT_RUN_SIZE_MB = 256
+DEFAULT_MAX_FANIN = 128
+WRITE_BUFFER_SIZE = 16 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+KEY_ORDERS = ["time", "time_series", "series_time"]
+
+
+def make_key_function(key_col_idxs: list, parse_position: int = 0):
+    """
+    Returns a function mapping a raw line to its sort key: a tuple of the key
+    column values as bytes, compared byte-wise. ISO 8601 timestamps in one
+    format sort correctly that way. With a 1-based parse_position, that key
+    column is parsed as a timestamp instead, for inputs mixing formats.
+    """
+    max_idx = max(key_col_idxs)
+
+    def line_key(line: bytes):
+        if b'"' in line:
+            fields = next(csv.reader([line.decode("utf-8")], delimiter="\t"), [])
+            fields = [field.encode("utf-8") for field in fields]
+        else:
+            fields = line.rstrip(b"\r\n").split(b"\t", max_idx + 1)
+        return tuple(fields[idx] if idx < len(fields) else b"" for idx in key_col_idxs)
+
+    if not parse_position:
+        return line_key
+
+    def parsed_line_key(line: bytes):
+        key = list(line_key(line))
+        text = key[parse_position - 1].decode("utf-8").replace("Z", "+00:00")
+        try:
+            key[parse_position - 1] = datetime.fromisoformat(text).timestamp()
+        except ValueError:
+            key[parse_position - 1] = float("-inf")
+        return tuple(key)
+
+    return parsed_line_key
+
+
+def key_columns(header_list: list, order: str, timestamp_col: str, series_cols: list):
+    """Returns the header indexes of the key columns and the 1-based timestamp position."""
+    names = {
+        "time": [timestamp_col],
+        "time_series": [timestamp_col] + series_cols,
+        "series_time": series_cols + [timestamp_col],
+    }[order]
+    missing = [name for name in names if name not in header_list]
+    if missing:
+        print(f"Error: Key columns not in header: {missing}", file=sys.stderr)
+        sys.exit(1)
+    return [header_list.index(name) for name in names], names.index(timestamp_col) + 1
+
+
+def write_run(run_dir: Path, run_name: str, lines: list, key_function) -> Path:
+    lines.sort(key=key_function)
+    run_path = run_dir / run_name
+    with open(run_path, "wb", buffering=WRITE_BUFFER_SIZE) as run_file:
+        run_file.writelines(lines)
+    return run_path
+
+
+def generate_runs(
+    input_file: Path,
+    start: int,
+    end: int,
+    run_dir: Path,
+    run_prefix: str,
+    run_size_bytes: int,
+    key_col_idxs: list,
+    parse_position: int,
+):
+    """
+    Reads the byte range [start, end) of an input file and writes it as
+    sorted runs of about run_size_bytes each. Lines are kept as the raw bytes
+    read from the input. Runs in a worker process; returns (run paths, lines).
+    """
+    key_function = make_key_function(key_col_idxs, parse_position)
+    run_paths = []
+    lines = []
+    buffered_bytes = 0
+    line_count = 0
+    with open(input_file, "rb", buffering=READ_BUFFER_SIZE) as infile:
+        infile.seek(start)
+        position = start
+        while position < end:
+            line = infile.readline()
+            if not line:
+                break
+            position += len(line)
+            if not line.endswith(b"\n"):
+                line += b"\n"
+            lines.append(line)
+            buffered_bytes += len(line)
+            line_count += 1
+            if buffered_bytes >= run_size_bytes:
+                run_paths.append(
+                    write_run(
+                        run_dir,
+                        f"{run_prefix}_{len(run_paths):05d}",
+                        lines,
+                        key_function,
+                    )
+                )
+                lines = []
+                buffered_bytes = 0
+    if lines:
+        run_paths.append(
+            write_run(
+                run_dir, f"{run_prefix}_{len(run_paths):05d}", lines, key_function
+            )
+        )
+    return run_paths, line_count
+
+
+def merge_runs(run_paths: list, outfile, key_function):
+    """k-way merges sorted runs into an open binary file."""
+    run_files = [open(path, "rb", buffering=READ_BUFFER_SIZE) for path in run_paths]
+    try:
+        outfile.writelines(heapq.merge(*run_files, key=key_function))
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def sort_tsv(
+    input_files: list,
+    output_file: Path,
+    order: str,
+    timestamp_col: str,
+    series_cols: list,
+    parse_timestamps: bool,
+    run_size_mb: int,
+    max_fanin: int,
+    num_jobs: int,
+    temp_dir: Path,
+):
+    header_line = None
+    header_list = None
+    for input_file in input_files:
+        if not input_file.is_file():
+            print(f"Error: Input file not found: {input_file}", file=sys.stderr)
+            sys.exit(1)
+        file_header_line, file_header_list = read_header(input_file)
+        if header_list is None:
+            header_line, header_list = file_header_line, file_header_list
+        elif file_header_list != header_list:
+            print(
+                f"Error: Header of {input_file} differs from {input_files[0]}.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    key_col_idxs, timestamp_pos = key_columns(
+        header_list, order, timestamp_col, series_cols
+    )
+    parse_position = timestamp_pos if parse_timestamps else 0
+    key_function = make_key_function(key_col_idxs, parse_position)
+
+    # one byte range per process and input file
+    chunks = []
+    for input_file in input_files:
+        with open(input_file, "rb") as infile:
+            data_start = len(infile.readline())
+        for start, end in find_chunk_boundaries(input_file, data_start, num_jobs):
+            chunks.append((input_file, start, end))
+
+    run_dir = Path(tempfile.mkdtemp(prefix="sort_tsv_", dir=temp_dir))
+    print(f"Input files: {', '.join(str(f) for f in input_files)}")
+    print(f"Sort order: {order} ({', '.join(header_list[i] for i in key_col_idxs)})")
+    print(f"Generating sorted runs of ~{run_size_mb} MB in {run_dir}...")
+    try:
+        run_paths = []
+        total_lines = 0
+        with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+            futures = [
+                executor.submit(
+                    generate_runs,
+                    input_file,
+                    start,
+                    end,
+                    run_dir,
+                    f"run_{chunk_index:05d}",
+                    run_size_mb * 1024 * 1024,
+                    key_col_idxs,
+                    parse_position,
+                )
+                for chunk_index, (input_file, start, end) in enumerate(chunks)
+            ]
+            for future in futures:
+                chunk_runs, chunk_lines = future.result()
+                run_paths.extend(chunk_runs)
+                total_lines += chunk_lines
+        print(f"Sorted {total_lines} lines into {len(run_paths)} runs.")
+
+        # intermediate passes keep the number of open files bounded
+        merge_pass = 0
+        while len(run_paths) > max_fanin:
+            merge_pass += 1
+            print(f"Merge pass {merge_pass}: {len(run_paths)} runs...")
+            merged_paths = []
+            for group_index in range(0, len(run_paths), max_fanin):
+                group = run_paths[group_index : group_index + max_fanin]
+                merged_path = run_dir / f"merge_{merge_pass}_{len(merged_paths):05d}"
+                with open(merged_path, "wb", buffering=WRITE_BUFFER_SIZE) as merged:
+                    merge_runs(group, merged, key_function)
+                for path in group:
+                    path.unlink()
+                merged_paths.append(merged_path)
+            run_paths = merged_paths
+
+        print(f"Merging {len(run_paths)} runs into {output_file}...")
+        with open(output_file, "wb", buffering=WRITE_BUFFER_SIZE) as outfile:
+            outfile.write(header_line)
+            merge_runs(run_paths, outfile, key_function)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    print(f"Sort complete. Wrote {total_lines} data lines to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="External merge sort of one or more Stardust TSV exports by timestamp, "
+        "optionally clustered by series. Sorted runs are generated in parallel and k-way "
+        "merged with bounded memory; lines are copied as raw bytes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--input_file",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="Input TSV file(s). All files must share one header.",
+    )
+    parser.add_argument(
+        "--output_file", type=Path, required=True, help="Sorted TSV file to write."
+    )
+    parser.add_argument(
+        "--order",
+        choices=KEY_ORDERS,
+        default="time",
+        help="time: by timestamp; time_series: by timestamp, then series; "
+        "series_time: series-clustered, each series by timestamp.",
+    )
+    parser.add_argument(
+        "--timestamp_col", default="@timestamp", help="TSV header column to sort on."
+    )
+    parser.add_argument(
+        "--series_cols",
+        default="meta.device,meta.name",
+        help="Comma separated TSV header columns identifying a series.",
+    )
+    parser.add_argument(
+        "--parse_timestamps",
+        action="store_true",
+        help="Compare parsed timestamps instead of their text. Only needed when "
+        "the inputs mix timestamp formats or time zones.",
+    )
+    parser.add_argument(
+        "--run_size_mb",
+        type=int,
+        default=DEFAULT_RUN_SIZE_MB,
+        help="Size of the sorted runs; each process holds about one run in memory.",
+    )
+    parser.add_argument(
+        "--max_fanin",
+        type=int,
+        default=DEFAULT_MAX_FANIN,
+        help="Maximum runs merged at once; more runs are merged in several passes.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of run generation processes.",
+    )
+    parser.add_argument(
+        "--temp_dir",
+        type=Path,
+        default=None,
+        help="Directory for sorted runs. Default: next to the output file.",
+    )
+
+    args = parser.parse_args()
+
+    if args.output_file.resolve() in [f.resolve() for f in args.input_file]:
+        print("Error: Output file must differ from the input files.", file=sys.stderr)
+        sys.exit(1)
+    if args.run_size_mb < 1 or args.jobs < 1 or args.max_fanin < 2:
+        print(
+            "Error: --run_size_mb and --jobs must be positive, --max_fanin at least 2.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    sort_tsv(
+        args.input_file,
+        args.output_file,
+        args.order,
+        args.timestamp_col,
+        [col for col in args.series_cols.split(",") if col],
+        args.parse_timestamps,
+        args.run_size_mb,
+        args.max_fanin,
+        args.jobs,
+        args.temp_dir or args.output_file.resolve().parent,
+    )
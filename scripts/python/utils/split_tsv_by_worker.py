@@ -5,39 +5,40 @@ import shutil
 import sys
 import zlib
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from series_catalog import load_catalog
+
 # --- Configuration ---
 # Default values, can be overridden by args
 OUTPUT_BUFFER_SIZE_LINES = 10000
+# buffered line bytes of all processes together, split evenly between them
+OUTPUT_BUFFER_BYTES = 1024 * 1024 * 1024
 MAX_OPEN_FILES_CACHE_SIZE = 500
+COPY_BUFFER_SIZE = 16 * 1024 * 1024
+PARTS_DIR_NAME = ".parts"
 
 
 def flush_buffer(
     filepath: Path,
     lines_buffer: list,
-    header_list: list,
-    headers_written_set: set,
-    open_file_cache: OrderedDict,  # LRU cache of (file_handle, csv_writer)
-    max_cache_size: int,  # This parameter is defined
+    open_file_cache: OrderedDict,  # LRU cache of binary file handles
+    max_cache_size: int,
 ):
     """
-    Writes a buffer of lines to the specified file, managing open file handles
-    via an LRU cache. Adds header if new.
+    Appends a buffer of raw lines to the specified file, managing open file
+    handles via an LRU cache.
     """
     if not lines_buffer:
         return
 
-    csv_writer = None  # Initialize to None
-
-    if filepath in open_file_cache:
-        _file_handle, csv_writer = open_file_cache[filepath]  # Unpack tuple
+    file_handle = open_file_cache.get(filepath)
+    if file_handle is not None:
         open_file_cache.move_to_end(filepath)  # Mark as recently used
     else:
         if len(open_file_cache) >= max_cache_size:
-            lru_filepath, (lru_handle_to_close, _lru_writer_to_discard) = (
-                open_file_cache.popitem(last=False)
-            )
+            lru_filepath, lru_handle_to_close = open_file_cache.popitem(last=False)
             try:
                 lru_handle_to_close.close()
             except Exception as e:
@@ -45,35 +46,223 @@ def flush_buffer(
                     f"\nWarning: Error closing LRU file {lru_filepath}: {e}",
                     file=sys.stderr,
                 )
+        # part files start empty (see split_chunk), so appending is always safe
+        file_handle = open(filepath, "ab")
+        open_file_cache[filepath] = file_handle
+
+    file_handle.writelines(lines_buffer)
+
+
+def output_filename(num_workers: int, worker_index: int) -> str:
+    return f"{num_workers}_workers_worker_{worker_index + 1}.tsv"
+
+
+def read_header(input_file: Path):
+    """Returns the raw header line and its parsed column names."""
+    with open(input_file, "rb") as infile:
+        header_line = infile.readline()
+    if not header_line.endswith(b"\n"):
+        header_line += b"\n"
+    header_list = next(csv.reader([header_line.decode("utf-8")], delimiter="\t"))
+    return header_line, header_list
+
 
-        mode = "w" if filepath not in headers_written_set else "a"
-        file_handle_new = None
+def find_chunk_boundaries(input_file: Path, data_start: int, num_chunks: int):
+    """
+    Splits the data section of the file into `num_chunks` byte ranges that
+    start and end on line boundaries. Returns a list of (start, end) offsets.
+    """
+    file_size = input_file.stat().st_size
+    approx_size = max(1, (file_size - data_start) // num_chunks)
+    boundaries = [data_start]
+    with open(input_file, "rb") as infile:
+        for i in range(1, num_chunks):
+            target = max(data_start + i * approx_size, boundaries[-1])
+            if target >= file_size:
+                break
+            infile.seek(target)
+            infile.readline()  # move to the start of the next line
+            position = infile.tell()
+            if position >= file_size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(file_size)
+    return [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start
+    ]
+
+
+def series_fields(line: bytes, node_col_idx: int, intf_col_idx: int):
+    """
+    Returns the (node, intf) values of a raw TSV line as bytes, or None when
+    the line is malformed. Only lines with quoted fields go through the csv
+    module.
+    """
+    if b'"' in line:
+        fields = next(csv.reader([line.decode("utf-8")], delimiter="\t"), [])
         try:
-            file_handle_new = open(filepath, mode, newline="", encoding="utf-8")
-            csv_writer = csv.writer(file_handle_new, delimiter="\t")
-            if mode == "w":
-                csv_writer.writerow(header_list)
-                headers_written_set.add(filepath)
-            open_file_cache[filepath] = (file_handle_new, csv_writer)
-        except Exception as e:
-            print(f"\nError opening/preparing file {filepath}: {e}", file=sys.stderr)
-            if file_handle_new:
-                try:
-                    file_handle_new.close()
-                except:
-                    pass
-            return
+            return (
+                fields[node_col_idx].encode("utf-8"),
+                fields[intf_col_idx].encode("utf-8"),
+            )
+        except IndexError:
+            return None
+    fields = line.rstrip(b"\r\n").split(b"\t")
+    try:
+        return fields[node_col_idx], fields[intf_col_idx]
+    except IndexError:
+        return None
+
+
+def split_chunk(
+    input_file: Path,
+    parts_dir: Path,
+    chunk_index: int,
+    start: int,
+    end: int,
+    scenarios_to_process: list,
+    node_col_idx: int,
+    intf_col_idx: int,
+    buffer_size_lines: int,
+    max_open_files: int,
+    catalog_path: Path = None,
+    assignment: str = "modulo",
+    buffer_bytes: int = OUTPUT_BUFFER_BYTES,
+):
+    """
+    Splits the byte range [start, end) of the input into per-chunk partial
+    files, one per scenario worker. Lines are written unchanged. Runs in a
+    worker process; returns (chunk_index, processed lines, malformed lines).
+
+    A file's buffer is flushed at buffer_size_lines lines, and all of them
+    once they hold buffer_bytes together, which bounds the memory of the
+    process however many scenario files there are.
+
+    Without a series catalog a series goes to adler32("node|intf") % N;
+    with one, to the catalog's modulo or balanced assignment.
+    """
+    catalog = load_catalog(catalog_path) if catalog_path else None
+    chunk_dir = parts_dir / f"{chunk_index:05d}"
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+
+    # series id -> one output path per scenario
+    series_assignment_cache = {}
+    output_buffers = {}
+    buffered_bytes = 0
+    open_file_handle_cache = OrderedDict()
+    processed_data_lines = 0
+    malformed_lines = 0
 
     try:
-        if csv_writer:
-            csv_writer.writerows(lines_buffer)
-        else:
-            print(
-                f"\nError: CSV writer not available for {filepath} during write attempt.",
-                file=sys.stderr,
+        with open(input_file, "rb") as infile:
+            infile.seek(start)
+            position = start
+            while position < end:
+                line = infile.readline()
+                if not line:
+                    break
+                position += len(line)
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                processed_data_lines += 1
+
+                fields = series_fields(line, node_col_idx, intf_col_idx)
+                if fields is None:
+                    malformed_lines += 1
+                    continue
+
+                targets = series_assignment_cache.get(fields)
+                if targets is None:
+                    if catalog is None:
+                        hash_val = zlib.adler32(fields[0] + b"|" + fields[1])
+                        worker_indexes = [
+                            hash_val % num_workers
+                            for num_workers in scenarios_to_process
+                        ]
+                    else:
+                        node, intf = fields[0].decode("utf-8"), fields[1].decode(
+                            "utf-8"
+                        )
+                        worker_indexes = [
+                            catalog.worker_for(node, intf, num_workers, assignment)
+                            for num_workers in scenarios_to_process
+                        ]
+                    targets = [
+                        chunk_dir / output_filename(num_workers, worker_index)
+                        for num_workers, worker_index in zip(
+                            scenarios_to_process, worker_indexes
+                        )
+                    ]
+                    series_assignment_cache[fields] = targets
+
+                for output_filepath in targets:
+                    line_buffer = output_buffers.get(output_filepath)
+                    if line_buffer is None:
+                        line_buffer = output_buffers[output_filepath] = []
+                    line_buffer.append(line)
+                    buffered_bytes += len(line)
+                    if len(line_buffer) >= buffer_size_lines:
+                        flush_buffer(
+                            output_filepath,
+                            line_buffer,
+                            open_file_handle_cache,
+                            max_open_files,
+                        )
+                        buffered_bytes -= sum(map(len, line_buffer))
+                        output_buffers[output_filepath] = []
+
+                if buffered_bytes >= buffer_bytes:
+                    for output_filepath, line_buffer in output_buffers.items():
+                        flush_buffer(
+                            output_filepath,
+                            line_buffer,
+                            open_file_handle_cache,
+                            max_open_files,
+                        )
+                    output_buffers = {}
+                    buffered_bytes = 0
+
+        for output_filepath, line_buffer in output_buffers.items():
+            flush_buffer(
+                output_filepath, line_buffer, open_file_handle_cache, max_open_files
             )
-    except Exception as e:
-        print(f"\nError writing buffer to {filepath}: {e}", file=sys.stderr)
+    finally:
+        for file_handle in open_file_handle_cache.values():
+            try:
+                file_handle.close()
+            except Exception:
+                pass
+
+    return chunk_index, processed_data_lines, malformed_lines
+
+
+def concatenate_parts(
+    output_base_dir: Path,
+    parts_dir: Path,
+    num_chunks: int,
+    scenarios_to_process: list,
+    header_line: bytes,
+):
+    """Writes every scenario file as the header followed by its parts in input order."""
+    for num_workers in scenarios_to_process:
+        scenario_dir = output_base_dir / f"{num_workers}_workers"
+        scenario_dir.mkdir(parents=True, exist_ok=True)
+        for worker_index in range(num_workers):
+            filename = output_filename(num_workers, worker_index)
+            part_paths = [
+                parts_dir / f"{chunk_index:05d}" / filename
+                for chunk_index in range(num_chunks)
+            ]
+            part_paths = [path for path in part_paths if path.exists()]
+            if not part_paths:
+                continue
+            with open(scenario_dir / filename, "wb") as outfile:
+                outfile.write(header_line)
+                for part_path in part_paths:
+                    with open(part_path, "rb") as part:
+                        shutil.copyfileobj(part, outfile, COPY_BUFFER_SIZE)
+                    part_path.unlink()
 
 
 def split_main_single_pass(
@@ -87,13 +276,17 @@ def split_main_single_pass(
     run_only_max_workers_scenario: bool,
     buffer_size_lines_arg: int,
     max_open_files_arg: int,
+    num_jobs: int,
+    catalog_path: Path = None,
+    assignment: str = "modulo",
+    buffer_bytes_arg: int = OUTPUT_BUFFER_BYTES,
 ):
-    # Use local variables for these settings based on args
-    current_output_buffer_size_lines = buffer_size_lines_arg
-    current_max_open_files_cache_size = max_open_files_arg
-
-    print(f"Using output buffer size: {current_output_buffer_size_lines} lines")
-    print(f"Max open output files cache size: {current_max_open_files_cache_size}")
+    buffer_bytes_per_job = max(1, buffer_bytes_arg // num_jobs)
+    print(
+        f"Using output buffer size: {buffer_size_lines_arg} lines per file, "
+        f"{buffer_bytes_per_job:,} bytes per process"
+    )
+    print(f"Max open output files cache size (per process): {max_open_files_arg}")
 
     if not input_file.is_file():
         print(f"Error: Input file not found: {input_file}", file=sys.stderr)
@@ -123,16 +316,11 @@ def split_main_single_pass(
         )
     if total_data_lines is not None:
         print(f"Total data lines to process (as provided): {total_data_lines}")
-    else:
-        print(
-            "Total data lines not provided; progress will be shown in lines processed."
-        )
+    if catalog_path:
+        print(f"Series catalog: {catalog_path} ({assignment} assignment)")
 
-    header_list = None
     try:
-        with open(input_file, "r", newline="", encoding="utf-8") as infile_peek_header:
-            reader = csv.reader(infile_peek_header, delimiter="\t")
-            header_list = next(reader)
+        header_line, header_list = read_header(input_file)
         if not header_list:
             print("Error: Could not read header from input file.", file=sys.stderr)
             sys.exit(1)
@@ -150,171 +338,86 @@ def split_main_single_pass(
         )
         sys.exit(1)
 
-    print(f"Header identified. Starting single pass splitting...")
-
     if run_only_max_workers_scenario:
-        scenarios_to_process = range(max_num_workers, max_num_workers + 1)
+        scenarios_to_process = list(range(max_num_workers, max_num_workers + 1))
     else:
-        scenarios_to_process = range(2, max_num_workers + 1)
-
-    output_buffers = {}
-    headers_written_to_output_files = set()
-    series_assignment_cache = {}
-    open_file_handle_cache = OrderedDict()
-
-    for num_scenario_workers_val in scenarios_to_process:
-        scenario_dir = output_base_dir / f"{num_scenario_workers_val}_workers"
-        scenario_dir.mkdir(parents=True, exist_ok=True)
-        for i in range(num_scenario_workers_val):
-            output_filepath_key = (
-                scenario_dir / f"{num_scenario_workers_val}_workers_worker_{i + 1}.tsv"
-            )
-            if output_filepath_key not in output_buffers:
-                output_buffers[output_filepath_key] = []
+        scenarios_to_process = list(range(2, max_num_workers + 1))
+
+    with open(input_file, "rb") as infile:
+        data_start = len(infile.readline())
+    chunks = find_chunk_boundaries(input_file, data_start, num_jobs)
+    parts_dir = output_base_dir / PARTS_DIR_NAME
+    if parts_dir.exists():
+        shutil.rmtree(parts_dir)
+    parts_dir.mkdir(parents=True)
+
+    print(
+        f"Header identified. Splitting {len(chunks)} byte ranges with {num_jobs} processes..."
+    )
 
     processed_data_lines = 0
-    last_progress_len = 0
-    progress_update_interval = 10000
-    if total_data_lines and total_data_lines > 1000000:
-        progress_update_interval = max(10000, total_data_lines // 100)
-
+    malformed_lines = 0
     try:
-        with open(input_file, "r", newline="", encoding="utf-8") as infile_text:
-            reader = csv.reader(infile_text, delimiter="\t")
-            next(reader)  # Skip header row
-
-            for row_list in reader:
-                processed_data_lines += 1
-                try:
-                    node_val = row_list[node_col_idx]
-                    intf_val = row_list[intf_col_idx]
-                except IndexError:
-                    sys.stderr.write(
-                        f"\nWarning: Data line {processed_data_lines} malformed. Skipping.\n"
-                    )
-                    continue
-
-                series_id_str = f"{node_val}|{intf_val}"
-                if series_id_str not in series_assignment_cache:
-                    hash_val = zlib.adler32(series_id_str.encode("utf-8"))
-                    assignments = {}
-                    for num_potential_scenarios in range(2, max_num_workers + 1):
-                        assignments[num_potential_scenarios] = (
-                            hash_val % num_potential_scenarios
-                        )
-                    series_assignment_cache[series_id_str] = assignments
-
-                worker_assignments_for_series = series_assignment_cache[series_id_str]
-
-                for num_scenario_workers_iter in scenarios_to_process:
-                    target_worker_index = worker_assignments_for_series.get(
-                        num_scenario_workers_iter
-                    )
-                    if target_worker_index is None:
-                        continue
-
-                    scenario_dir = (
-                        output_base_dir / f"{num_scenario_workers_iter}_workers"
-                    )
-                    output_filepath = (
-                        scenario_dir
-                        / f"{num_scenario_workers_iter}_workers_worker_{target_worker_index + 1}.tsv"
-                    )
-
-                    output_buffers[output_filepath].append(list(row_list))
-
-                    if (
-                        len(output_buffers[output_filepath])
-                        >= current_output_buffer_size_lines
-                    ):
-                        flush_buffer(
-                            output_filepath,
-                            output_buffers[output_filepath],
-                            header_list,
-                            headers_written_to_output_files,
-                            open_file_handle_cache,
-                            current_max_open_files_cache_size,
-                        )  # Corrected: Pass max_cache_size
-                        output_buffers[output_filepath] = []
-
-                if processed_data_lines % progress_update_interval == 0 or (
-                    total_data_lines is not None
-                    and processed_data_lines == total_data_lines
-                ):
-                    if total_data_lines is not None and total_data_lines > 0:
-                        percentage = (processed_data_lines / total_data_lines) * 100
-                        status_message = (
-                            f"Processed: {processed_data_lines:,}/{total_data_lines:,} lines ({percentage:.2f}%) "
-                            f"- Series Cached: {len(series_assignment_cache)} "
-                            f"- Open Files: {len(open_file_handle_cache)}"
-                        )
-                    else:
-                        status_message = (
-                            f"Processed: {processed_data_lines:,} lines "
-                            f"- Series Cached: {len(series_assignment_cache)} "
-                            f"- Open Files: {len(open_file_handle_cache)}"
-                        )
-                    current_line_len = len(status_message)
-                    sys.stdout.write(
-                        "\r"
-                        + status_message
-                        + " " * (last_progress_len - current_line_len)
-                    )
-                    sys.stdout.flush()
-                    last_progress_len = current_line_len
-
-        sys.stdout.write("\n")
-        print("Flushing all remaining buffers and closing cached files...")
-        for output_filepath_key, line_buffer_val in output_buffers.items():
-            if line_buffer_val:
-                flush_buffer(
-                    output_filepath_key,
-                    line_buffer_val,
-                    header_list,
-                    headers_written_to_output_files,
-                    open_file_handle_cache,
-                    current_max_open_files_cache_size,
-                )  # Corrected: Pass max_cache_size
-
-        for filepath_key_final in list(open_file_handle_cache.keys()):
-            file_handle_final, _csv_writer_final = open_file_handle_cache.pop(
-                filepath_key_final
-            )
-            try:
-                file_handle_final.close()
-            except Exception as e:
-                print(
-                    f"\nWarning: Error closing final cached file {filepath_key_final}: {e}",
-                    file=sys.stderr,
+        with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+            futures = [
+                executor.submit(
+                    split_chunk,
+                    input_file,
+                    parts_dir,
+                    chunk_index,
+                    start,
+                    end,
+                    scenarios_to_process,
+                    node_col_idx,
+                    intf_col_idx,
+                    buffer_size_lines_arg,
+                    max_open_files_arg,
+                    catalog_path,
+                    assignment,
+                    buffer_bytes_per_job,
                 )
+                for chunk_index, (start, end) in enumerate(chunks)
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                chunk_index, chunk_lines, chunk_malformed = future.result()
+                processed_data_lines += chunk_lines
+                malformed_lines += chunk_malformed
+                status_message = f"Chunk {chunk_index} done ({done}/{len(chunks)}) - Processed: {processed_data_lines:,} lines"
+                if total_data_lines:
+                    status_message += (
+                        f" ({processed_data_lines / total_data_lines * 100:.2f}%)"
+                    )
+                print(status_message)
 
+        print("Concatenating partial outputs...")
+        concatenate_parts(
+            output_base_dir, parts_dir, len(chunks), scenarios_to_process, header_line
+        )
     except Exception as e:
-        sys.stdout.write("\n")
         print(f"An error occurred during processing: {e}", file=sys.stderr)
+        sys.exit(1)
     finally:
-        sys.stdout.write("\n")
-        # Ensure all cached handles are attempted to be closed, even if an error occurred mid-loop
-        for filepath_key_exc in list(open_file_handle_cache.keys()):
-            file_handle_exc, _ = open_file_handle_cache.pop(filepath_key_exc)
-            try:
-                file_handle_exc.close()
-            except:
-                pass
+        shutil.rmtree(parts_dir, ignore_errors=True)
 
-        print(f"Splitting complete. Processed {processed_data_lines} data lines.")
-        for num_scenario_workers_final in scenarios_to_process:
-            s_dir = output_base_dir / f"{num_scenario_workers_final}_workers"
-            if s_dir.exists():
-                num_files = len(list(s_dir.glob("*.tsv")))
-                print(
-                    f"  Scenario {num_scenario_workers_final} workers: {num_files} files created in {s_dir}"
-                )
+    if malformed_lines:
+        print(
+            f"Warning: skipped {malformed_lines} malformed data lines.", file=sys.stderr
+        )
+    print(f"Splitting complete. Processed {processed_data_lines} data lines.")
+    for num_scenario_workers_final in scenarios_to_process:
+        s_dir = output_base_dir / f"{num_scenario_workers_final}_workers"
+        if s_dir.exists():
+            num_files = len(list(s_dir.glob("*.tsv")))
+            print(
+                f"  Scenario {num_scenario_workers_final} workers: {num_files} files created in {s_dir}"
+            )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Split a large TSV into multiple sets of files for N-worker scenarios "
-        "in a single pass, using an LRU cache for open file handles.",
+        "in a single parallel pass. Each process splits one byte range of the input into "
+        "partial files, which are concatenated in input order at the end.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument(
@@ -369,11 +472,37 @@ if __name__ == "__main__":
         default=OUTPUT_BUFFER_SIZE_LINES,
         help=f"Lines to buffer per output file before flushing. Default: {OUTPUT_BUFFER_SIZE_LINES}",
     )
+    parser.add_argument(
+        "--buffer_bytes",
+        type=int,
+        default=OUTPUT_BUFFER_BYTES,
+        help="Bytes of buffered lines across all processes; each process flushes its "
+        f"buffers once it holds its --jobs share. Default: {OUTPUT_BUFFER_BYTES}",
+    )
     parser.add_argument(
         "--max_open_files",
         type=int,
         default=MAX_OPEN_FILES_CACHE_SIZE,
-        help=f"Max output files to keep open. Default: {MAX_OPEN_FILES_CACHE_SIZE}",
+        help=f"Max output files to keep open per process. Default: {MAX_OPEN_FILES_CACHE_SIZE}",
+    )
+    parser.add_argument(
+        "--series_catalog",
+        type=Path,
+        default=None,
+        help="Optional: series catalog written by series_catalog.py. Series are then "
+        "placed like every other inserter using the same catalog.",
+    )
+    parser.add_argument(
+        "--assignment",
+        choices=["modulo", "balanced"],
+        default="modulo",
+        help="With --series_catalog: hash modulo, or balance row counts across workers.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes; the input is split into this many byte ranges.",
     )
 
     args = parser.parse_args()
@@ -400,9 +529,20 @@ if __name__ == "__main__":
     if args.buffer_size_lines < 1:
         print("Error: --buffer_size_lines must be positive.", file=sys.stderr)
         sys.exit(1)
+    if args.buffer_bytes < 1:
+        print("Error: --buffer_bytes must be positive.", file=sys.stderr)
+        sys.exit(1)
     if args.max_open_files < 1:
         print("Error: --max_open_files must be positive.", file=sys.stderr)
         sys.exit(1)
+    if args.series_catalog is not None and not args.series_catalog.is_file():
+        print(
+            f"Error: Series catalog not found: {args.series_catalog}", file=sys.stderr
+        )
+        sys.exit(1)
+    if args.jobs < 1:
+        print("Error: --jobs must be positive.", file=sys.stderr)
+        sys.exit(1)
 
     split_main_single_pass(
         args.input_file,
@@ -415,4 +555,8 @@ if __name__ == "__main__":
         args.run_only_max_workers_scenario,
         args.buffer_size_lines,
         args.max_open_files,
+        args.jobs,
+        args.series_catalog,
+        args.assignment,
+        args.buffer_bytes,
     )
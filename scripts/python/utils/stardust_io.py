@@ -0,0 +1,299 @@
+"""
+Reads and writes Stardust exports in every format stardust_fetcher.py can
+produce: TSV/CSV text, plain or compressed as .gz/.zst, and Parquet.
+
+Inserters open their input with open_input(), which decompresses text exports
+and renders Parquet exports back to TSV text on the fly, so row handling
+downstream stays the same whatever the stored format is.
+
+Parquet exports keep one column per fetcher field. values.* are doubles,
+meta.* dictionary encoded strings and every other field a plain string, in
+row groups that each cover one time window of @timestamp.
+"""
+
+import csv
+import datetime
+import gzip
+import io
+import sys
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TIMESTAMP_COL = "@timestamp"
+PARQUET_SUFFIXES = (".parquet", ".pq")
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+DEFAULT_ROW_GROUP_MINUTES = 60
+MAX_ROW_GROUP_ROWS = 1000000
+READ_BATCH_ROWS = 65536
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+def compression_of(path) -> str:
+    """'gzip' or 'zstd' for compressed text exports, None otherwise."""
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return compression
+    return None
+
+
+def is_parquet(path) -> bool:
+    return str(path).endswith(PARQUET_SUFFIXES)
+
+
+def require_zstandard():
+    if zstandard is None:
+        sys.exit(".zst files need the zstandard package (pip install zstandard)")
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sys.exit("Parquet files need the pyarrow package (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def open_output(path, append=True, compresslevel=None):
+    """
+    Opens a binary stream for an export. '-' is stdout. Names ending in .gz or
+    .zst are compressed; appending adds a new gzip member or zstd frame, which
+    readers decompress as one stream.
+    """
+    if str(path) == "-":
+        return sys.stdout.buffer
+    mode = "ab" if append else "wb"
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(
+            path, mode, compresslevel=6 if compresslevel is None else compresslevel
+        )
+    if compression == "zstd":
+        require_zstandard()
+        compressor = zstandard.ZstdCompressor(
+            level=3 if compresslevel is None else compresslevel
+        )
+        return compressor.stream_writer(open(path, mode))
+    return open(path, mode)
+
+
+def open_input(path, mode="r", newline=None):
+    """
+    Opens an export for reading like open(): plain, .gz and .zst text files,
+    and .parquet files rendered as TSV text with a header line. '-' is stdin.
+    """
+    if str(path) == "-":
+        raw = sys.stdin.buffer
+    elif is_parquet(path):
+        raw = io.BufferedReader(ParquetTSVReader(path), READ_BUFFER_SIZE)
+    elif compression_of(path) == "gzip":
+        raw = gzip.open(path, "rb")
+    elif compression_of(path) == "zstd":
+        require_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        raw = io.BufferedReader(reader, READ_BUFFER_SIZE)
+    else:
+        raw = open(path, "rb", buffering=READ_BUFFER_SIZE)
+    if "b" in mode:
+        return raw
+    return io.TextIOWrapper(raw, encoding="utf-8", newline=newline)
+
+
+def time_window(timestamp, window_seconds: float):
+    """Index of the window_seconds long window holding an @timestamp value."""
+    if timestamp is None or timestamp == "":
+        return None
+    if isinstance(timestamp, (int, float)) or timestamp.isdigit():
+        return int(float(timestamp) / 1000 // window_seconds)
+    try:
+        dt = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            dt = datetime.datetime.fromisoformat(timestamp[:19])
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp() // window_seconds)
+
+
+def to_double(value):
+    """A values.* cell as a float, None if empty; raises ValueError otherwise."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except TypeError:
+        raise ValueError(f"not a number: {value!r}")
+
+
+def to_text(value):
+    # str() is what csv.writer writes for the same value
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+class ParquetRowWriter:
+    """
+    Writes fetcher rows, lists of values in fieldname order, to a Parquet
+    file. Values may be the fetched JSON values or their TSV text. A row group
+    is closed whenever @timestamp enters a new window of window_seconds, so
+    rows should arrive in time order, and after MAX_ROW_GROUP_ROWS rows.
+    values.* cells that are not numbers are written as NULL and counted per
+    field in invalid_values; close() warns about them.
+    """
+
+    def __init__(
+        self,
+        sink,
+        fieldnames: list,
+        window_seconds: float = DEFAULT_ROW_GROUP_MINUTES * 60,
+        compression: str = "zstd",
+    ):
+        pa, pq = require_pyarrow()
+        self.pa = pa
+        fields = []
+        for name in fieldnames:
+            if name.startswith("values."):
+                fields.append(pa.field(name, pa.float64()))
+            elif name.startswith("meta."):
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(
+            sink,
+            self.schema,
+            compression=compression,
+            use_dictionary=[name for name in fieldnames if name.startswith("meta.")],
+        )
+        self.window_seconds = window_seconds
+        self.timestamp_idx = (
+            fieldnames.index(TIMESTAMP_COL) if TIMESTAMP_COL in fieldnames else None
+        )
+        self.columns = [[] for _ in fieldnames]
+        self.buffered = 0
+        self.window = None
+        self.last_timestamp = None
+        self.rows = 0
+        self.row_groups = 0
+        self.invalid_values = {}
+        self.invalid_examples = {}
+
+    def write(self, row: list):
+        if self.timestamp_idx is not None:
+            timestamp = row[self.timestamp_idx]
+            if timestamp != self.last_timestamp:
+                self.last_timestamp = timestamp
+                window = time_window(timestamp, self.window_seconds)
+                if window != self.window:
+                    self.flush()
+                    self.window = window
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.buffered += 1
+        if self.buffered >= MAX_ROW_GROUP_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows as one row group."""
+        if not self.buffered:
+            return
+        pa = self.pa
+        arrays = []
+        for field, column in zip(self.schema, self.columns):
+            if pa.types.is_floating(field.type):
+                arrays.append(pa.array(self.doubles(field.name, column), pa.float64()))
+            elif pa.types.is_dictionary(field.type):
+                arrays.append(
+                    pa.array(
+                        [to_text(v) for v in column], pa.string()
+                    ).dictionary_encode()
+                )
+            else:
+                arrays.append(pa.array([to_text(v) for v in column], pa.string()))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.buffered)
+        self.rows += self.buffered
+        self.row_groups += 1
+        self.columns = [[] for _ in self.columns]
+        self.buffered = 0
+
+    def doubles(self, name: str, column: list) -> list:
+        values = []
+        for value in column:
+            try:
+                values.append(to_double(value))
+            except ValueError:
+                self.invalid_values[name] = self.invalid_values.get(name, 0) + 1
+                self.invalid_examples.setdefault(name, value)
+                values.append(None)
+        return values
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        for name, count in self.invalid_values.items():
+            print(
+                f"Warning: {count} non-numeric {name} values written as NULL, "
+                f"e.g. {self.invalid_examples[name]!r}",
+                file=sys.stderr,
+            )
+
+
+def format_double(value):
+    # integral doubles were most likely integers in the fetched JSON
+    if value is not None and value.is_integer():
+        return int(value)
+    return value
+
+
+class ParquetTSVReader(io.RawIOBase):
+    """A Parquet export as a raw stream of TSV bytes, header line first."""
+
+    def __init__(self, path, delimiter: str = "\t"):
+        pa, pq = require_pyarrow()
+        self.pa = pa
+        self.parquet_file = pq.ParquetFile(path)
+        self.batches = self.parquet_file.iter_batches(batch_size=READ_BATCH_ROWS)
+        self.delimiter = delimiter
+        self.pending = self.render([self.parquet_file.schema_arrow.names])
+        self.position = 0
+
+    def render(self, rows) -> bytes:
+        out = io.StringIO()
+        csv.writer(out, delimiter=self.delimiter, lineterminator="\n").writerows(rows)
+        return out.getvalue().encode("utf-8")
+
+    def render_batch(self, batch) -> bytes:
+        columns = []
+        for column in batch.columns:
+            values = column.to_pylist()
+            if self.pa.types.is_floating(column.type):
+                values = [format_double(v) for v in values]
+            columns.append(values)
+        return self.render(zip(*columns))
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.position >= len(self.pending):
+            batch = next(self.batches, None)
+            if batch is None:
+                return 0
+            self.pending = self.render_batch(batch)
+            self.position = 0
+        size = min(len(buffer), len(self.pending) - self.position)
+        buffer[:size] = self.pending[self.position : self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.parquet_file.close()
+        super().close()
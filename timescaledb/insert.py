@@ -15,6 +15,10 @@ import os
 import random
 import string
 import hashlib
+import struct
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "python", "utils"))
+from stardust_io import open_input
+from pacing import make_rate_limiter
 
 
 parser = argparse.ArgumentParser(description='Inserts ESnet Stardust Data into timescaledb, producing a timing summary report.')
@@ -27,11 +31,14 @@ parser.add_argument('--scoreboard-table', help="Table to insert metrics/scoreboa
 parser.add_argument('--strategy', help='metadata insertion strategy. Options are "hashed-metadata" or "inline-metadata".'
                     ' When "hashed-metadata", metadata will be inserted into the "metadata-table" and referenced via hash.'
                     ' When "inline-metadata", metadata objects will be inserted into the same row as values.', default="hashed-metadata")
-parser.add_argument('--infile', help="Read rows from infile. Default: sys.stdin", default=sys.stdin, type=argparse.FileType('r'))
+parser.add_argument('--infile', help="Read rows from infile: a fetcher export as TSV, .tsv.gz, .tsv.zst or .parquet. Default: sys.stdin", default=sys.stdin, type=open_input)
 parser.add_argument('--wide', help="Use stardust 'wide' format, including all columns.", action='store_true')
 parser.add_argument('--flow', help="Use stardust 'flow' format, including all flow columns.", action='store_true')
 parser.add_argument('--normalized', help="For 'wide' format, normalize metadata into columns.", action='store_true')
 parser.add_argument('--batch-size', help="Batch size to do inserts, in rows.", type=int, default=5000)
+parser.add_argument('--rows-per-sec', help="Pace the value batches to this many rows per second. Default: as fast as possible", type=float)
+parser.add_argument('--arrivals', help="With --rows-per-sec, send batches on a fixed open-loop schedule with constant or Poisson gaps instead of after the previous batch", choices=['constant', 'poisson'])
+parser.add_argument('--latency-output', help="With --rows-per-sec, write every batch's latency from its scheduled send time to this CSV (see scripts/python/utils/pacing.py report)")
 parser.add_argument('--limit', help="total insertion limit", type=int, default=20000)
 parser.add_argument('--skip', help="Only insert every Nth row", type=int, default=1)
 parser.add_argument('--offset', help="offset to begin inserts from from input file", type=int, default=0)
@@ -41,9 +48,13 @@ parser.add_argument('--binary-input-dir', help="read COPY batches fron binary in
 parser.add_argument('--host', help="remote postgres host")
 parser.add_argument('--total-partitions', help="use consistent hash partitioning to partition binary output results", type=int, default=0)
 parser.add_argument('--partition', help="the binary output partition to prepare", type=int)
+parser.add_argument('--series-catalog', help="series catalog (scripts/python/utils/series_catalog.py) to assign partitions from, shared with the splitters and other inserters")
+parser.add_argument('--partition-strategy', help="with --series-catalog: 'modulo' keeps the md5 hash placement, 'balanced' equalizes row counts per partition", choices=['modulo', 'balanced'], default='modulo')
+parser.add_argument('--partition-plan', help="partition plan (series_catalog.py plan) for --total-partitions workers; takes precedence over --series-catalog")
 
 
 args = parser.parse_args()
+rate_limiter = make_rate_limiter(args.rows_per_sec, args.arrivals, args.latency_output)
 
 worker_log_string = "[%s/%s]" % (args.offset + 1, args.skip)
 if args.partition:
@@ -51,6 +62,19 @@ if args.partition:
     
 logging.basicConfig(format=f'%(asctime)s :: {worker_log_string} :: %(message)s', level=logging.INFO)
 
+series_catalog = None
+partition_plan = None
+if args.series_catalog or args.partition_plan:
+    from series_catalog import load_catalog, load_plan
+if args.partition_plan:
+    partition_plan = load_plan(args.partition_plan)
+    if partition_plan.num_workers != args.total_partitions:
+        sys.exit("partition plan %s is for %s workers, but --total-partitions is %s" % (args.partition_plan, partition_plan.num_workers, args.total_partitions))
+    logging.info("loaded %s plan for %s series from %s" % (partition_plan.strategy, len(partition_plan), args.partition_plan))
+elif args.series_catalog:
+    series_catalog = load_catalog(args.series_catalog)
+    logging.info("loaded %s series from %s (%s partitions)" % (len(series_catalog), args.series_catalog, args.partition_strategy))
+
 conn = psycopg2.connect(database=args.db, user=args.db_user, host=args.host, port=5432)
 
 col_source = NARROW_FORMAT
@@ -158,6 +182,24 @@ def timed_write_binary(mgr, batch, timing_bucket="values_write_binary", factory=
     tmpfile = open(tmpfile.name, 'rb')
     return tmpfile
 
+def copy_binary_rows(f):
+    """Number of tuples in a binary COPY file, leaving f at its start."""
+    data = f.read()
+    f.seek(0)
+    # signature, flags and header extension length, then the extension
+    offset = 19 + struct.unpack_from('!i', data, 15)[0]
+    rows = 0
+    while offset < len(data):
+        fields = struct.unpack_from('!h', data, offset)[0]
+        offset += 2
+        if fields == -1:
+            break
+        for _ in range(fields):
+            length = struct.unpack_from('!i', data, offset)[0]
+            offset += 4 + max(length, 0)
+        rows += 1
+    return rows
+
 def timed_copy_binary(mgr, f, filename, timing_bucket="values_insert"):
     before = time.perf_counter()
     before_timestamp = datetime.now()
@@ -220,14 +262,24 @@ def copy_batch(tmpfile, tmpfile_name):
     else:
         timed_copy_binary(managers['values'], tmpfile, tmpfile_name, timing_bucket="values_insert")
 
-def hash_row(row):
+def row_series(row):
     ROUTER_IDX = 19
     PORT_IDX = 34
     if args.wide:
         ROUTER_IDX = 605
         PORT_IDX = 610
-    port_string = "%s::%s" % (row[ROUTER_IDX], row[PORT_IDX])
+    return row[ROUTER_IDX], row[PORT_IDX]
+
+def hash_row(row):
+    port_string = "%s::%s" % row_series(row)
     return hashlib.md5(port_string.encode('UTF-8')).hexdigest()
+
+def row_partition(row):
+    if partition_plan is not None:
+        return partition_plan.worker_for(*row_series(row))
+    if series_catalog is not None:
+        return series_catalog.worker_for(*row_series(row), args.total_partitions, args.partition_strategy)
+    return int(hash_row(row), 16) % args.total_partitions
         
 def timed_assembly(infile, header, batch_size=1, timing_bucket="values_assembly", offset=0):
     batch = []
@@ -251,8 +303,7 @@ def timed_assembly(infile, header, batch_size=1, timing_bucket="values_assembly"
         curr_line += 1
         row = line.rstrip("\n").split("\t")
         if args.total_partitions:
-            hash_output = hash_row(row)
-            hash_bucket = int(hash_output, 16) % args.total_partitions
+            hash_bucket = row_partition(row)
             if hash_bucket != args.partition:
                 continue
             if curr_line % 1000 == 0:
@@ -337,14 +388,29 @@ total_inserts = 0
 if args.binary_input_dir:
     for filename in sorted(os.listdir(args.binary_input_dir)):
         with open(os.path.join(args.binary_input_dir, filename), 'rb') as f:
-            copy_batch(f, filename)
-            if 'metadata' not in filename:
+            if 'metadata' in filename:
+                copy_batch(f, filename)
+                continue
+            if rate_limiter:
+                # counting walks every field, so only paced runs pay for it
+                rows = copy_binary_rows(f)
+                scheduled = rate_limiter.wait(rows)
+                copy_batch(f, filename)
+                rate_limiter.record(scheduled, rows)
+                total_inserts += rows
+            else:
+                copy_batch(f, filename)
                 total_inserts += args.batch_size
 else:
     header_line = args.infile.readline()
     header = header_line.strip().split("\t")
     for batch in timed_assembly(infile=args.infile, header=header, batch_size=args.batch_size, timing_bucket="values_assembly", offset=args.offset):
-        insert_batch(batch, strategy=args.strategy)
+        if rate_limiter:
+            scheduled = rate_limiter.wait(len(batch))
+            insert_batch(batch, strategy=args.strategy)
+            rate_limiter.record(scheduled, len(batch))
+        else:
+            insert_batch(batch, strategy=args.strategy)
         total_inserts += len(batch)
         if total_inserts >= args.limit:
             conn.commit()
@@ -357,3 +423,5 @@ conn.commit()
 logging.info('committed %s values rows (postgres overhead)' % total_inserts)
 conn.close()
 final_report()
+if rate_limiter:
+    logging.info(rate_limiter.report())
@@ -31,6 +31,9 @@ source venv/bin/activate
 cat drop_tables_flow.sql | psql --host $HOST --user timescale
 cat create_tables.sql | psql --host $HOST --user timescale
 
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler postgres
+
 for i in `seq 0 1 $WORKERS_MINUS_ONE`;
 do echo $i;
 python insert.py --values-table values_flow --strategy inline-metadata --host $HOST --infile /media/stardust-data/flow-20250821.tsv --flow --offset $i --skip $WORKERS --limit $PER_WORKER_LIMIT --batch-size 10000 --binary-input-dir "$BINARY_OUTPUT_DIR/$i" &
@@ -38,5 +41,6 @@ sleep 0.1
 done;
 
 wait $(jobs -p)
+stop_host_sampler
 
 # bash get_results.sh $HOST 30
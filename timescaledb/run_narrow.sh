@@ -33,6 +33,9 @@ cat create_tables.sql | psql --host $HOST --user timescale
 # cat it again, there's some kind of small bug, not worth fixing
 cat create_tables.sql | psql --host $HOST --user timescale
 
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler postgres
+
 for i in `seq 0 1 $WORKERS_MINUS_ONE`;
 do echo $i;
 python insert.py --values-table values_inline --strategy inline-metadata --host $HOST --infile /media/stardust-data/stardust_data-2025-03-28--2025-03-29.reversed.tsv --offset $i --skip $WORKERS --limit $PER_WORKER_LIMIT --batch-size 10000 --binary-input-dir "$BINARY_OUTPUT_DIR/$i" &
@@ -40,5 +43,6 @@ sleep 0.1
 done;
 
 wait $(jobs -p)
+stop_host_sampler
 
 bash get_results.sh $HOST 30
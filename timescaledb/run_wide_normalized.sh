@@ -35,6 +35,9 @@ cat create_tables.sql | psql --host $HOST --user timescale
 # cat it again, there's some kind of small bug, not worth fixing
 cat create_tables.sql | psql --host $HOST --user timescale
 
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler postgres
+
 for i in `seq 0 1 $WORKERS_MINUS_ONE`;
 do echo $i;
 python insert.py --values-table values_wide_inline_normalized --strategy inline-metadata --host $HOST --infile /media/stardust-data-wide/stardust_data-2025-03-11--2025-03-13.wide.reversed.tsv --wide --normalized --offset $i --skip $WORKERS --limit $PER_WORKER_LIMIT --batch-size 5000 --binary-input-dir "$BINARY_OUTPUT_DIR/$i" &
@@ -42,5 +45,6 @@ sleep 0.1
 done;
 
 wait $(jobs -p)
+stop_host_sampler
 
 bash get_results.sh $HOST 30
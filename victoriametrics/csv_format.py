@@ -616,3 +616,295 @@ WIDE_FORMAT = [
     ("615", "label", "meta.peer.asn"),
     ("616", "label", "meta.sap_descr"),
 ]
+
+# --- generated by generate_flow_format.py, do not edit below this line ---
+
+FLOW_FORMAT = [
+#    ("1", "label", "@exit_time"),
+#    ("2", "label", "@processing_time"),
+    ("3", "time", "rfc3339"),
+#    ("4", "label", "end"),
+#    ("5", "label", "start"),
+    ("6", "metric", "stitched_flows"),
+    ("7", "label", "ts_id"),
+    ("8", "label", "type"),
+    ("9", "label", "meta.app_name"),
+    ("10", "label", "meta.app_name_detail"),
+    ("11", "label", "meta.app_port"),
+    ("12", "label", "meta.as_names"),
+    ("13", "label", "meta.as_names_str"),
+    ("14", "label", "meta.bgp.as_hop0"),
+    ("15", "label", "meta.bgp.as_hop0_name"),
+    ("16", "label", "meta.bgp.as_hop0_padding"),
+    ("17", "label", "meta.bgp.as_hop1"),
+    ("18", "label", "meta.bgp.as_hop1_name"),
+    ("19", "label", "meta.bgp.as_hop1_padding"),
+    ("20", "label", "meta.bgp.as_hop2"),
+    ("21", "label", "meta.bgp.as_hop2_name"),
+    ("22", "label", "meta.bgp.as_hop2_padding"),
+    ("23", "label", "meta.bgp.as_hop3"),
+    ("24", "label", "meta.bgp.as_hop3_name"),
+    ("25", "label", "meta.bgp.as_hop3_padding"),
+    ("26", "label", "meta.bgp.as_hop4"),
+    ("27", "label", "meta.bgp.as_hop4_name"),
+    ("28", "label", "meta.bgp.as_hop4_padding"),
+    ("29", "label", "meta.bgp.as_hop5"),
+    ("30", "label", "meta.bgp.as_hop5_name"),
+    ("31", "label", "meta.bgp.as_hop5_padding"),
+    ("32", "label", "meta.bgp.as_hop6"),
+    ("33", "label", "meta.bgp.as_hop6_name"),
+    ("34", "label", "meta.bgp.as_hop6_padding"),
+    ("35", "label", "meta.bgp.as_hop7"),
+    ("36", "label", "meta.bgp.as_hop7_name"),
+    ("37", "label", "meta.bgp.as_hop7_padding"),
+    ("38", "label", "meta.bgp.as_path"),
+    ("39", "label", "meta.bgp.as_path_len"),
+    ("40", "label", "meta.bgp.as_path_name"),
+    ("41", "label", "meta.bgp.as_path_name_str"),
+    ("42", "label", "meta.bgp.as_path_org"),
+    ("43", "label", "meta.bgp.as_path_padded_len"),
+    ("44", "label", "meta.bgp.as_path_str"),
+    ("45", "label", "meta.bgp.comms"),
+    ("46", "label", "meta.bgp.comms_str"),
+    ("47", "label", "meta.bgp.ecomms"),
+    ("48", "label", "meta.bgp.ecomms_str"),
+    ("49", "label", "meta.bgp.lcomms_str"),
+    ("50", "label", "meta.bgp.local_pref"),
+    ("51", "label", "meta.bgp.med"),
+    ("52", "label", "meta.bgp.next_hop"),
+    ("53", "label", "meta.bgp.peer_as_dst"),
+    ("54", "label", "meta.bgp.peer_as_dst_name"),
+    ("55", "label", "meta.bgp.peer_as_dst_org"),
+    ("56", "label", "meta.country_names"),
+    ("57", "label", "meta.country_names_str"),
+    ("58", "label", "meta.country_scope"),
+    ("59", "label", "meta.cric.dst"),
+    ("60", "label", "meta.cric.src"),
+    ("61", "label", "meta.device_info.loc_name"),
+    ("62", "label", "meta.device_info.loc_type"),
+    ("63", "label", "meta.device_info.location.lat"),
+    ("64", "label", "meta.device_info.location.lon"),
+    ("65", "label", "meta.device_info.manufacturer"),
+    ("66", "label", "meta.device_info.model"),
+    ("67", "label", "meta.device_info.network"),
+    ("68", "label", "meta.device_info.os"),
+    ("69", "label", "meta.device_info.role"),
+    ("70", "label", "meta.device_info.state"),
+    ("71", "label", "meta.dscp"),
+    ("72", "label", "meta.dst_as_name"),
+    ("73", "label", "meta.dst_asn"),
+    ("74", "label", "meta.dst_continent"),
+    ("75", "label", "meta.dst_country_name"),
+    ("76", "label", "meta.dst_ip"),
+    ("77", "label", "meta.dst_location.lat"),
+    ("78", "label", "meta.dst_location.lon"),
+    ("79", "label", "meta.dst_organization"),
+    ("80", "label", "meta.dst_port"),
+    ("81", "label", "meta.dst_preferred_location.lat"),
+    ("82", "label", "meta.dst_preferred_location.lon"),
+    ("83", "label", "meta.dst_preferred_org"),
+    ("84", "label", "meta.dst_pub_asn"),
+    ("85", "label", "meta.dst_region_iso_code"),
+    ("86", "label", "meta.dst_region_name"),
+    ("87", "label", "meta.esdb.dst.org.full_name"),
+    ("88", "label", "meta.esdb.dst.org.funding_agency"),
+    ("89", "label", "meta.esdb.dst.org.hide"),
+    ("90", "label", "meta.esdb.dst.org.short_name"),
+    ("91", "label", "meta.esdb.dst.org.types"),
+    ("92", "label", "meta.esdb.dst.service.label"),
+    ("93", "label", "meta.esdb.dst.service.prefix_group_name"),
+    ("94", "label", "meta.esdb.dst.service.type"),
+    ("95", "label", "meta.esdb.sites"),
+    ("96", "label", "meta.esdb.sites_str"),
+    ("97", "label", "meta.esdb.src.org.full_name"),
+    ("98", "label", "meta.esdb.src.org.funding_agency"),
+    ("99", "label", "meta.esdb.src.org.hide"),
+    ("100", "label", "meta.esdb.src.org.short_name"),
+    ("101", "label", "meta.esdb.src.org.types"),
+    ("102", "label", "meta.esdb.src.service.label"),
+    ("103", "label", "meta.esdb.src.service.prefix_group_name"),
+    ("104", "label", "meta.esdb.src.service.type"),
+    ("105", "label", "meta.five_tuple_id"),
+    ("106", "label", "meta.flow_type"),
+    ("107", "label", "meta.id"),
+    ("108", "label", "meta.iface_in.description"),
+    ("109", "label", "meta.iface_in.device"),
+    ("110", "label", "meta.iface_in.id"),
+    ("111", "label", "meta.iface_in.ifindex"),
+    ("112", "label", "meta.iface_in.intercloud"),
+    ("113", "label", "meta.iface_in.ipv4"),
+    ("114", "label", "meta.iface_in.ipv6"),
+    ("115", "label", "meta.iface_in.lhcone"),
+    ("116", "label", "meta.iface_in.name"),
+    ("117", "label", "meta.iface_in.netflow_index"),
+    ("118", "label", "meta.iface_in.peer.as_name"),
+    ("119", "label", "meta.iface_in.peer.asn"),
+    ("120", "label", "meta.iface_in.peer.ip"),
+    ("121", "label", "meta.iface_in.port_name"),
+    ("122", "label", "meta.iface_in.remote.device"),
+    ("123", "label", "meta.iface_in.remote.full_name"),
+    ("124", "label", "meta.iface_in.remote.id"),
+    ("125", "label", "meta.iface_in.remote.lldp_device"),
+    ("126", "label", "meta.iface_in.remote.lldp_port"),
+    ("127", "label", "meta.iface_in.remote.loc_name"),
+    ("128", "label", "meta.iface_in.remote.loc_type"),
+    ("129", "label", "meta.iface_in.remote.location.lat"),
+    ("130", "label", "meta.iface_in.remote.location.lon"),
+    ("131", "label", "meta.iface_in.remote.manufacturer"),
+    ("132", "label", "meta.iface_in.remote.model"),
+    ("133", "label", "meta.iface_in.remote.network"),
+    ("134", "label", "meta.iface_in.remote.os"),
+    ("135", "label", "meta.iface_in.remote.port"),
+    ("136", "label", "meta.iface_in.remote.role"),
+    ("137", "label", "meta.iface_in.remote.short_name"),
+    ("138", "label", "meta.iface_in.remote.state"),
+    ("139", "label", "meta.iface_in.site"),
+    ("140", "label", "meta.iface_in.speed"),
+    ("141", "label", "meta.iface_in.visibility"),
+    ("142", "label", "meta.iface_in.vrtrifglobalindex"),
+    ("143", "label", "meta.iface_in.vrtrifindex"),
+    ("144", "label", "meta.iface_in.vrtrname"),
+    ("145", "label", "meta.iface_out.description"),
+    ("146", "label", "meta.iface_out.device"),
+    ("147", "label", "meta.iface_out.id"),
+    ("148", "label", "meta.iface_out.ifindex"),
+    ("149", "label", "meta.iface_out.intercloud"),
+    ("150", "label", "meta.iface_out.ipv4"),
+    ("151", "label", "meta.iface_out.ipv6"),
+    ("152", "label", "meta.iface_out.lhcone"),
+    ("153", "label", "meta.iface_out.name"),
+    ("154", "label", "meta.iface_out.netflow_index"),
+    ("155", "label", "meta.iface_out.peer.asn"),
+    ("156", "label", "meta.iface_out.peer.ipv4"),
+    ("157", "label", "meta.iface_out.peer.ipv6"),
+    ("158", "label", "meta.iface_out.port_name"),
+    ("159", "label", "meta.iface_out.remote.device"),
+    ("160", "label", "meta.iface_out.remote.full_name"),
+    ("161", "label", "meta.iface_out.remote.id"),
+    ("162", "label", "meta.iface_out.remote.lldp_device"),
+    ("163", "label", "meta.iface_out.remote.lldp_port"),
+    ("164", "label", "meta.iface_out.remote.loc_name"),
+    ("165", "label", "meta.iface_out.remote.loc_type"),
+    ("166", "label", "meta.iface_out.remote.location.lat"),
+    ("167", "label", "meta.iface_out.remote.location.lon"),
+    ("168", "label", "meta.iface_out.remote.manufacturer"),
+    ("169", "label", "meta.iface_out.remote.model"),
+    ("170", "label", "meta.iface_out.remote.network"),
+    ("171", "label", "meta.iface_out.remote.os"),
+    ("172", "label", "meta.iface_out.remote.port"),
+    ("173", "label", "meta.iface_out.remote.role"),
+    ("174", "label", "meta.iface_out.remote.short_name"),
+    ("175", "label", "meta.iface_out.remote.state"),
+    ("176", "label", "meta.iface_out.site"),
+    ("177", "label", "meta.iface_out.speed"),
+    ("178", "label", "meta.iface_out.visibility"),
+    ("179", "label", "meta.iface_out.vrtrifglobalindex"),
+    ("180", "label", "meta.iface_out.vrtrifindex"),
+    ("181", "label", "meta.iface_out.vrtrname"),
+    ("182", "label", "meta.ip_tos"),
+    ("183", "label", "meta.ip_version"),
+    ("184", "label", "meta.ipv6.flow_label"),
+    ("185", "label", "meta.is_l2"),
+    ("186", "label", "meta.is_network_testing"),
+    ("187", "label", "meta.mpls.bottom_label"),
+    ("188", "label", "meta.mpls.exp1"),
+    ("189", "label", "meta.mpls.exp10"),
+    ("190", "label", "meta.mpls.exp2"),
+    ("191", "label", "meta.mpls.exp3"),
+    ("192", "label", "meta.mpls.exp4"),
+    ("193", "label", "meta.mpls.exp5"),
+    ("194", "label", "meta.mpls.exp6"),
+    ("195", "label", "meta.mpls.exp7"),
+    ("196", "label", "meta.mpls.exp8"),
+    ("197", "label", "meta.mpls.exp9"),
+    ("198", "label", "meta.mpls.label1"),
+    ("199", "label", "meta.mpls.label10"),
+    ("200", "label", "meta.mpls.label2"),
+    ("201", "label", "meta.mpls.label3"),
+    ("202", "label", "meta.mpls.label4"),
+    ("203", "label", "meta.mpls.label5"),
+    ("204", "label", "meta.mpls.label6"),
+    ("205", "label", "meta.mpls.label7"),
+    ("206", "label", "meta.mpls.label8"),
+    ("207", "label", "meta.mpls.label9"),
+    ("208", "label", "meta.mpls.labels"),
+    ("209", "label", "meta.mpls.pw_id"),
+    ("210", "label", "meta.mpls.stack_depth"),
+    ("211", "label", "meta.mpls.top_label"),
+    ("212", "label", "meta.mpls.top_label_ip"),
+    ("213", "label", "meta.mpls.top_label_type"),
+    ("214", "label", "meta.mpls.vpn_rd"),
+    ("215", "label", "meta.protocol"),
+    ("216", "label", "meta.region_iso_codes"),
+    ("217", "label", "meta.region_iso_codes_str"),
+    ("218", "label", "meta.region_names"),
+    ("219", "label", "meta.region_names_str"),
+    ("220", "label", "meta.router.ip"),
+    ("221", "label", "meta.router.name"),
+    ("222", "label", "meta.scireg.dst.discipline"),
+    ("223", "label", "meta.scireg.dst.latitude"),
+    ("224", "label", "meta.scireg.dst.longitude"),
+    ("225", "label", "meta.scireg.dst.org_abbr"),
+    ("226", "label", "meta.scireg.dst.org_name"),
+    ("227", "label", "meta.scireg.dst.project_names"),
+    ("228", "label", "meta.scireg.dst.project_names_str"),
+    ("229", "label", "meta.scireg.dst.resource"),
+    ("230", "label", "meta.scireg.dst.resource_abbr"),
+    ("231", "label", "meta.scireg.dst.role"),
+    ("232", "label", "meta.scireg.project_names"),
+    ("233", "label", "meta.scireg.project_names_str"),
+    ("234", "label", "meta.scireg.src.discipline"),
+    ("235", "label", "meta.scireg.src.latitude"),
+    ("236", "label", "meta.scireg.src.longitude"),
+    ("237", "label", "meta.scireg.src.org_abbr"),
+    ("238", "label", "meta.scireg.src.org_name"),
+    ("239", "label", "meta.scireg.src.project_names"),
+    ("240", "label", "meta.scireg.src.project_names_str"),
+    ("241", "label", "meta.scireg.src.resource"),
+    ("242", "label", "meta.scireg.src.resource_abbr"),
+    ("243", "label", "meta.scireg.src.role"),
+    ("244", "label", "meta.sensor_id"),
+    ("245", "label", "meta.src_as_name"),
+    ("246", "label", "meta.src_asn"),
+    ("247", "label", "meta.src_continent"),
+    ("248", "label", "meta.src_country_name"),
+    ("249", "label", "meta.src_ip"),
+    ("250", "label", "meta.src_location.lat"),
+    ("251", "label", "meta.src_location.lon"),
+    ("252", "label", "meta.src_organization"),
+    ("253", "label", "meta.src_port"),
+    ("254", "label", "meta.src_preferred_location.lat"),
+    ("255", "label", "meta.src_preferred_location.lon"),
+    ("256", "label", "meta.src_preferred_org"),
+    ("257", "label", "meta.src_pub_asn"),
+    ("258", "label", "meta.src_region_iso_code"),
+    ("259", "label", "meta.src_region_name"),
+    ("260", "label", "meta.traffic_class"),
+    ("261", "label", "meta.vrf.egress_id"),
+    ("262", "label", "meta.vrf.ingress_id"),
+    ("263", "metric", "values.bits_per_second"),
+    ("264", "metric", "values.duration"),
+    ("265", "metric", "values.max_packet_len"),
+    ("266", "metric", "values.max_ttl"),
+    ("267", "metric", "values.min_packet_len"),
+    ("268", "metric", "values.min_ttl"),
+    ("269", "metric", "values.num_bits"),
+    ("270", "metric", "values.num_packets"),
+    ("271", "metric", "values.packets_per_second"),
+]
+
+# label -> kind, see --flow-cardinality in insert.py
+FLOW_HIGH_CARDINALITY = {
+    "ts_id": "id",
+    "meta.dst_ip": "ip",
+    "meta.dst_location.lat": "geo",
+    "meta.dst_location.lon": "geo",
+    "meta.dst_port": "port",
+    "meta.five_tuple_id": "id",
+    "meta.id": "id",
+    "meta.ipv6.flow_label": "id",
+    "meta.src_ip": "ip",
+    "meta.src_location.lat": "geo",
+    "meta.src_location.lon": "geo",
+    "meta.src_port": "port",
+}
@@ -0,0 +1,98 @@
+"""
+Generates the FLOW_FORMAT column map in csv_format.py from the fetcher's
+FLOW_FORMAT field list (scripts/python/stardust_fetcher/formats.py), so the
+VictoriaMetrics column positions always match the flow TSV written by the
+fetcher.
+
+Every fetcher column is classified as time, metric or label. Columns listed
+in HIGH_CARDINALITY are labels whose handling is chosen at split/insert time
+with --flow-cardinality (see insert.py). Rerun after changing the fetcher's
+flow fields:
+
+    python generate_flow_format.py
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts", "python", "stardust_fetcher"))
+from formats import FLOW_FORMAT
+
+parser = argparse.ArgumentParser(description='Generates the VictoriaMetrics flow column map from the stardust fetcher flow format.')
+parser.add_argument('--outfile', help='csv_format.py to update', default=os.path.join(HERE, "csv_format.py"))
+parser.add_argument('--stdout', help='print the generated block instead of updating csv_format.py', action='store_true')
+
+MARKER = "# --- generated by generate_flow_format.py, do not edit below this line ---"
+
+TIME_COLUMN = "@timestamp"
+
+# other timestamps of the flow record; VictoriaMetrics keeps one per sample
+SKIPPED_COLUMNS = {"@exit_time", "@processing_time", "start", "end"}
+
+# numeric flow fields that are not under "values."
+EXTRA_METRICS = {"stitched_flows"}
+
+# labels that make (almost) every flow its own series
+HIGH_CARDINALITY = {
+    "meta.src_ip": "ip",
+    "meta.dst_ip": "ip",
+    "meta.src_port": "port",
+    "meta.dst_port": "port",
+    "meta.src_location.lat": "geo",
+    "meta.src_location.lon": "geo",
+    "meta.dst_location.lat": "geo",
+    "meta.dst_location.lon": "geo",
+    "meta.id": "id",
+    "meta.five_tuple_id": "id",
+    "meta.ipv6.flow_label": "id",
+    "ts_id": "id",
+}
+
+
+def classify(name):
+    if name == TIME_COLUMN:
+        return "time"
+    if name in SKIPPED_COLUMNS:
+        return None
+    if name.startswith("values.") or name in EXTRA_METRICS:
+        return "metric"
+    return "label"
+
+
+def generate():
+    lines = [MARKER, "", "FLOW_FORMAT = ["]
+    for idx, name in enumerate(FLOW_FORMAT, start=1):
+        kind = classify(name)
+        if kind is None:
+            lines.append('#    ("%s", "label", "%s"),' % (idx, name))
+        elif kind == "time":
+            lines.append('    ("%s", "time", "rfc3339"),' % idx)
+        else:
+            lines.append('    ("%s", "%s", "%s"),' % (idx, kind, name))
+    lines.append("]")
+    lines.append("")
+    lines.append("# label -> kind, see --flow-cardinality in insert.py")
+    lines.append("FLOW_HIGH_CARDINALITY = {")
+    for name in FLOW_FORMAT:
+        if name in HIGH_CARDINALITY:
+            lines.append('    "%s": "%s",' % (name, HIGH_CARDINALITY[name]))
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    missing = set(HIGH_CARDINALITY) - set(FLOW_FORMAT)
+    if missing:
+        sys.exit("high cardinality columns not in the fetcher flow format: %s" % ", ".join(sorted(missing)))
+    block = generate()
+    if args.stdout:
+        sys.stdout.write(block)
+        sys.exit(0)
+    with open(args.outfile) as f:
+        content = f.read()
+    content = content.split(MARKER)[0].rstrip("\n") + "\n\n"
+    with open(args.outfile, "w") as f:
+        f.write(content + block)
+    print("wrote %s flow columns to %s" % (len(FLOW_FORMAT), args.outfile))
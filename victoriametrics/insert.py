@@ -1,13 +1,29 @@
 import argparse
-from csv_format import WIDE_FORMAT
+from csv_format import WIDE_FORMAT, FLOW_FORMAT, FLOW_HIGH_CARDINALITY
+from remote_write import RemoteWriteEncoder, REMOTE_WRITE_HEADERS, compress
 import csv
+import gzip
+import io
+import ipaddress
 import os
-import subprocess 
 import random
 import string
 import sys
 import logging
 import datetime
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import urllib3
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "python", "utils"))
+from stardust_io import open_input
+from pacing import make_rate_limiter
 
 parser = argparse.ArgumentParser(description='Inserts ESnet Stardust Data into victoriametrics, producing a timing summary report.')
 
@@ -18,13 +34,27 @@ parser.add_argument('--flow', help='Stardust flow format', action='store_true')
 parser.add_argument('--split', help='Split TSV into batches', action='store_true')
 parser.add_argument('--insert', help='Do inserts from split CSV', action='store_true')
 parser.add_argument('--output-dir', help='write batches/load batches from directory', default="/tmp/%s" % ''.join(random.choices(string.ascii_letters + string.digits, k=8)))
-parser.add_argument('--infile', help="input TSV file. Default: sys.stdin", default=sys.stdin, type=argparse.FileType('r'))
+parser.add_argument('--infile', help="input TSV file, also .tsv.gz, .tsv.zst or .parquet fetcher exports. Default: sys.stdin", default=sys.stdin, type=open_input)
 parser.add_argument('--batch-size', help='insert batch size', type=int, default=10000)
-parser.add_argument('--workers', help="total number of workers", default=10)
+parser.add_argument('--workers', help="total number of workers", type=int, default=10)
 parser.add_argument('--worker', help='number of this worker')
 parser.add_argument('--limit', help='row limit', type=int, default=100000000)
+parser.add_argument('--concurrency', help='concurrent uploads per insert worker', type=int, default=4)
+parser.add_argument('--rows-per-sec', help='pace the uploads of this worker, all threads together, to this many rows per second. Default: as fast as possible', type=float)
+parser.add_argument('--arrivals', help='with --rows-per-sec, send uploads on a fixed open-loop schedule with constant or Poisson gaps instead of after the previous upload', choices=['constant', 'poisson'])
+parser.add_argument('--latency-output', help="with --rows-per-sec, write every upload's latency from its scheduled send time to this CSV (see scripts/python/utils/pacing.py report)")
+parser.add_argument('--compression', help='request body compression for uploads', choices=['gzip', 'none'], default='gzip')
+parser.add_argument('--timeout', help='per-request timeout in seconds', type=float, default=300)
+parser.add_argument('--protocol', help='import protocol: CSV import or Prometheus remote_write (protobuf+snappy)', choices=['csv', 'remote-write'], default='csv')
+parser.add_argument('--max-request-bytes', help='flush remote_write requests once the encoded size reaches this many bytes', type=int, default=16 * 1024 * 1024)
+parser.add_argument('--benchmark', help='import the batches once per protocol and compare server CPU and ingest rate', action='store_true')
+parser.add_argument('--split-compression', help='compress split batch files. Compressed files are uploaded as-is', choices=['none', 'gzip', 'zstd'], default='none')
+parser.add_argument('--flow-cardinality', help='flow IPs, ports, locations and ids: drop them, bucket them (IP prefixes, port ranges, whole degrees; ids dropped) or keep them as labels. Bucketing happens at split time', choices=['drop', 'bucket', 'keep'], default='drop')
+parser.add_argument('--partition-plan', help='with --split: write the rows of each series to the worker directory chosen by this plan (scripts/python/utils/series_catalog.py plan) instead of round-robin batches. Wide format only')
+parser.add_argument('--split-compression-level', help='compression level for split batch files. Default: 1 for gzip, 3 for zstd', type=int)
 
 args = parser.parse_args()
+rate_limiter = make_rate_limiter(args.rows_per_sec, args.arrivals, args.latency_output)
 
 if args.split:
     worker_log_string = "[splitter]"
@@ -33,77 +63,429 @@ else:
     
 logging.basicConfig(format=f'%(asctime)s :: {worker_log_string} :: %(message)s', level=logging.INFO)
 
-if args.flow:
-    sys.exit("flow format is not yet implemented (csv_format.py)")
-
 if args.wide and args.flow:
     sys.exit("wide and flow format are mutually exclusive")
 
 if args.insert and args.split:
     sys.exit("insert and split are mutually exclusive. The program either splits data or inserts it.")
 
+partition_plan = None
+if args.split and args.partition_plan:
+    if not args.wide:
+        sys.exit("partition plans assign device/name series and need the wide format")
+    from series_catalog import load_plan
+    partition_plan = load_plan(args.partition_plan)
+    if partition_plan.num_workers != args.workers:
+        sys.exit("partition plan %s is for %s workers, but --workers is %s" % (args.partition_plan, partition_plan.num_workers, args.workers))
+    logging.info("loaded %s plan for %s series from %s" % (partition_plan.strategy, len(partition_plan), args.partition_plan))
+
+FILE_ENCODINGS = {'.gz': 'gzip', '.zst': 'zstd'}
+SPLIT_SUFFIXES = {'none': 'csv', 'gzip': 'csv.gz', 'zstd': 'csv.zst'}
+
+def file_encoding(filename):
+    """Content-Encoding of a split batch file, None when it is plain CSV."""
+    return FILE_ENCODINGS.get(os.path.splitext(filename)[1])
+
+def require_zstandard():
+    if zstandard is None:
+        sys.exit("zstd batch files need the zstandard package (pip install zstandard)")
+
+def open_batch_file(path):
+    level = args.split_compression_level
+    if args.split_compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=1 if level is None else level)
+    if args.split_compression == 'zstd':
+        require_zstandard()
+        return zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
 def get_outfile(worker):
     fname = "%s.copy.%s" % (str(get_outfile.calls).zfill(8), get_outfile.suffix)
     get_outfile.calls += 1
     os.makedirs(os.path.join(args.output_dir, f"{worker}"), exist_ok=True)
-    return open(os.path.join(args.output_dir, f"{worker}", fname), "w")
+    return open_batch_file(os.path.join(args.output_dir, f"{worker}", fname))
 get_outfile.calls = 0
-get_outfile.suffix = 'csv'
+get_outfile.suffix = SPLIT_SUFFIXES[args.split_compression]
 
-def write_csv(header, batch):
-    worker = write_csv.calls % args.workers
-    outfile = get_outfile(worker)
-    logging.info("Writing Batch to %s..." % outfile.name)
-    writer = csv.writer(outfile, delimiter=',', quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(header)
-    for row in batch:
-        writer.writerow(row)
-    write_csv.calls += 1
-write_csv.calls = 0
+def write_batch(batch, worker=None):
+    """Writes a batch of CSV lines to the worker's directory, by default round-robin."""
+    if worker is None:
+        worker = write_batch.calls % args.workers
+    with get_outfile(worker) as outfile:
+        outfile.writelines(batch)
+    write_batch.calls += 1
+write_batch.calls = 0
 
-def process_line(line, last_metric):
-    return [float(v) if i<=last_metric else v for i, v in enumerate(line)]
+def tsv_to_csv_line(line):
+    """
+    Converts one raw TSV line to a CSV line without parsing any values.
 
+    Fields written by the fetcher are only quoted when they contain a quote,
+    tab or newline, and that quoting is valid CSV as well. Most lines therefore
+    only need their tabs swapped for commas; lines with commas get those fields
+    quoted, and lines containing quotes go through the csv module.
+    """
+    if b'"' in line:
+        fields = next(csv.reader([line.decode('utf-8')], delimiter='\t'))
+        out = io.StringIO()
+        csv.writer(out, lineterminator='\n').writerow(fields)
+        return out.getvalue().encode('utf-8')
+    line = line.rstrip(b'\r\n')
+    if b',' in line:
+        return b','.join(b'"' + f + b'"' if b',' in f else f for f in line.split(b'\t')) + b'\n'
+    return line.replace(b'\t', b',') + b'\n'
 
-if args.split:
+
+def flow_column_map(policy):
+    """FLOW_FORMAT without the high cardinality labels the policy leaves out."""
+    if policy == 'keep':
+        return FLOW_FORMAT
+    if policy == 'bucket':
+        return [c for c in FLOW_FORMAT if FLOW_HIGH_CARDINALITY.get(c[2]) != 'id']
+    return [c for c in FLOW_FORMAT if c[2] not in FLOW_HIGH_CARDINALITY]
+
+# positions of the flow columns rewritten by --flow-cardinality bucket
+FLOW_BUCKET_COLUMNS = [(int(idx) - 1, FLOW_HIGH_CARDINALITY[name]) for idx, kind, name in FLOW_FORMAT
+                       if FLOW_HIGH_CARDINALITY.get(name) in ('ip', 'port', 'geo')]
+
+def bucket_ip(value):
+    cached = bucket_ip.cache.get(value)
+    if cached is None:
+        try:
+            address = ipaddress.ip_address(value)
+            prefix = 24 if address.version == 4 else 48
+            cached = str(ipaddress.ip_network("%s/%s" % (address, prefix), strict=False))
+        except ValueError:
+            cached = value
+        if len(bucket_ip.cache) > 1000000:
+            bucket_ip.cache.clear()
+        bucket_ip.cache[value] = cached
+    return cached
+bucket_ip.cache = {}
+
+def bucket_port(value):
+    try:
+        port = int(value)
+    except ValueError:
+        return value
+    if port < 1024:
+        return value
+    return "1024-49151" if port < 49152 else "49152-65535"
+
+def bucket_geo(value):
+    try:
+        return "%.0f" % float(value)
+    except ValueError:
+        return value
+
+BUCKETS = {'ip': bucket_ip, 'port': bucket_port, 'geo': bucket_geo}
+
+def flow_bucket_line(line):
+    """Like tsv_to_csv_line, but replaces flow IPs, ports and locations by their buckets."""
+    fields = next(csv.reader([line.decode('utf-8')], delimiter='\t'))
+    for idx, kind in FLOW_BUCKET_COLUMNS:
+        if idx < len(fields) and fields[idx]:
+            fields[idx] = BUCKETS[kind](fields[idx])
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerow(fields)
+    return out.getvalue().encode('utf-8')
+
+
+# positions of meta.device and meta.name, the series key of partition plans
+SERIES_COLUMNS = [int(idx) - 1 for name in ('meta.device', 'meta.name') for idx, kind, label in WIDE_FORMAT if label == name]
+
+def line_series(line):
+    if b'"' in line:
+        fields = next(csv.reader([line.decode('utf-8')], delimiter='\t'))
+    else:
+        fields = line.rstrip(b'\r\n').decode('utf-8').split('\t')
+    return tuple(fields[idx] if idx < len(fields) else '' for idx in SERIES_COLUMNS)
+
+
+if args.split and partition_plan is not None:
+    infile = args.infile.buffer
+    infile.readline()
+    batches = [[] for _ in range(args.workers)]
+    rows = 0
+    for line in infile:
+        if rows >= args.limit:
+            break
+        worker = partition_plan.worker_for(*line_series(line))
+        batches[worker].append(tsv_to_csv_line(line))
+        rows += 1
+        if len(batches[worker]) == args.batch_size:
+            write_batch(batches[worker], worker)
+            batches[worker] = []
+        if rows % 100000 == 0:
+            logging.info("processed %s lines" % rows)
+    for worker, batch in enumerate(batches):
+        if batch:
+            write_batch(batch, worker)
+    logging.info("completed batching %s rows into %s files by partition plan" % (rows, write_batch.calls))
+elif args.split:
+    if args.flow and args.flow_cardinality == 'bucket':
+        convert = flow_bucket_line
+    else:
+        convert = tsv_to_csv_line
+    # columns are addressed by position (see csv_format.py), so batch files carry no header
+    infile = args.infile.buffer
+    infile.readline()
     batch = []
-    i = 0
-    dialect = csv.Sniffer().sniff(args.infile.read(1024))
-    reader = csv.reader(args.infile, dialect)
-    header = reader.__next__()
-    last_metric = -1
-    if args.wide:
-        for t in WIDE_FORMAT:
-            if t[1] == 'metric':
-                last_metric += 1
-    for line in reader:
-        if i % 1000 == 0:
-            logging.info("processing line %s" % i)
+    rows = 0
+    for line in infile:
+        if rows >= args.limit:
+            break
+        batch.append(convert(line))
+        rows += 1
         if len(batch) == args.batch_size:
-            write_csv(header, batch)
+            write_batch(batch)
             batch = []
-            if i >= args.limit:
-                sys.exit("completed batching.")
-        batch.append(process_line(line, last_metric))
-        i += 1
+        if rows % 100000 == 0:
+            logging.info("processed %s lines" % rows)
+    if batch:
+        write_batch(batch)
+    logging.info("completed batching %s rows into %s files" % (rows, write_batch.calls))
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SCOREBOARD_FORMAT = "1:time:rfc3339,2:metric:duration,3:metric:batch_size,4:label:data_type,5:label:worker"
+
+def stream_body(filename, counter):
+    """
+    Yields the file in chunks and counts its lines. Plain CSV files are gzip
+    compressed unless --compression none; compressed batch files are sent as-is.
+    """
+    encoding = file_encoding(filename)
+    compressor = None
+    decompressor = None
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(wbits=31)
+    elif encoding == 'zstd':
+        require_zstandard()
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    elif args.compression == 'gzip':
+        compressor = zlib.compressobj(wbits=31)
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if decompressor:
+                counter['lines'] += decompressor.decompress(chunk).count(b"\n")
+            else:
+                counter['lines'] += chunk.count(b"\n")
+            if compressor:
+                chunk = compressor.compress(chunk)
+            # an empty chunk would terminate the chunked request early
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
+
+def count_lines(filename):
+    """Lines of a batch file, plain or compressed, without sending it."""
+    encoding = file_encoding(filename)
+    if encoding == 'gzip':
+        f = gzip.open(filename, 'rb')
+    elif encoding == 'zstd':
+        require_zstandard()
+        f = zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'))
+    else:
+        f = open(filename, 'rb')
+    lines = 0
+    with f:
+        while True:
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+    return lines
+
+def body_headers(filename):
+    encoding = file_encoding(filename) or ('gzip' if args.compression == 'gzip' else None)
+    return {'Content-Encoding': encoding} if encoding else {}
+
+def open_batch_text(filename):
+    encoding = file_encoding(filename)
+    if encoding == 'gzip':
+        return gzip.open(filename, 'rt', newline='')
+    if encoding == 'zstd':
+        require_zstandard()
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb')), newline='')
+    return open(filename, newline='')
+
+def gzip_bytes(data):
+    if args.compression != 'gzip':
+        return data
+    compressor = zlib.compressobj(wbits=31)
+    return compressor.compress(data) + compressor.flush()
+
+def post(url, body, headers=None, **kwargs):
+    if headers is None:
+        headers = {}
+        if args.compression == 'gzip':
+            headers['Content-Encoding'] = 'gzip'
+    response = http.request('POST', url, body=body, headers=headers, **kwargs)
+    if response.status // 100 != 2:
+        raise RuntimeError("HTTP %s: %s" % (response.status, response.data.decode('utf-8', errors='replace').strip()))
+    return response
+
+def write_scoreboard(filename, start_time, duration, rows):
+    scoreboard_row = f"{start_time.isoformat()},{duration},{rows},scoreboard,{args.worker}\n"
+    try:
+        post(f"{base_url}/api/v1/import/csv?format={SCOREBOARD_FORMAT}", gzip_bytes(scoreboard_row.encode('utf-8')))
+    except Exception as e:
+        logging.warning("scoreboard write for %s failed: %s", filename, e)
+
+def import_file(filename, format_string):
+    # paced batches are counted up front, so a short last file waits its own share
+    paced_rows = count_lines(filename) if rate_limiter else None
+    scheduled = rate_limiter.wait(paced_rows) if rate_limiter else None
+    counter = {'lines': 0}
+    start_time = datetime.datetime.now(datetime.timezone.utc)
+    before = time.perf_counter()
+    try:
+        post(f"{base_url}/api/v1/import/csv?format={format_string}", stream_body(filename, counter), headers=body_headers(filename), chunked=True)
+    except Exception as e:
+        logging.error("import of %s failed: %s", filename, e)
+        if rate_limiter:
+            rate_limiter.record(scheduled, paced_rows, ok=False)
+        return {'file': filename, 'ok': False, 'rows': 0, 'duration': time.perf_counter() - before, 'error': str(e)}
+    duration = time.perf_counter() - before
+    rows = counter['lines']
+    if rate_limiter:
+        rate_limiter.record(scheduled, paced_rows)
+    logging.info("inserted batch of %s records from %s in %.3fs", rows, filename, duration)
+    write_scoreboard(filename, start_time, duration, rows)
+    return {'file': filename, 'ok': True, 'rows': rows, 'duration': duration, 'error': None}
+
+def remote_write_file(filename, column_map):
+    encoder = RemoteWriteEncoder(column_map, label_cache=label_cache)
+    start_time = datetime.datetime.now(datetime.timezone.utc)
+    before = time.perf_counter()
+    rows = 0
+    def send():
+        nonlocal rows
+        pending_rows = encoder.pending_rows
+        scheduled = rate_limiter.wait(pending_rows) if rate_limiter else None
+        try:
+            post(f"{base_url}/api/v1/write", compress(encoder.flush()), headers=REMOTE_WRITE_HEADERS)
+        except Exception:
+            if rate_limiter:
+                rate_limiter.record(scheduled, pending_rows, ok=False)
+            raise
+        if rate_limiter:
+            rate_limiter.record(scheduled, pending_rows)
+        rows += pending_rows
+    try:
+        with open_batch_text(filename) as f:
+            for row in csv.reader(f):
+                encoder.add_row(row)
+                if encoder.pending_bytes >= args.max_request_bytes:
+                    send()
+        if encoder.pending_rows:
+            send()
+    except Exception as e:
+        logging.error("remote write of %s failed after %s rows: %s", filename, rows, e)
+        return {'file': filename, 'ok': False, 'rows': rows, 'duration': time.perf_counter() - before, 'error': str(e)}
+    duration = time.perf_counter() - before
+    logging.info("remote wrote batch of %s records from %s in %.3fs", rows, filename, duration)
+    write_scoreboard(filename, start_time, duration, rows)
+    return {'file': filename, 'ok': True, 'rows': rows, 'duration': duration, 'error': None}
+
+def scrape_metrics():
+    """Reads the server's /metrics page into {metric name: summed value}."""
+    response = http.request('GET', f"{base_url}/metrics")
+    metrics = {}
+    for line in response.data.decode('utf-8').splitlines():
+        if not line or line.startswith('#'):
+            continue
+        series, _, value = line.rpartition(' ')
+        name = series.split('{', 1)[0]
+        try:
+            metrics[name] = metrics.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+    return metrics
+
+def run_imports(protocol, filenames, column_map):
+    if protocol == 'remote-write':
+        importer = lambda filename: remote_write_file(filename, column_map)
+    else:
+        format_string = ",".join([":".join(t) for t in column_map])
+        importer = lambda filename: import_file(filename, format_string)
+    before = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(importer, filenames))
+    elapsed = time.perf_counter() - before
+
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+    total_rows = sum(r['rows'] for r in succeeded)
+    durations = sorted(r['duration'] for r in succeeded)
+    logging.info("[%s] imported %s rows from %s files in %.2fs (%.0f rows/sec), %s files failed",
+                 protocol, total_rows, len(succeeded), elapsed, total_rows / (elapsed or 1), len(failed))
+    if durations:
+        logging.info("[%s] request duration min/median/max: %.3fs/%.3fs/%.3fs",
+                     protocol, durations[0], durations[len(durations) // 2], durations[-1])
+    for r in failed:
+        logging.error("failed: %s: %s", r['file'], r['error'])
+    return {'rows': total_rows, 'elapsed': elapsed, 'failed': len(failed)}
+
+def benchmark(filenames, column_map):
+    report = []
+    for protocol in ['csv', 'remote-write']:
+        before = scrape_metrics()
+        summary = run_imports(protocol, filenames, column_map)
+        after = scrape_metrics()
+        delta = lambda name: after.get(name, 0.0) - before.get(name, 0.0)
+        report.append((protocol, summary, delta('process_cpu_seconds_total'), delta('vm_rows_inserted_total'),
+                       delta('vm_new_timeseries_created_total')))
+    print("\n%-14s %12s %10s %14s %16s %16s %18s %12s" % (
+        "protocol", "rows", "seconds", "rows/sec", "server samples", "server CPU (s)", "CPU s/1M samples", "new series"))
+    for protocol, summary, cpu, samples, new_series in report:
+        print("%-14s %12d %10.2f %14.0f %16.0f %16.2f %18.3f %12.0f" % (
+            protocol, summary['rows'], summary['elapsed'], summary['rows'] / (summary['elapsed'] or 1),
+            samples, cpu, cpu / samples * 1e6 if samples else 0.0, new_series))
+    print("note: the same batches are imported twice; run against an empty database and discard it afterwards.")
+    return sum(report_row[1]['failed'] for report_row in report)
+
+def series_churn(protocol, filenames, column_map):
+    """
+    Imports the batches and reports how many series the server created per
+    imported row, next to the server-side ingest rate. Server counters are
+    global, so with several insert workers the numbers cover all of them.
+    """
+    before = scrape_metrics()
+    summary = run_imports(protocol, filenames, column_map)
+    after = scrape_metrics()
+    delta = lambda name: after.get(name, 0.0) - before.get(name, 0.0)
+    new_series = delta('vm_new_timeseries_created_total')
+    samples = delta('vm_rows_inserted_total')
+    elapsed = summary['elapsed'] or 1
+    logging.info("[%s] series churn: %.0f new series (%.3f per row, %.0f per second), %.0f samples ingested (%.0f per second), flow cardinality policy: %s",
+                 protocol, new_series, new_series / (summary['rows'] or 1), new_series / elapsed,
+                 samples, samples / elapsed, args.flow_cardinality)
+    return summary
 
 if args.insert:
-    for ff in os.listdir(args.output_dir):
-        filename = os.path.join(args.output_dir, ff)
-        start_time = datetime.datetime.now()
-        if args.wide:
-            format_string = ",".join([":".join(t) for t in WIDE_FORMAT])
-#        if args.flow:
-#            format_string = ",".join([":".join(t) for t in FLOW_FORMAT])
-        cmd = ["curl", "-X", "POST", f"http://{args.host}:{args.port}/api/v1/import/csv?format={format_string}", "-T", filename]
-        logging.debug(" ".join(cmd))
-        output = subprocess.run(cmd, capture_output=True)
-        #logging.debug(output)
-        logging.info("inserted batch of %s records from %s", args.batch_size, filename)
-        end_time = datetime.datetime.now()
-        duration = end_time - start_time
-        scoreboard_format = "1:time:rfc3339,2:metric:duration,3:metric:batch_size,4:metric:data_type"
-        scoreboard_row = f"{start_time},{duration},{args.batch_size},scoreboard"
-        output = subprocess.run(["curl", "-d", ",".join(scoreboard_row), f"http://{args.host}:{args.port}/api/v1/import/csv?format={scoreboard_format}"], capture_output=True)
-        logging.debug(output)
-        
+    base_url = f"http://{args.host}:{args.port}"
+    # keep-alive connections shared by all upload threads of this worker
+    http = urllib3.PoolManager(maxsize=args.concurrency, block=True, retries=False,
+                               timeout=urllib3.Timeout(connect=10, read=args.timeout))
+    # remote_write label sets, shared by all upload threads of this worker
+    label_cache = {}
+    if args.wide:
+        column_map = WIDE_FORMAT
+    if args.flow:
+        column_map = flow_column_map(args.flow_cardinality)
+    filenames = [os.path.join(args.output_dir, ff) for ff in sorted(os.listdir(args.output_dir))]
+    if args.benchmark:
+        failed = benchmark(filenames, column_map)
+    elif args.flow:
+        failed = series_churn(args.protocol, filenames, column_map)['failed']
+    else:
+        failed = run_imports(args.protocol, filenames, column_map)['failed']
+    if rate_limiter:
+        logging.info(rate_limiter.report())
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,150 @@
+"""
+Prometheus remote_write encoder for Stardust rows.
+
+Rows are read with the same column map as the CSV import (see csv_format.py),
+so both paths produce identical metric names and labels. Label sets are encoded
+once per series and cached by (meta.device, meta.name); afterwards a row only
+costs its samples. The protobuf messages are small enough to be encoded by
+hand, which avoids a generated-code dependency:
+
+    WriteRequest { repeated TimeSeries timeseries = 1; }
+    TimeSeries   { repeated Label labels = 1; repeated Sample samples = 2; }
+    Label        { string name = 1; string value = 2; }
+    Sample       { double value = 1; int64 timestamp = 2; }
+"""
+import struct
+from datetime import datetime
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+REMOTE_WRITE_HEADERS = {
+    "Content-Encoding": "snappy",
+    "Content-Type": "application/x-protobuf",
+    "X-Prometheus-Remote-Write-Version": "0.1.0",
+}
+
+SERIES_KEY_LABELS = ("meta.device", "meta.name")
+
+# high cardinality (flow) imports would otherwise grow the cache without bound
+LABEL_CACHE_MAX = 1000000
+
+# Sample.value is field 1 (64-bit), Sample.timestamp is field 2 (varint)
+SAMPLE_VALUE_TAG = b"\x09"
+SAMPLE_TIMESTAMP_TAG = b"\x10"
+SAMPLE_SIZE_ESTIMATE = 16
+
+
+def varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def length_delimited(field_number, payload):
+    return varint((field_number << 3) | 2) + varint(len(payload)) + payload
+
+
+def encode_label(name, value):
+    label = length_delimited(1, name.encode("utf-8")) + length_delimited(2, value.encode("utf-8"))
+    return length_delimited(1, label)
+
+
+def encode_sample(value, timestamp_ms):
+    sample = SAMPLE_VALUE_TAG + struct.pack("<d", value) + SAMPLE_TIMESTAMP_TAG + varint(timestamp_ms)
+    return length_delimited(2, sample)
+
+
+def compress(payload):
+    if snappy is None:
+        raise RuntimeError("remote write needs python-snappy (pip install python-snappy)")
+    return snappy.compress(payload)
+
+
+class RemoteWriteEncoder:
+    """
+    Accumulates rows and encodes them into remote_write WriteRequests.
+
+    Samples of the same series and metric are grouped into one TimeSeries, so
+    the label bytes are sent once per request rather than once per row.
+    `label_cache` may be shared between encoders of the same column map.
+    """
+
+    def __init__(self, column_map, label_cache=None):
+        self.metrics = []
+        self.labels = []
+        self.time_idx = None
+        for column, kind, name in column_map:
+            idx = int(column) - 1
+            if kind == "metric":
+                self.metrics.append((idx, name))
+            elif kind == "label":
+                self.labels.append((idx, name))
+            elif kind == "time":
+                self.time_idx = idx
+        if self.time_idx is None:
+            raise ValueError("column map has no time column")
+        self.labels.sort(key=lambda label: label[1])
+        label_idx = {name: idx for idx, name in self.labels}
+        self.key_idx = [label_idx[name] for name in SERIES_KEY_LABELS if name in label_idx]
+        # "__name__" sorts before every "meta.*" label
+        self.name_labels = [encode_label("__name__", name) for _, name in self.metrics]
+        self.label_cache = {} if label_cache is None else label_cache
+        self.last_time = (None, None)
+        self.reset()
+
+    def reset(self):
+        self.pending = {}
+        self.pending_bytes = 0
+        self.pending_rows = 0
+        self.pending_samples = 0
+
+    def timestamp_ms(self, value):
+        if self.last_time[0] != value:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            self.last_time = (value, round(dt.timestamp() * 1000))
+        return self.last_time[1]
+
+    def series_labels(self, row):
+        values = tuple(row[idx] for idx, _ in self.labels)
+        # flow rows have no device/name key, the label values are the key
+        key = tuple(row[idx] for idx in self.key_idx) if self.key_idx else values
+        cached = self.label_cache.get(key)
+        if cached is not None and cached[0] == values:
+            return cached[1]
+        encoded = b"".join(encode_label(name, value) for (_, name), value in zip(self.labels, values) if value != "")
+        if len(self.label_cache) >= LABEL_CACHE_MAX:
+            self.label_cache.clear()
+        self.label_cache[key] = (values, encoded)
+        return encoded
+
+    def add_row(self, row):
+        timestamp = self.timestamp_ms(row[self.time_idx])
+        labels = self.series_labels(row)
+        pending = self.pending
+        for pos, (idx, _) in enumerate(self.metrics):
+            value = row[idx]
+            if value == "":
+                continue
+            samples = pending.get((labels, pos))
+            if samples is None:
+                samples = pending[(labels, pos)] = bytearray()
+                self.pending_bytes += len(labels) + len(self.name_labels[pos])
+            samples += encode_sample(float(value), timestamp)
+            self.pending_bytes += SAMPLE_SIZE_ESTIMATE
+            self.pending_samples += 1
+        self.pending_rows += 1
+
+    def flush(self):
+        """Returns the pending rows as an uncompressed WriteRequest and clears them."""
+        request = b"".join(
+            length_delimited(1, self.name_labels[pos] + labels + bytes(samples))
+            for (labels, pos), samples in self.pending.items()
+        )
+        self.reset()
+        return request
@@ -0,0 +1,29 @@
+WORKERS=$1
+HOST=$2
+CSV_OUTPUT_DIR=$3
+SPLIT=$4
+CARDINALITY=${5:-drop}
+
+WORKERS_MINUS_ONE=$(($WORKERS-1))
+
+LIMIT=100000000
+
+if [ -z "$SPLIT" ]; then
+
+    rm -R $CSV_OUTPUT_DIR/*
+    mkdir -p $CSV_OUTPUT_DIR
+
+    python insert.py --infile /media/stardust-data/stardust_data-2025-03-11--2025-03-13.flow.reversed.tsv --output-dir=$CSV_OUTPUT_DIR --batch-size 10000 --split --flow --flow-cardinality $CARDINALITY --workers=$WORKERS --limit $LIMIT
+fi
+
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler victoria-metrics
+
+for i in `seq 0 1 $WORKERS_MINUS_ONE`;
+do echo $i;
+   python insert.py --host=$HOST --port=443 --output-dir=$CSV_OUTPUT_DIR/$i --workers=$WORKERS --worker=$i --flow --flow-cardinality $CARDINALITY --insert --batch-size 10000 &
+sleep 0.1
+done;
+
+wait $(jobs -p)
+stop_host_sampler
@@ -19,6 +19,9 @@ if [ -z "$SPLIT" ]; then
     python insert.py --infile /media/stardust-data/stardust_data-2025-03-11--2025-03-13.wide.reversed.tsv --output-dir=/media/tmpdata/victoria/splits/ --batch-size 10000 --split --limit $LIMIT
 fi
     
+source ../scripts/python/utils/host_sampler.sh
+start_host_sampler victoria-metrics
+
 for i in `seq 0 1 $WORKERS_MINUS_ONE`;
 do echo $i;
    python insert.py --host=$HOST --port=443 --output-dir=/media/tmpdata/victoria/splits/1 --workers=$WORKERS --worker=$i --wide --insert --batch-size 10000 &
@@ -26,5 +29,6 @@ sleep 0.1
 done;
 
 wait $(jobs -p)
+stop_host_sampler
 
 